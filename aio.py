@@ -0,0 +1,217 @@
+import asyncio
+import functools
+import json
+import threading
+from requests.cookies import RequestsCookieJar
+from requests.structures import CaseInsensitiveDict
+
+from .auth import AuthRetry
+from .env import get_envs
+from .runner import ApiRunner
+
+try:
+    import aiohttp
+    from yarl import URL
+except ImportError:
+    aiohttp = None
+
+# 创建事件循环时加锁，避免并发时重复创建
+_engine_lock = threading.Lock()
+
+
+class AsyncResponse:
+    """
+    异步请求的返回值，提供和requests.Response一样的字段，供CheckMixIn和ReturnMixIn使用
+    """
+
+    def __init__(self, status_code, headers, content, encoding, url, cookies):
+        self.history = []
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding
+        self.url = url
+        self.cookies = cookies
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.text)
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+class AsyncEngine:
+    """
+    在后台线程中运行的事件循环，所有异步请求都在这个循环中发送
+    按(proto, host, port, auth)区分aiohttp的ClientSession，复用连接
+    """
+
+    def __init__(self, size=10, keep_alive=True):
+        if aiohttp is None:
+            raise RuntimeError("env.yml中配置了transport: async，需要先安装aiohttp")
+        self.size = size
+        self.keep_alive = keep_alive
+        self.sessions = {}
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever,
+                                       name="pytest-api-aio", daemon=True)
+        self.thread.start()
+
+    def run(self, coro):
+        """
+        在其他线程中调用，阻塞等待协程在事件循环中执行完成
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def _session(self, key):
+        session = self.sessions.get(key)
+        if session is None:
+            connector = aiohttp.TCPConnector(limit=self.size, ssl=False,
+                                             force_close=not self.keep_alive)
+            # 和sync方式一样不保存cookie，案例之间互不影响
+            session = aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar())
+            self.sessions[key] = session
+        return session
+
+    async def send(self, key, prepped, timeout):
+        """
+        发送已经组装好的请求，读取全部内容后返回AsyncResponse
+        """
+        session = self._session(key)
+        body = prepped.body
+        if body is not None and not isinstance(body, (bytes, str)):
+            # 流式上传的请求体，例如MultipartStream
+            body = self._iter_body(body)
+        async with session.request(prepped.method,
+                                   URL(prepped.url, encoded=True),
+                                   headers=dict(prepped.headers),
+                                   data=body,
+                                   timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+            content = await resp.read()
+            headers = CaseInsensitiveDict()
+            for k, v in resp.headers.items():
+                headers[k] = f"{headers[k]}, {v}" if k in headers else v
+            cookies = RequestsCookieJar()
+            for name, morsel in resp.cookies.items():
+                cookies.set(name, morsel.value)
+            return AsyncResponse(resp.status, headers, content,
+                                 resp.charset, str(resp.url), cookies)
+
+    async def _iter_body(self, body):
+        """
+        在线程池中逐块读取同步的请求体，读文件时不阻塞事件循环
+        """
+        loop = asyncio.get_running_loop()
+        chunks = iter(body)
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+
+    async def _close(self):
+        for session in self.sessions.values():
+            await session.close()
+        self.sessions.clear()
+
+    def close(self):
+        self.run(self._close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+def get_async_engine(config):
+    """
+    获取当前pytest会话的事件循环，第一次调用时根据env.yml的配置创建
+    """
+    engine = getattr(config, "_api_async_engine", None)
+    if engine is None:
+        with _engine_lock:
+            engine = getattr(config, "_api_async_engine", None)
+            if engine is None:
+                envs = get_envs(config)
+                engine = AsyncEngine(int(envs["pool_size"]), envs["keep_alive"])
+                config._api_async_engine = engine
+    return engine
+
+
+def close_async_engine(config):
+    engine = getattr(config, "_api_async_engine", None)
+    if engine is not None:
+        engine.close()
+
+
+class AsyncApiRunner(ApiRunner):
+    """
+    使用asyncio发送请求的API执行器，步骤格式和ApiRunner完全一样
+    在env.yml中配置 transport: async 启用
+    单个步骤时阻塞等待结果，parallel中的多个步骤在同一个事件循环中并发发送
+    """
+
+    engine = None
+
+    @classmethod
+    def _pooled_session(cls, config, envs):
+        """
+        请求都通过aiohttp发送，不需要requests的session
+        """
+        return None
+
+    @classmethod
+    def from_config_and_env(cls, config):
+        obj = super().from_config_and_env(config)
+        obj.engine = get_async_engine(config)
+        return obj
+
+    def _key(self):
+        return (self.proto, self.ip, str(self.port), self.auth)
+
+    def _run(self, request):
+        return self.engine.run(self._run_async(request))
+
+    async def _run_async(self, request):
+        loop = asyncio.get_running_loop()
+        with self.timer.phase("prepare"):
+            if self.auth_provider is not None:
+                # auth_provider登录时使用requests发送同步请求，放到线程池中执行，不阻塞事件循环
+                prepped, timeout = await loop.run_in_executor(None, functools.partial(self.prepare, **request))
+            else:
+                prepped, timeout = self.prepare(**request)
+        with self.timer.phase("network"):
+            res = await self.engine.send(self._key(), prepped, timeout)
+            if res.status_code == 401:
+                res = await self._retry_auth(loop, res, prepped, timeout)
+        self.timer.status_code = res.status_code
+        return res
+
+    async def _retry_auth(self, loop, res, prepped, timeout):
+        '''
+        和sync方式一样，auth_provider的请求返回401时重新登录后重发一次
+        '''
+        for hook in prepped.hooks.get("response", ()):
+            if isinstance(hook, AuthRetry):
+                prep = await loop.run_in_executor(None, hook.prepare, prepped)
+                new_res = await self.engine.send(self._key(), prep, timeout)
+                new_res.history.append(res)
+                return new_res
+        return res
+
+    async def run_async(self, step):
+        assert "request" in step, "步骤中必须要有request字段，请检查当前yml文件"
+        # 响应内容已经全部读取，stream和下载相关的校验对内存中的内容逐块进行
+        self._set_stream(step)
+        r = await self._run_async(step["request"])
+        return self._handle_response(r, step)
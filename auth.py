@@ -0,0 +1,212 @@
+'''
+登录认证
+env.yml中配置auth_provider后，整个会话只登录一次，token缓存在内存中(可选缓存到文件)，
+快过期或者请求返回401时重新登录，所有api步骤自动带上token，不需要在每个案例的前置中登录
+auth_provider:
+  type: bearer                  # bearer: token放在请求头中, cookie: 使用登录返回的cookie
+  url: /api/login               # 登录地址，相对于proto://host:port，也可以写完整的url
+  method: POST                  # 默认POST
+  json: {username: admin, password: admin}    # 登录请求的内容，也可以使用data、headers
+  token: data.token             # bearer时必填，从登录返回的json中获取token的规则，写法同return
+  cookie: sid                   # cookie时可选，只使用指定的cookie，默认使用全部cookie
+  expires_in: data.expires_in   # 可选，从登录返回的json中获取有效期(秒)的规则
+  ttl: 3600                     # 可选，没有expires_in时的有效期(秒)，默认不过期，只在401时重新登录
+  refresh_before: 60            # 提前多少秒重新登录，默认60
+  header: Authorization         # bearer时token所在的请求头，默认Authorization
+  scheme: Bearer                # token的前缀，默认Bearer，为空时只有token
+  cache_file: .api_token.json   # 可选，token缓存文件，相对于当前工作目录
+步骤中auth: none时不使用auth_provider
+'''
+import json
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+
+from requests import Session
+from requests.auth import AuthBase
+
+from .common import getcwd
+from .env import get_envs
+from .jsonpath import compile_return
+from .pool import get_session_pool
+
+AUTH_TYPES = ("bearer", "cookie")
+
+_provider_lock = threading.Lock()
+
+
+class AuthProvider(AuthBase):
+    '''
+    requests的认证对象，发送请求前带上token，返回401时重新登录后重发一次
+    @param session  登录使用的Session，默认使用连接池中的Session，录制和回放时登录请求也会录制和回放
+    '''
+
+    def __init__(self, spec, base_url, session=None):
+        self.type = spec.get("type", "bearer")
+        assert self.type in AUTH_TYPES, f"auth_provider的type只支持{'/'.join(AUTH_TYPES)}，当前为: {self.type}"
+        assert "url" in spec, "auth_provider中必须要有url字段"
+        assert self.type != "bearer" or "token" in spec, "bearer方式的auth_provider中必须要有token字段"
+        self.spec = spec
+        url = spec["url"]
+        self.url = url if url.startswith(("http://", "https://")) else f"{base_url}{url}"
+        self.refresh_before = float(spec.get("refresh_before", 60))
+        self.header = spec.get("header", "Authorization")
+        self.scheme = spec.get("scheme", "Bearer")
+        self.cache_file = Path(getcwd()) / Path(spec["cache_file"]) if spec.get("cache_file") else None
+        self.session = session if session is not None else Session()
+        self.lock = threading.Lock()
+        self.token = None
+        self.expires_at = None
+        self.logins = 0
+        self._load_cache()
+
+    def _cache_key(self):
+        content = json.dumps([self.url, self.spec.get("json"), self.spec.get("data")],
+                             sort_keys=True, default=str)
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def _load_cache(self):
+        if self.cache_file is None or not self.cache_file.exists():
+            return
+        try:
+            entry = json.loads(self.cache_file.read_text(encoding="utf-8")).get(self._cache_key())
+        except (OSError, ValueError):
+            return
+        if entry and not self._expired(entry.get("expires_at")):
+            self.token = entry["token"]
+            self.expires_at = entry.get("expires_at")
+
+    def _save_cache(self):
+        if self.cache_file is None:
+            return
+        try:
+            cache = json.loads(self.cache_file.read_text(encoding="utf-8")) if self.cache_file.exists() else {}
+        except (OSError, ValueError):
+            cache = {}
+        cache[self._cache_key()] = {"token": self.token, "expires_at": self.expires_at}
+        tmp = self.cache_file.with_name(f"{self.cache_file.name}.{os.getpid()}.tmp")
+        try:
+            # 只允许当前用户读取
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(cache, f)
+            os.replace(tmp, self.cache_file)
+        except OSError:
+            # 缓存写入失败不影响案例执行
+            if tmp.exists():
+                tmp.unlink()
+
+    def _expired(self, expires_at):
+        return expires_at is not None and time.time() >= expires_at - self.refresh_before
+
+    def login(self):
+        spec = self.spec
+        res = self.session.request(spec.get("method", "POST").upper(), self.url,
+                                   json=spec.get("json"), data=spec.get("data"),
+                                   headers=spec.get("headers"), verify=False,
+                                   timeout=spec.get("timeout", 20))
+        assert res.status_code < 400, f"auth_provider登录失败，状态码:{res.status_code}, 返回内容:{res.text}"
+        rules = {}
+        if self.type == "bearer":
+            rules["token"] = spec["token"]
+        if "expires_in" in spec:
+            rules["expires_in"] = spec["expires_in"]
+        values = {}
+        if rules:
+            try:
+                body = res.json()
+            except ValueError:
+                raise AssertionError(f"auth_provider登录返回非json结构，内容为{res.text}")
+            values = compile_return(rules).extract(body)
+        if self.type == "bearer":
+            token = values.get("token")
+        else:
+            cookies = res.cookies.get_dict()
+            if spec.get("cookie"):
+                assert spec["cookie"] in cookies, f"auth_provider登录返回的cookie中没有{spec['cookie']}"
+                cookies = {spec["cookie"]: cookies[spec["cookie"]]}
+            token = cookies
+        assert token, f"auth_provider登录返回中没有获取到token，返回内容:{res.text}"
+        ttl = values.get("expires_in", spec.get("ttl"))
+        self.token = token
+        self.expires_at = time.time() + float(ttl) if ttl else None
+        self.logins += 1
+        self._save_cache()
+
+    def get_token(self, stale=None):
+        '''
+        @param stale  返回401时使用的token，和当前token相同时重新登录
+        '''
+        with self.lock:
+            if self.token is None or self._expired(self.expires_at) or \
+                    (stale is not None and stale == self.token):
+                self.login()
+            return self.token
+
+    def _apply(self, r, token):
+        if self.type == "bearer":
+            r.headers[self.header] = f"{self.scheme} {token}" if self.scheme else token
+        else:
+            cookie = "; ".join(f"{k}={v}" for k, v in token.items())
+            r.headers["Cookie"] = f"{r.headers['Cookie']}; {cookie}" if r.headers.get("Cookie") else cookie
+
+    def __call__(self, r):
+        token = self.get_token()
+        self._apply(r, token)
+        r.register_hook("response", AuthRetry(self, token))
+        return r
+
+
+class AuthRetry:
+    '''
+    请求的response钩子，返回401时重新登录并重发一次请求
+    sync方式由requests调用，async方式的响应没有连接，由AsyncApiRunner调用prepare后自己重发
+    录制和回放时connection是ReplayAdapter，重发的请求同样录制或者回放
+    @param token  发送请求时使用的token
+    '''
+
+    def __init__(self, provider, token):
+        self.provider = provider
+        self.token = token
+
+    def prepare(self, request):
+        '''
+        重新登录(token已经被其他请求刷新时直接使用新的token)，返回带上新token的请求
+        '''
+        prep = request.copy()
+        if self.provider.type == "cookie":
+            prep.headers.pop("Cookie", None)
+        self.provider._apply(prep, self.provider.get_token(stale=self.token))
+        return prep
+
+    def __call__(self, res, **kw):
+        connection = getattr(res, "connection", None)
+        if res.status_code != 401 or connection is None:
+            return res
+        res.content
+        res.close()
+        prep = self.prepare(res.request)
+        new_res = connection.send(prep, **kw)
+        new_res.history.append(res)
+        new_res.request = prep
+        return new_res
+
+
+def get_auth_provider(config):
+    '''
+    env.yml中配置了auth_provider时返回AuthProvider，否则返回None
+    '''
+    if not hasattr(config, "_api_auth_provider"):
+        with _provider_lock:
+            if not hasattr(config, "_api_auth_provider"):
+                envs = get_envs(config)
+                spec = envs["auth_provider"]
+                provider = None
+                if spec:
+                    base_url = f"{envs['proto']}://{envs['host']}:{envs['port']}"
+                    session = get_session_pool(config).get(envs["proto"], envs["host"], envs["port"])
+                    provider = AuthProvider(spec, base_url, session)
+                config._api_auth_provider = provider
+    return config._api_auth_provider
@@ -0,0 +1,126 @@
+'''
+框架自身热点路径的耗时，不包含接口耗时
+    template   变量替换(_re_step)，变量字典很大时的耗时
+    json_check 响应校验，MB级别的json
+    stream     流式json校验
+    return     返回值规则提取(_get_json_value_by_rule)
+    step       单个api步骤除网络之外的耗时(替换、组装、校验、返回值)，使用本地桩服务
+使用方式: python benchmarks/bench_hotpaths.py --variables 10000 --items 20000 --rounds 20
+'''
+import argparse
+import json
+import statistics
+import time
+
+from pytest_api.common import json_check
+from pytest_api.jsonpath import compile_return
+from pytest_api.jsonstream import iter_events, stream_json_check
+from pytest_api.pool import SessionPool
+from pytest_api.runner import ApiRunner
+from pytest_api.template import Template
+from pytest_api.timing import PHASES, StepTimer
+
+from stub_server import StubServer
+
+
+def bench(name, func, rounds):
+    '''
+    预热一次后执行rounds次，输出最小值、中位数和平均值
+    '''
+    func()
+    costs = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        costs.append(time.perf_counter() - start)
+    print(f"{name:<36} min {min(costs) * 1000:>9.3f} ms  median {statistics.median(costs) * 1000:>9.3f} ms"
+          f"  mean {statistics.mean(costs) * 1000:>9.3f} ms")
+
+
+def make_variables(count):
+    variables = {f"var{i}": f"value{i}" for i in range(count)}
+    variables.update({"token": "tok", "num": 5, "obj": {"a": [1, 2, 3]}})
+    return variables
+
+
+def make_step():
+    return {
+        "name": "bench",
+        "api": {
+            "request": {
+                "url": "/users/${token}/items?page=${var1}",
+                "method": "POST",
+                "headers": {"Authorization": "Bearer ${token}"},
+                "json": {"num": "${num}", "obj": "${obj}", "text": "a-${var1}-b", "quoted": "\"${num}\""},
+            },
+            "response": {"status_code": 200, "json": {"code": 0}},
+            "return": {"first": "items.0.id", "ids": "items[*].id"},
+        },
+    }
+
+
+def make_response(items):
+    return {"code": 0, "items": [{"id": i, "name": f"item{i}", "tags": ["a", "b"]} for i in range(items)]}
+
+
+def bench_step_overhead(server, pool, rounds, items):
+    '''
+    使用StepTimer统计每个阶段的耗时，除network之外的阶段都是框架自身的开销
+    '''
+    step = make_step()["api"]
+    step["request"]["url"] = f"/bench?size={items}"
+    step["request"].pop("headers")
+    template = Template(step)
+    variables = make_variables(100)
+    totals = {phase: [] for phase in PHASES}
+    for _ in range(rounds):
+        timer = StepTimer()
+        runner = ApiRunner(server.host, server.port, "", pool.get("http", server.host, server.port))
+        runner.proto = "http"
+        runner.timer = timer
+        with timer.phase("substitute"):
+            rendered = template.render(variables)
+        runner.run(rendered)
+        for phase in PHASES:
+            totals[phase].append(timer.get(phase))
+    overhead = [sum(totals[p][i] for p in PHASES if p != "network") for i in range(rounds)]
+    print(f"单个步骤(返回{items}个元素) 各阶段中位数:")
+    for phase in PHASES:
+        print(f"    {phase:<12} {statistics.median(totals[phase]) * 1000:>9.3f} ms")
+    print(f"    {'框架开销':<10} {statistics.median(overhead) * 1000:>9.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--variables", type=int, default=10000, help="全局变量个数")
+    parser.add_argument("--items", type=int, default=20000, help="响应json中数组元素个数")
+    parser.add_argument("--rounds", type=int, default=20, help="每项执行次数")
+    args = parser.parse_args()
+
+    variables = make_variables(args.variables)
+    step = make_step()
+    response = make_response(args.items)
+    content = json.dumps(response).encode("utf-8")
+    expt = {"code": 0, "items": [{"id": i, "name": f"item{i}"} for i in range(args.items)]}
+    rules = {"first": "items.0.id", "last": "items[-1].name", "ids": "items[*].id",
+             "named": "items[?name=='item10'].id", "page": "items[0:10]"}
+    print(f"变量个数: {args.variables}, 响应大小: {len(content) / 1024 / 1024:.2f} MB")
+
+    bench("template 编译", lambda: Template(step), args.rounds)
+    template = Template(step)
+    bench("template 替换", lambda: template.render(variables), args.rounds)
+    bench("json 解析", lambda: json.loads(content), args.rounds)
+    bench("json_check", lambda: json_check(response, expt), args.rounds)
+    chunks = [content[i:i + 65536] for i in range(0, len(content), 65536)]
+    bench("stream_json_check", lambda: stream_json_check(iter_events(chunks), expt), args.rounds)
+    bench("return 规则提取", lambda: compile_return(rules).extract(response), args.rounds)
+
+    pool = SessionPool()
+    with StubServer() as server:
+        bench_step_overhead(server, pool, args.rounds, 100)
+        bench_step_overhead(server, pool, args.rounds, args.items)
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
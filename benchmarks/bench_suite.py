@@ -0,0 +1,147 @@
+'''
+生成大量案例文件，统计收集耗时和每个案例、每个步骤的框架开销
+    collect  pytest --collect-only的耗时，分别统计不使用解析缓存(冷)和使用解析缓存(热)
+    run      对本地桩服务执行全部案例，通过--api-timing-report统计除network之外的耗时
+使用方式: python benchmarks/bench_suite.py --files 1000 --steps 3
+        python benchmarks/bench_suite.py --files 10000 --skip-run
+案例在临时目录中生成，指定--corpus时生成到该目录并保留，目录中已经有案例时直接使用
+'''
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from stub_server import StubServer
+
+CASE_TEMPLATE = """name: case_{index}
+tags: [{tag}]
+steps:
+"""
+
+STEP_TEMPLATE = """  - name: step_{step}
+    api:
+      request:
+        url: /cases/{index}/steps/{step}?size=${{size}}
+        method: POST
+        json: {{user: "${{user}}", index: {index}, token: "${{token_{step}}}"}}
+      response:
+        status_code: 200
+        json: {{code: 0}}
+      return: {{token_{next}: items.0.name}}
+"""
+
+
+def update_env(root, host, port):
+    (root / "env.yml").write_text(f"proto: http\nhost: {host}\nport: {port}\n", encoding="utf-8")
+
+
+def write_corpus(root, files, steps, host, port):
+    root.mkdir(parents=True, exist_ok=True)
+    update_env(root, host, port)
+    (root / "variables.yml").write_text("user: bench\nsize: \"10\"\ntoken_0: init\n", encoding="utf-8")
+    # 每个目录最多1000个文件
+    for index in range(files):
+        directory = root / f"d{index // 1000}"
+        directory.mkdir(exist_ok=True)
+        content = CASE_TEMPLATE.format(index=index, tag="odd" if index % 2 else "even")
+        content += "".join(STEP_TEMPLATE.format(index=index, step=step, next=step + 1) for step in range(steps))
+        (directory / f"case_{index}.yml").write_text(content, encoding="utf-8")
+
+
+def pytest(root, *args):
+    '''
+    在案例目录中执行pytest，返回耗时(秒)和进程结果
+    '''
+    cmd = [sys.executable, "-m", "pytest", "-q", "-p", "no:randomly", *args, "."]
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=root, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    cost = time.perf_counter() - start
+    if proc.returncode not in (0, 1):
+        print(proc.stdout.decode("utf-8", "replace")[-2000:])
+        raise SystemExit(f"pytest执行失败，返回码{proc.returncode}: {' '.join(cmd)}")
+    return cost, proc
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def summary(name, values):
+    print(f"{name:<24} mean {statistics.mean(values):>9.3f} ms  p50 {percentile(values, 50):>9.3f} ms"
+          f"  p95 {percentile(values, 95):>9.3f} ms  max {max(values):>9.3f} ms")
+
+
+def bench_collect(root, files, rounds):
+    cache_dir = f"cache_dir={root / '.pytest_cache'}"
+    cold = [pytest(root, "--co", "--api-no-cache", "-o", cache_dir)[0] for _ in range(rounds)]
+    # 先执行一次生成解析缓存
+    pytest(root, "--co", "-o", cache_dir)
+    warm = [pytest(root, "--co", "-o", cache_dir)[0] for _ in range(rounds)]
+    tagged = [pytest(root, "--co", "--include=odd", "-o", cache_dir)[0] for _ in range(rounds)]
+    print(f"收集{files}个案例文件:")
+    for name, costs in (("冷(--api-no-cache)", cold), ("热(解析缓存)", warm), ("热+标签过滤", tagged)):
+        cost = min(costs)
+        print(f"    {name:<20} {cost * 1000:>10.1f} ms  {cost / files * 1000 * 1000:>8.1f} us/文件")
+
+
+def bench_run(root):
+    report = root / "timing.json"
+    cost, proc = pytest(root, f"--api-timing-report={report}", "-o", f"cache_dir={root / '.pytest_cache'}")
+    rows = json.loads(report.read_text(encoding="utf-8"))
+    failed = sum(1 for row in rows if not row["ok"])
+    cases = defaultdict(float)
+    steps = []
+    for row in rows:
+        overhead = row["total_ms"] - row["network_ms"]
+        steps.append(overhead)
+        cases[row["case"]] += overhead
+    print(f"执行{len(cases)}个案例、{len(rows)}个步骤，失败步骤{failed}个，总耗时{cost:.1f} s")
+    summary("步骤框架开销", steps)
+    summary("案例框架开销", list(cases.values()))
+    summary("步骤network", [row["network_ms"] for row in rows])
+    if failed:
+        print(proc.stdout.decode("utf-8", "replace")[-2000:])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=1000, help="案例文件个数")
+    parser.add_argument("--steps", type=int, default=3, help="每个案例的步骤数")
+    parser.add_argument("--rounds", type=int, default=3, help="收集耗时的执行次数，取最小值")
+    parser.add_argument("--corpus", help="案例目录，默认使用临时目录")
+    parser.add_argument("--skip-collect", action="store_true", help="不统计收集耗时")
+    parser.add_argument("--skip-run", action="store_true", help="不执行案例")
+    args = parser.parse_args()
+
+    tmp = None
+    if args.corpus:
+        root = Path(args.corpus).resolve()
+    else:
+        tmp = tempfile.TemporaryDirectory()
+        root = Path(tmp.name)
+    try:
+        with StubServer() as server:
+            if not any(root.glob("d*/case_*.yml")):
+                start = time.perf_counter()
+                write_corpus(root, args.files, args.steps, server.host, server.port)
+                print(f"生成{args.files}个案例文件: {(time.perf_counter() - start) * 1000:.1f} ms, 目录{root}")
+            else:
+                update_env(root, server.host, server.port)
+            files = sum(1 for _ in root.glob("d*/case_*.yml"))
+            if not args.skip_collect:
+                bench_collect(root, files, args.rounds)
+            if not args.skip_run:
+                bench_run(root)
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+'''
+对比sync和async两种transport的api步骤执行耗时
+使用方式: python benchmarks/bench_transport.py --requests 200 --delay 20
+'''
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pytest_api.aio import AsyncApiRunner, AsyncEngine
+from pytest_api.pool import SessionPool
+from pytest_api.runner import ApiRunner
+
+from stub_server import StubServer
+
+
+def make_runner(cls, server, pool, engine=None):
+    obj = cls(server.host, server.port, "", pool.get("http", server.host, server.port))
+    obj.proto = "http"
+    if engine is not None:
+        obj.engine = engine
+    return obj
+
+
+def step(delay):
+    return {
+        "request": {"url": f"/bench?delay={delay}", "method": "GET"},
+        "response": {"status_code": 200, "json": {"code": 0}},
+    }
+
+
+def bench(name, func, count):
+    start = time.perf_counter()
+    func()
+    cost = time.perf_counter() - start
+    print(f"{name:<28} {cost * 1000:>10.1f} ms  {count / cost:>10.1f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200, help="请求总数")
+    parser.add_argument("--delay", type=int, default=20, help="桩服务每个请求的耗时，毫秒")
+    parser.add_argument("--concurrency", type=int, default=20, help="并发数")
+    args = parser.parse_args()
+
+    pool = SessionPool(size=args.concurrency)
+    engine = AsyncEngine(size=args.concurrency)
+    steps = [step(args.delay) for _ in range(args.requests)]
+    with StubServer() as server:
+        def sync_serial():
+            for s in steps:
+                make_runner(ApiRunner, server, pool).run(s)
+
+        def sync_threads():
+            with ThreadPoolExecutor(args.concurrency) as executor:
+                list(executor.map(lambda s: make_runner(ApiRunner, server, pool).run(s), steps))
+
+        async def gather():
+            import asyncio
+            sem = asyncio.Semaphore(args.concurrency)
+
+            async def one(s):
+                async with sem:
+                    return await make_runner(AsyncApiRunner, server, pool, engine).run_async(s)
+            return await asyncio.gather(*[one(s) for s in steps])
+
+        bench("sync 串行", sync_serial, args.requests)
+        bench(f"sync 线程池({args.concurrency})", sync_threads, args.requests)
+        bench(f"async 并发({args.concurrency})", lambda: engine.run(gather()), args.requests)
+    engine.close()
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
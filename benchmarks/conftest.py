@@ -0,0 +1,7 @@
+'''
+bench_hotpaths和stub_server按顶层模块导入，和直接执行 python benchmarks/bench_xxx.py 时一样
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
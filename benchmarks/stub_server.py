@@ -0,0 +1,69 @@
+'''
+本地的http桩服务，给性能测试使用
+GET/POST任意路径都返回json，支持以下查询参数：
+    delay   返回前等待的毫秒数，模拟接口耗时
+    size    返回的数组元素个数，模拟大报文
+'''
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 缓冲输出，避免头部和内容分两次发送触发延迟确认
+    wbufsize = -1
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        query = parse_qs(urlparse(self.path).query)
+        delay = int(query.get("delay", ["0"])[0])
+        size = int(query.get("size", ["0"])[0])
+        if delay:
+            time.sleep(delay / 1000)
+        body = json.dumps({
+            "code": 0,
+            "path": self.path,
+            "items": [{"id": i, "name": f"item{i}"} for i in range(size)],
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _reply
+
+
+class _Server(ThreadingHTTPServer):
+    # 默认的监听队列只有5，并发建连时会丢包重传
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class StubServer:
+    """
+    在后台线程中启动桩服务，port为0时随机分配端口
+    with StubServer() as server:
+        server.port
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.httpd = _Server((host, port), StubHandler)
+        self.host, self.port = self.httpd.server_address[:2]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
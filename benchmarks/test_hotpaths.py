@@ -0,0 +1,102 @@
+'''
+pytest-benchmark版本的热点路径性能测试，每项带一个宽松的耗时上限，明显变慢时失败
+使用方式: pytest benchmarks 或者 tox -e bench
+对比历史结果: pytest benchmarks --benchmark-autosave --benchmark-compare
+'''
+import json
+import sys
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from pytest_api.common import json_check  # noqa: E402
+from pytest_api.jsonpath import compile_return  # noqa: E402
+from pytest_api.jsonstream import iter_events, stream_json_check  # noqa: E402
+from pytest_api.pool import SessionPool  # noqa: E402
+from pytest_api.runner import ApiRunner, ExecRunner  # noqa: E402
+from pytest_api.template import Template  # noqa: E402
+
+# benchmarks/conftest.py把当前目录加入了sys.path
+from bench_hotpaths import make_response, make_step, make_variables  # noqa: E402
+from stub_server import StubServer  # noqa: E402
+
+ITEMS = 20000
+VARIABLES = 10000
+
+
+def check_limit(benchmark, seconds):
+    '''
+    平均耗时不能超过seconds秒，--benchmark-disable时不统计耗时，不检查
+    '''
+    stats = getattr(benchmark, "stats", None)
+    if stats is not None:
+        assert stats.stats.mean < seconds, f"平均耗时{stats.stats.mean:.3f}s超过上限{seconds}s"
+
+
+@pytest.fixture(scope="module")
+def response():
+    return make_response(ITEMS)
+
+
+@pytest.fixture(scope="module")
+def expected():
+    return {"code": 0, "items": [{"id": i, "name": f"item{i}"} for i in range(ITEMS)]}
+
+
+def test_template_render(benchmark):
+    template = Template(make_step())
+    variables = make_variables(VARIABLES)
+    rendered = benchmark(template.render, variables)
+    assert rendered["api"]["request"]["json"]["obj"] == {"a": [1, 2, 3]}
+    check_limit(benchmark, 0.01)
+
+
+def test_json_check(benchmark, response, expected):
+    benchmark(json_check, response, expected)
+    check_limit(benchmark, 0.5)
+
+
+def test_stream_json_check(benchmark, response, expected):
+    content = json.dumps(response).encode("utf-8")
+    chunks = [content[i:i + 65536] for i in range(0, len(content), 65536)]
+    benchmark(lambda: stream_json_check(iter_events(chunks), expected))
+    check_limit(benchmark, 2)
+
+
+def test_return_extract(benchmark, response):
+    rules = {"first": "items.0.id", "last": "items[-1].name", "ids": "items[*].id",
+             "named": "items[?name=='item10'].id", "page": "items[0:10]"}
+    values = benchmark(lambda: compile_return(rules).extract(response))
+    assert len(values["ids"]) == ITEMS
+    check_limit(benchmark, 0.2)
+
+
+def test_exec_large_output(benchmark):
+    # 5MB输出
+    step = {"request": {"args": [sys.executable, "-c", "import sys\nsys.stdout.write('x' * 5 * 1024 * 1024)"]},
+            "return": "out"}
+    values = benchmark.pedantic(lambda: ExecRunner().run(step), rounds=5)
+    assert len(values["out"]) == 5 * 1024 * 1024
+    check_limit(benchmark, 1)
+
+
+def test_step_overhead(benchmark):
+    step = make_step()["api"]
+    step["request"]["url"] = "/bench?size=100"
+    step["request"].pop("headers")
+    template = Template(step)
+    variables = make_variables(100)
+    pool = SessionPool()
+    with StubServer() as server:
+        session = pool.get("http", server.host, server.port)
+
+        def run():
+            runner = ApiRunner(server.host, server.port, "", session)
+            runner.proto = "http"
+            return runner.run(template.render(variables))
+
+        values = benchmark(run)
+    pool.close()
+    assert values["ids"] == list(range(100))
+    check_limit(benchmark, 0.05)
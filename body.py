@@ -0,0 +1,63 @@
+'''
+响应内容的封装，json只解析一次，校验和返回值处理共用
+env.yml中配置 json_backend: orjson 时使用orjson解析，没有安装orjson时使用标准库
+'''
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 未解析的标记
+_unset = object()
+
+
+def get_json_loads(backend):
+    if backend == "orjson" and orjson is not None:
+        return orjson.loads
+    return json.loads
+
+
+def _is_legacy(encoding):
+    '''
+    非utf编码(例如gbk)不能直接按bytes解析
+    '''
+    return bool(encoding) and not encoding.lower().replace("_", "-").startswith("utf")
+
+
+class ResponseBody:
+    """
+    @param content    bytes|str   响应的原始内容
+    @param text_func  callable    获取文本内容的函数，只调用一次
+    @param loads      callable    json解析函数
+    @param encoding   str         响应头中声明的编码，不是utf时先按编码转成文本再解析，和requests的json()一致
+    """
+
+    def __init__(self, content, text_func, loads=json.loads, encoding=None):
+        self.content = content
+        self.encoding = encoding
+        self._text_func = text_func
+        self._loads = loads
+        self._text = _unset
+        self._json = _unset
+        self._error = None
+
+    @property
+    def text(self):
+        if self._text is _unset:
+            self._text = self._text_func()
+        return self._text
+
+    def json(self):
+        '''
+        第一次调用时解析，之后直接返回解析结果，解析失败时每次都抛出同样的异常
+        '''
+        if self._json is _unset and self._error is None:
+            try:
+                self._json = self._loads(self.text if _is_legacy(self.encoding) else self.content)
+            except ValueError as e:
+                self._error = e
+        if self._error is not None:
+            raise self._error
+        return self._json
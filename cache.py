@@ -0,0 +1,94 @@
+'''
+案例文件的解析缓存
+解析后的案例结构以pickle格式保存在pytest的缓存目录中，
+案例文件和!import导入的文件都没有修改时，下次收集直接使用缓存，不再解析yml
+'''
+import hashlib
+import os
+import pickle
+
+from .common import read_yaml_with_imports
+
+# 缓存格式变化时修改版本号，旧的缓存自动失效
+CACHE_VERSION = 1
+
+
+def _stat(path):
+    '''
+    文件的修改时间和大小，文件不存在时返回None
+    '''
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class CaseCache:
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _file(self, path):
+        name = hashlib.sha1(str(path).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{name}.pickle")
+
+    def get(self, path):
+        '''
+        缓存有效时返回解析后的案例，否则返回None
+        '''
+        try:
+            with open(self._file(path), "rb") as f:
+                entry = pickle.load(f)
+        except Exception:
+            return None
+        if entry.get("version") != CACHE_VERSION or entry.get("path") != str(path):
+            return None
+        for file_path, stat in entry["files"].items():
+            if _stat(file_path) != stat:
+                return None
+        return entry["data"]
+
+    def set(self, path, data, imports):
+        files = {str(path): _stat(path)}
+        for file_path in imports:
+            files[file_path] = _stat(file_path)
+        entry = {"version": CACHE_VERSION, "path": str(path), "files": files, "data": data}
+        tmp = f"{self._file(path)}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._file(path))
+        except Exception:
+            # 缓存写入失败不影响案例执行
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+def get_case_cache(config):
+    '''
+    没有启用pytest的缓存插件或者带了--api-no-cache时返回None
+    '''
+    if not hasattr(config, "_api_case_cache"):
+        cache = None
+        if getattr(config, "cache", None) is not None and not config.getoption("--api-no-cache", False):
+            # pytest7之前只有makedir
+            mkdir = getattr(config.cache, "mkdir", None) or config.cache.makedir
+            cache = CaseCache(str(mkdir("pytest_api_cases")))
+        config._api_case_cache = cache
+    return config._api_case_cache
+
+
+def load_case(config, path):
+    '''
+    读取案例文件，优先使用缓存
+    '''
+    cache = get_case_cache(config)
+    if cache is not None:
+        data = cache.get(path)
+        if data is not None:
+            return data
+    data, imports = read_yaml_with_imports(path)
+    if cache is not None:
+        cache.set(path, data, imports)
+    return data
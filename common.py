@@ -1,18 +1,33 @@
 import os
+import copy
+import threading
 from pathlib import Path
 
 import yaml
 
 
-class Loader(yaml.FullLoader):
+# 安装了libyaml时使用C实现的解析器，速度快很多
+_BaseLoader = getattr(yaml, "CFullLoader", yaml.FullLoader)
+
+
+class Loader(_BaseLoader):
     """
     增加支持 !import的语法解析
+    imports记录解析过程中导入的所有文件，包括嵌套导入的文件
     """
 
+    def __init__(self, stream):
+        super().__init__(stream)
+        # C实现的解析器没有name属性
+        self.name = getattr(stream, "name", "<unicode string>")
+        self.imports = []
+
     def import_yml(self, node):
-        file_path = Path(self.name).parent / Path(node.value)
-        with open(file_path, "r", encoding="utf-8") as f:
-            return yaml.load(f, Loader)
+        file_path = (Path(self.name).parent / Path(node.value)).resolve()
+        data, imports = import_cache.load(file_path)
+        self.imports.append(str(file_path))
+        self.imports.extend(imports)
+        return data
 
 # 增加自定义标签!import
 Loader.add_constructor("!import", Loader.import_yml)
@@ -22,38 +37,253 @@ def getcwd():
     return os.getcwd()
 
 
+class ImportCache:
+    """
+    !import导入文件的缓存，同一个pytest会话中每个文件只解析一次
+    返回的是深拷贝，案例之间修改导入的内容不会互相影响
+    """
+
+    def __init__(self):
+        self.fragments = {}
+        self.hits = 0
+        self.misses = 0
+        # 当前正在导入的文件，用来检测循环导入
+        self._local = threading.local()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def load(self, path):
+        stack = self._stack()
+        if path in stack:
+            chain = " -> ".join(str(p) for p in stack[stack.index(path):] + [path])
+            raise yaml.YAMLError(f"!import循环导入: {chain}")
+        entry = self.fragments.get(path)
+        if entry is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            stack.append(path)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = _load(f)
+            finally:
+                stack.pop()
+            self.fragments[path] = entry
+        data, imports = entry
+        return copy.deepcopy(data), imports
+
+    def clear(self):
+        self.fragments.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+import_cache = ImportCache()
+
+
+def _load(stream):
+    loader = Loader(stream)
+    try:
+        return loader.get_single_data(), loader.imports
+    finally:
+        loader.dispose()
+
+
 def read_yaml(path):
     with open(path, "r", encoding="utf-8") as f:
         return yaml.load(f, Loader=Loader)
 
 
+def read_yaml_with_imports(path):
+    """
+    读取yml文件，同时返回!import导入的所有文件
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return _load(f)
+
+
 def yaml_load(content):
     return yaml.load(content, Loader=Loader)
 
 
+LIST_MODES = ("strict", "subset", "unordered")
+
+
+def list_spec(expt):
+    '''
+    数组的匹配方式，期望值写成以下形式时生效，否则返回None按原来的方式逐个对比：
+    $mode: subset          # strict: 默认，长度一致并且按顺序对比
+                           # subset: 期望的元素都能在返回的数组中找到，不要求顺序和长度
+                           # unordered: 和subset一样，但是要求长度一致
+    $match_by: id          # 可选，按id字段建立索引，只和id相同的元素对比，默认为subset
+    $items:                # 期望的元素
+      - {id: 1, name: a}
+    @return (mode, key, items)
+    '''
+    if not isinstance(expt, dict) or "$items" not in expt:
+        return None
+    key = expt.get("$match_by")
+    mode = expt.get("$mode", "subset" if key is not None else "strict")
+    assert mode in LIST_MODES, f"数组匹配方式$mode只支持{'/'.join(LIST_MODES)}，当前为: {mode}"
+    assert not (mode == "strict" and key is not None), "$match_by只能和subset或unordered一起使用"
+    assert isinstance(expt["$items"], list), f"$items必须是数组，当前为: {expt['$items']}"
+    return mode, key, expt["$items"]
+
+
+class ListMatcher:
+    '''
+    subset和unordered方式的数组匹配，返回的元素逐个传入feed，最后调用finish
+    使用$match_by时按期望元素的key建立哈希索引，每个返回的元素只和key相同的期望元素对比
+    没有$match_by时记录每个返回的元素能匹配哪些期望的元素，最后用增广路径做二分图匹配，
+    避免一个返回的元素先占用了期望的元素，导致其他元素找不到匹配
+    '''
+
+    def __init__(self, spec, is_container_compare=False):
+        self.mode, self.key, items = spec
+        self.is_container_compare = is_container_compare
+        self.items = items
+        self.total = len(items)
+        self.pending = dict(enumerate(items))
+        self.errors = {}
+        self.index = {}
+        # 没有$match_by时，每个返回的元素能匹配的期望元素下标
+        self.candidates = []
+        if self.key is not None:
+            for idx, item in self.pending.items():
+                assert isinstance(item, dict) and self.key in item, \
+                    f"使用$match_by: {self.key}时，期望的元素中必须有{self.key}字段: {item}"
+                self.index.setdefault(item[self.key], []).append(idx)
+
+    def feed(self, item):
+        if self.key is None:
+            matched = []
+            for idx, expt in enumerate(self.items):
+                try:
+                    json_check(item, expt, self.is_container_compare)
+                except AssertionError:
+                    continue
+                matched.append(idx)
+            if matched:
+                self.candidates.append(matched)
+            return
+        if not isinstance(item, dict) or self.key not in item:
+            return
+        try:
+            candidates = self.index.get(item[self.key], ())
+        except TypeError:
+            return
+        for idx in candidates:
+            if idx not in self.pending:
+                continue
+            try:
+                json_check(item, self.pending[idx], self.is_container_compare)
+            except AssertionError as e:
+                self.errors[idx] = e
+                continue
+            del self.pending[idx]
+            return
+
+    def _match(self):
+        '''
+        二分图最大匹配，返回{期望元素下标: 返回元素下标}
+        '''
+        owner = {}
+        assigned = {}
+        for start in range(len(self.candidates)):
+            if len(owner) == self.total:
+                break
+            # 广度优先查找到未匹配期望元素的增广路径
+            parent = {}
+            queue = [start]
+            head = 0
+            found = None
+            while head < len(queue) and found is None:
+                cur = queue[head]
+                head += 1
+                for idx in self.candidates[cur]:
+                    if idx in parent:
+                        continue
+                    parent[idx] = cur
+                    if idx not in owner:
+                        found = idx
+                        break
+                    queue.append(owner[idx])
+            while found is not None:
+                cur = parent[found]
+                previous = assigned.get(cur)
+                owner[found] = cur
+                assigned[cur] = found
+                found = previous
+        return owner
+
+    def finish(self, count):
+        if self.mode == "unordered":
+            assert count == self.total, f"返回值校验失败，返回的数组长度{count}和期望的数组长度{self.total}不一致"
+        if self.key is None:
+            owner = self._match()
+            for idx, expt in enumerate(self.items):
+                if idx not in owner:
+                    raise AssertionError(f"返回值校验失败，数组中没有找到期望的元素: {expt}")
+            return
+        for idx, expt in self.pending.items():
+            error = self.errors.get(idx)
+            if error is None:
+                raise AssertionError(f"返回值校验失败，数组中没有{self.key}为{expt[self.key]}的元素")
+            raise AssertionError(f"返回值校验失败，{self.key}为{expt[self.key]}的元素不一致: {error}")
+
+
+def _dict_children(ori, expt):
+    assert isinstance(expt, dict), f"返回值校验失败：期望值：{expt}, 实际值：{ori}"
+    for key, value in expt.items():
+        if "err_code" in expt:
+            continue
+        assert key in ori, f"返回值校验失败，数据：{ori}, 返回值中没有要校验对象: {key}"
+        yield ori[key], value
+
+
+def _list_children(ori, expt):
+    assert len(ori) == len(expt), f"返回值校验失败，校验的数组长度已经超出返回的数组长度。" \
+        f"期望值: {expt},实际值{ori}"
+    for index, exptItem in enumerate(expt):
+        yield ori[index], exptItem
+
+
 def json_check(ori, expt, is_container_compare=False):
     '''
     @params ori 源数据
     @params expt  期望数据
     @params is_container_compare  字符串对比方式是否采用包含方式，默认是非包含方式对比
     json 字符串包含关系判断，是否ori 包含 expt
+    使用栈代替递归遍历，嵌套很深的数据也不会超过递归深度限制，校验顺序和递归时一致
     '''
-    if isinstance(ori, dict):
-        """若为字典模式"""
-        for key, value in expt.items():
-            if "err_code" in expt:
-                continue
-            assert key in ori, f"返回值校验失败，数据：{ori}, 返回值中没有要校验对象: {key}"
-            json_check(ori[key], value, is_container_compare)
-    elif isinstance(ori, list):
-        assert len(ori) == len(expt), f"返回值校验失败，校验的数组长度已经超出返回的数组长度。" \
-            f"期望值: {expt},实际值{ori}"
-        for index, exptItem in enumerate(expt):
-            json_check(ori[index], exptItem, is_container_compare)
-    elif isinstance(ori, str):
-        if is_container_compare:
-            assert expt in ori, f"返回值校验失败：期望值：{expt}, 实际值：{ori}, 非包含关系"
+    stack = [iter([(ori, expt)])]
+    while stack:
+        pair = next(stack[-1], None)
+        if pair is None:
+            stack.pop()
+            continue
+        ori, expt = pair
+        if isinstance(ori, dict):
+            """若为字典模式"""
+            stack.append(_dict_children(ori, expt))
+        elif isinstance(ori, list):
+            spec = list_spec(expt)
+            if spec is None:
+                stack.append(_list_children(ori, expt))
+            elif spec[0] == "strict":
+                stack.append(_list_children(ori, spec[2]))
+            else:
+                matcher = ListMatcher(spec, is_container_compare)
+                for item in ori:
+                    matcher.feed(item)
+                matcher.finish(len(ori))
+        elif isinstance(ori, str):
+            if is_container_compare:
+                assert expt in ori, f"返回值校验失败：期望值：{expt}, 实际值：{ori}, 非包含关系"
+            else:
+                assert ori == expt, f"返回值校验失败：期望值：{expt}, 实际值：{ori}"
         else:
             assert ori == expt, f"返回值校验失败：期望值：{expt}, 实际值：{ori}"
-    else:
-        assert ori == expt, f"返回值校验失败：期望值：{expt}, 实际值：{ori}"
\ No newline at end of file
@@ -9,12 +9,33 @@ defaults_envs = {
     "container_compare": True,
     "urlprefix": "",
     "headers": None,
-    "auth": None
+    "auth": None,
+    # 登录认证，格式见auth.py
+    "auth_provider": None,
+    # 连接池大小和是否保持长连接
+    "pool_size": 10,
+    "keep_alive": True,
+    # api请求的发送方式，sync为requests，async为aiohttp
+    "transport": "sync",
+    # 响应json的解析方式，json为标准库，orjson需要安装orjson
+    "json_backend": "json",
+    # exec动作的默认超时时间(秒)和最多保留的输出大小(字节)
+    "exec_timeout": 600,
+    "exec_max_output": 10 * 1024 * 1024
 }
 
 
+def get_env_path():
+    return Path(getcwd()) / Path("env.yml")
+
+
+def get_env_mtime():
+    env_path = get_env_path()
+    return env_path.stat().st_mtime if env_path.exists() else None
+
+
 def get_envs_from_yml():
-    env_path = Path(getcwd()) / Path("env.yml")
+    env_path = get_env_path()
     envs = {}
     if env_path.exists():
         envs = read_yaml(env_path)
@@ -35,10 +56,19 @@ def get_envs_from_cmd(config):
 def get_envs(config):
     """
     优先从命令行获取，没有则从yml文件文件，再没有从默认值中获取
+    解析结果缓存在config上，整个pytest会话只解析一次env.yml
+    带--env-reload时，env.yml的修改时间变化后重新解析
     """
+    cached = getattr(config, "_api_envs", None)
+    if cached is not None:
+        mtime, envs = cached
+        if not config.getoption("--env-reload", False) or mtime == get_env_mtime():
+            return envs
+    mtime = get_env_mtime()
     yml_envs = get_envs_from_yml()
     cmd_envs = get_envs_from_cmd(config)
     # 使用ChainMap可以用来合并两个或者更多个字典, 当查询的时候，从前往后依次查询
     # ChainMap进行修改的时候总是只会对第一个字典进行修改
     envs = ChainMap(cmd_envs, yml_envs, defaults_envs)
+    config._api_envs = (mtime, envs)
     return envs
\ No newline at end of file
@@ -0,0 +1,243 @@
+'''
+执行历史
+每次执行的案例结果和步骤耗时保存在pytest缓存目录的sqlite文件中(.pytest_cache/d/pytest_api/history.db)，
+结果汇总中根据最近--api-history-runs次的执行历史输出：
+    耗时变慢的步骤   本次耗时超过历史中位数的REGRESSION_RATIO倍，并且至少慢REGRESSION_MIN_MS毫秒
+    不稳定的案例     最近几次执行中既有成功也有失败
+--api-order-by-duration 按历史耗时从长到短执行，同一个文件的案例放在一起并保持原来的顺序，
+                        pytest-xdist并发执行时各个worker能更均匀地结束
+--api-no-history        不记录也不读取执行历史
+pytest-xdist执行时每个worker写入自己执行的案例，同一次执行使用主进程生成的run_id
+'''
+import sqlite3
+import statistics
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+# workerinput中本次执行的run_id的key
+RUN_ID_KEY = "pytest_api_run_id"
+# 最多保留的执行次数
+KEEP_RUNS = 200
+# 计算基线最少需要的历史次数
+MIN_SAMPLES = 3
+REGRESSION_RATIO = 1.5
+REGRESSION_MIN_MS = 10
+
+_history_lock = threading.Lock()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    started REAL
+);
+CREATE TABLE IF NOT EXISTS cases (
+    run_id TEXT NOT NULL,
+    nodeid TEXT NOT NULL,
+    outcome TEXT,
+    duration_ms REAL
+);
+CREATE TABLE IF NOT EXISTS steps (
+    run_id TEXT NOT NULL,
+    nodeid TEXT NOT NULL,
+    step TEXT,
+    ok INTEGER,
+    status_code INTEGER,
+    total_ms REAL,
+    network_ms REAL
+);
+CREATE INDEX IF NOT EXISTS cases_nodeid ON cases (nodeid, run_id);
+CREATE INDEX IF NOT EXISTS steps_nodeid ON steps (nodeid, step, run_id);
+"""
+
+# 同一个案例多个阶段的结果取最差的
+_OUTCOME_ORDER = {"passed": 0, "skipped": 1, "failed": 2}
+
+
+class RunHistory:
+    '''
+    @param path    sqlite文件路径
+    @param run_id  本次执行的标识
+    @param window  计算基线和判断不稳定使用的最近执行次数
+    '''
+
+    def __init__(self, path, run_id, window=20):
+        self.path = path
+        self.run_id = run_id
+        self.window = window
+        # pytest-xdist的多个worker同时写入时等待锁
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.executescript(_SCHEMA)
+        self.conn.commit()
+        self.lock = threading.Lock()
+        # 本次执行的案例结果 {nodeid: outcome}和耗时(秒)
+        self.outcomes = {}
+        self.durations_s = defaultdict(float)
+
+    def add_case(self, nodeid, outcome, duration):
+        '''
+        每个阶段(setup/call/teardown)的报告调用一次，耗时累加，包括sleep、轮询等待等步骤计时以外的时间
+        '''
+        with self.lock:
+            self.durations_s[nodeid] += duration
+            old = self.outcomes.get(nodeid)
+            if old is None or _OUTCOME_ORDER.get(outcome, 0) > _OUTCOME_ORDER.get(old, 0):
+                self.outcomes[nodeid] = outcome
+
+    def save(self, timings):
+        '''
+        写入本次执行的案例结果和步骤耗时，案例耗时为pytest报告中的实际耗时
+        @param timings  TimingReport
+        '''
+        if not self.outcomes:
+            return
+        steps = []
+        for record in timings.records:
+            t = record.timer
+            steps.append((self.run_id, record.case, record.step, int(record.ok), t.status_code,
+                          round(t.total * 1000, 3), round(t.get("network") * 1000, 3)))
+        cases = [(self.run_id, nodeid, outcome, round(self.durations_s[nodeid] * 1000, 3))
+                 for nodeid, outcome in self.outcomes.items()]
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO runs VALUES (?, ?)", (self.run_id, time.time()))
+            self.conn.executemany("INSERT INTO cases VALUES (?, ?, ?, ?)", cases)
+            self.conn.executemany("INSERT INTO steps VALUES (?, ?, ?, ?, ?, ?, ?)", steps)
+            self._prune()
+        self.outcomes = {}
+        self.durations_s = defaultdict(float)
+
+    def _prune(self):
+        old = "SELECT run_id FROM runs ORDER BY started DESC LIMIT -1 OFFSET ?"
+        for table in ("cases", "steps", "runs"):
+            self.conn.execute(f"DELETE FROM {table} WHERE run_id IN ({old})", (KEEP_RUNS,))
+
+    def _recent_runs(self, include_current):
+        '''
+        最近window次执行的run_id，按时间从新到旧
+        '''
+        rows = self.conn.execute("SELECT run_id FROM runs WHERE run_id != ? ORDER BY started DESC LIMIT ?",
+                                 (self.run_id, self.window)).fetchall()
+        runs = [row[0] for row in rows]
+        if include_current:
+            runs = [self.run_id] + runs[:self.window - 1]
+        return runs
+
+    def durations(self):
+        '''
+        最近几次执行中每个案例的平均耗时(毫秒)
+        '''
+        with self.lock:
+            runs = self._recent_runs(False)
+            if not runs:
+                return {}
+            marks = ",".join("?" * len(runs))
+            rows = self.conn.execute(f"SELECT nodeid, AVG(duration_ms) FROM cases WHERE run_id IN ({marks}) "
+                                     f"AND outcome != 'skipped' GROUP BY nodeid", runs).fetchall()
+        return dict(rows)
+
+    def regressions(self):
+        '''
+        本次执行中耗时变慢的步骤，返回[(案例, 步骤, 本次耗时, 基线耗时, 历史次数)]，按变慢的倍数排序
+        同一个案例中同名步骤取平均值
+        '''
+        with self.lock:
+            runs = self._recent_runs(False)
+            if len(runs) < MIN_SAMPLES:
+                return []
+            marks = ",".join("?" * len(runs))
+            current = self.conn.execute(
+                "SELECT nodeid, step, AVG(total_ms) FROM steps WHERE run_id = ? AND ok = 1 "
+                "GROUP BY nodeid, step", (self.run_id,)).fetchall()
+            rows = self.conn.execute(
+                f"SELECT nodeid, step, AVG(total_ms) FROM steps WHERE run_id IN ({marks}) AND ok = 1 "
+                f"GROUP BY run_id, nodeid, step", runs).fetchall()
+        history = defaultdict(list)
+        for nodeid, step, total in rows:
+            history[(nodeid, step)].append(total)
+        res = []
+        for nodeid, step, total in current:
+            samples = history.get((nodeid, step), [])
+            if len(samples) < MIN_SAMPLES:
+                continue
+            baseline = statistics.median(samples)
+            if total > baseline * REGRESSION_RATIO and total - baseline > REGRESSION_MIN_MS:
+                res.append((nodeid, step, total, baseline, len(samples)))
+        return sorted(res, key=lambda r: r[2] / max(r[3], 0.001), reverse=True)
+
+    def flaky(self):
+        '''
+        本次执行的案例中，最近几次执行(包括本次)既有成功也有失败的案例
+        返回[(案例, 失败次数, 执行次数, 结果变化次数)]，按结果变化次数排序
+        '''
+        with self.lock:
+            runs = self._recent_runs(True)
+            marks = ",".join("?" * len(runs))
+            rows = self.conn.execute(
+                f"SELECT cases.nodeid, cases.outcome FROM cases JOIN runs ON cases.run_id = runs.run_id "
+                f"WHERE cases.run_id IN ({marks}) AND cases.outcome != 'skipped' "
+                f"AND cases.nodeid IN (SELECT nodeid FROM cases WHERE run_id = ?) "
+                f"ORDER BY runs.started", runs + [self.run_id]).fetchall()
+        outcomes = defaultdict(list)
+        for nodeid, outcome in rows:
+            outcomes[nodeid].append(outcome)
+        res = []
+        for nodeid, values in outcomes.items():
+            failed = values.count("failed")
+            if 0 < failed < len(values):
+                flips = sum(1 for a, b in zip(values, values[1:]) if a != b)
+                res.append((nodeid, failed, len(values), flips))
+        return sorted(res, key=lambda r: (r[3], r[1]), reverse=True)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def order_by_duration(items, durations):
+    '''
+    按文件的历史耗时从长到短排序，同一个文件的案例放在一起并保持原来的顺序
+    没有历史记录的案例按所有案例的平均耗时计算
+    '''
+    default = statistics.mean(durations.values()) if durations else 0
+    files = {}
+    for item in items:
+        files.setdefault(str(item.fspath), []).append(item)
+    totals = {path: sum(durations.get(item.nodeid, default) for item in group) for path, group in files.items()}
+    # sorted是稳定排序，耗时相同的文件保持原来的顺序
+    ordered = sorted(files, key=lambda path: totals[path], reverse=True)
+    return [item for path in ordered for item in files[path]]
+
+
+def get_run_id(config):
+    '''
+    pytest-xdist的worker使用主进程传过来的run_id
+    '''
+    if not hasattr(config, "_api_run_id"):
+        run_id = getattr(config, "workerinput", {}).get(RUN_ID_KEY)
+        config._api_run_id = run_id or uuid.uuid4().hex
+    return config._api_run_id
+
+
+def get_run_history(config):
+    '''
+    没有启用pytest的缓存插件、带了--api-no-history或者压测模式时返回None
+    '''
+    if not hasattr(config, "_api_run_history"):
+        with _history_lock:
+            if not hasattr(config, "_api_run_history"):
+                history = None
+                if getattr(config, "cache", None) is not None and not config.getoption("--api-no-history") \
+                        and not config._api_load:
+                    # pytest7之前只有makedir
+                    mkdir = getattr(config.cache, "mkdir", None) or config.cache.makedir
+                    path = str(mkdir("pytest_api") / "history.db")
+                    history = RunHistory(path, get_run_id(config), config.getoption("--api-history-runs"))
+                config._api_run_history = history
+    return config._api_run_history
+
+
+def close_run_history(config):
+    history = getattr(config, "_api_run_history", None)
+    if history is not None:
+        history.close()
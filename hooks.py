@@ -11,3 +11,12 @@ def pytest_api_add_action(name, action, config, env):
         "var2": "test"
     }
     """
+
+
+def pytest_api_action_names(config):
+    """声明插件通过pytest_api_add_action处理的动作名称，
+    收集案例时用于校验步骤中的动作，未声明的动作会被当成格式错误
+    如果实现了pytest_api_add_action但没有实现这个hook，则不校验未知的动作
+
+    return ["action1", "action2"]
+    """
@@ -0,0 +1,225 @@
+'''
+返回值规则的编译和提取
+规则在第一次使用时编译成访问路径并缓存，同一个步骤的多个规则合并成一棵前缀树，
+提取时只遍历一次响应，公共前缀只访问一次
+收集案例时编译的前缀树由Step持有，整个会话都不会被淘汰，执行时才确定的规则(带变量)使用有上限的缓存
+支持的写法：
+    a.b.c               字典取值
+    a.b.1 | a.b[1]      数组下标，支持负数下标a.b[-1]
+    items[*].id         通配，取数组所有元素(或字典所有值)的id，结果为数组
+    items[0:2]          切片，结果为数组
+    items[?name=='x'].id  过滤，取name为x的元素的id，结果为数组，支持== != > < >= <=
+'''
+import json
+import re
+import weakref
+from functools import lru_cache
+
+_SLICE_RE = re.compile(r"^(-?\d*):(-?\d*)(?::(-?\d*))?$")
+_FILTER_RE = re.compile(r"^\?\s*(?:@\.)?([^\s=!<>]+)\s*(==|!=|>=|<=|>|<)\s*(.+?)\s*$")
+_INDEX_RE = re.compile(r"^-?\d+$")
+
+_OPS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    ">": lambda a, b: a > b,
+    "<": lambda a, b: a < b,
+    ">=": lambda a, b: a >= b,
+    "<=": lambda a, b: a <= b,
+}
+
+# 结果为数组的访问方式
+_PROJECTIONS = ("wild", "slice", "filter")
+
+
+def _literal(text):
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in "'\"":
+        return text[1:-1]
+    try:
+        return json.loads(text)
+    except ValueError:
+        raise ValueError(f"过滤条件的值格式错误: {text}")
+
+
+def _bracket(text):
+    text = text.strip()
+    if text == "*":
+        return ("wild",)
+    if _INDEX_RE.match(text):
+        return ("index", int(text))
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in "'\"":
+        return ("key", text[1:-1])
+    m = _SLICE_RE.match(text)
+    if m:
+        start, stop, step = (int(v) if v else None for v in m.groups())
+        return ("slice", start, stop, step)
+    m = _FILTER_RE.match(text)
+    if m:
+        field, op, value = m.groups()
+        return ("filter", tuple(field.split(".")), op, _literal(value))
+    raise ValueError(f"不支持的写法: [{text}]")
+
+
+@lru_cache(maxsize=None)
+def compile_rule(rule):
+    '''
+    把规则编译成访问路径，路径中每一段为一个元组
+    '''
+    segments = []
+    i = 0
+    n = len(rule)
+    while i < n:
+        c = rule[i]
+        if c == ".":
+            i += 1
+            continue
+        if c == "[":
+            j = i + 1
+            quote = None
+            while j < n and (quote or rule[j] != "]"):
+                if rule[j] in "'\"":
+                    quote = None if quote == rule[j] else (quote or rule[j])
+                j += 1
+            if j >= n:
+                raise ValueError(f"返回值规则:{rule} 中的[没有结束")
+            segments.append(_bracket(rule[i + 1:j]))
+            i = j + 1
+            continue
+        j = i
+        while j < n and rule[j] not in ".[":
+            j += 1
+        name = rule[i:j]
+        if name.isdigit():
+            segments.append(("index", int(name)))
+        elif name == "*":
+            segments.append(("wild",))
+        else:
+            segments.append(("key", name))
+        i = j
+    return tuple(segments)
+
+
+def _field(obj, path):
+    for key in path:
+        if not isinstance(obj, dict) or key not in obj:
+            raise KeyError(key)
+        obj = obj[key]
+    return obj
+
+
+def _match(obj, seg):
+    _, path, op, value = seg
+    try:
+        return _OPS[op](_field(obj, path), value)
+    except (KeyError, TypeError):
+        return False
+
+
+def _project(obj, seg):
+    kind = seg[0]
+    if kind == "wild":
+        if isinstance(obj, dict):
+            return list(obj.values())
+        if isinstance(obj, list):
+            return obj
+    elif isinstance(obj, list):
+        if kind == "slice":
+            return obj[slice(*seg[1:])]
+        return [item for item in obj if _match(item, seg)]
+    raise LookupError
+
+
+class _Node:
+
+    def __init__(self):
+        self.children = {}
+        # 在当前节点结束的规则的变量名
+        self.targets = []
+        # 经过当前节点的所有规则(变量名, 规则)，用于提示错误
+        self.rules = []
+
+
+class ReturnPlan:
+    '''
+    一个步骤中的所有返回值规则，{变量名: 规则}
+    '''
+
+    def __init__(self, return_rule):
+        self.root = _Node()
+        for var, rule in return_rule.items():
+            rule = str(rule)
+            node = self.root
+            for seg in compile_rule(rule):
+                node = node.children.setdefault(seg, _Node())
+                node.rules.append((var, rule))
+            node.targets.append(var)
+
+    def extract(self, obj):
+        '''
+        遍历一次obj，返回{变量名: 值}
+        '''
+        out = {}
+        self._eval(self.root, obj, out, False)
+        return out
+
+    def _eval(self, node, value, out, projected):
+        for var in node.targets:
+            out[var] = value
+        for seg, child in node.children.items():
+            kind = seg[0]
+            if kind in _PROJECTIONS:
+                try:
+                    elements = _project(value, seg)
+                except LookupError:
+                    if projected:
+                        continue
+                    raise AssertionError(f"请检查返回值规则:{child.rules[0][1]}，返回值中对应的值不是数组")
+                results = []
+                for element in elements:
+                    sub = {}
+                    self._eval(child, element, sub, True)
+                    results.append(sub)
+                for var, _ in child.rules:
+                    out[var] = [sub[var] for sub in results if var in sub]
+                continue
+            try:
+                if kind == "index" and isinstance(value, list):
+                    next_value = value[seg[1]]
+                elif kind == "index" and isinstance(value, dict):
+                    next_value = value[str(seg[1])]
+                elif kind == "key" and isinstance(value, dict):
+                    next_value = value[seg[1]]
+                else:
+                    raise KeyError(seg[1])
+            except (IndexError, KeyError):
+                if projected:
+                    continue
+                rule = child.rules[0][1]
+                if kind == "index" and isinstance(value, list):
+                    raise AssertionError(f"请检查返回值规则:{rule} 中的{seg[1]}，超过数组长度")
+                raise AssertionError(f"请检查返回值规则:{rule} 中的key:{seg[1]} 不存在")
+            self._eval(child, next_value, out, projected)
+
+
+# 已经编译的规则，值被Step等持有时一直有效，不受_compile_return缓存上限的影响
+_plans = weakref.WeakValueDictionary()
+
+
+@lru_cache(maxsize=1024)
+def _compile_return(items):
+    return ReturnPlan(dict(items))
+
+
+def compile_return(return_rule):
+    '''
+    编译并缓存一个步骤的返回值规则，需要长期使用时由调用方持有返回的ReturnPlan
+    '''
+    items = tuple((k, str(v)) for k, v in return_rule.items())
+    plan = _plans.get(items)
+    if plan is None:
+        try:
+            plan = _compile_return(items)
+        except ValueError as e:
+            raise AssertionError(f"返回值规则格式错误: {e}")
+        _plans[items] = plan
+    return plan
@@ -0,0 +1,293 @@
+'''
+流式json校验
+一边从响应中读取内容一边解析，和期望结构逐个对比，遇到第一个不一致的地方立即失败
+不会把整个响应加载到内存中，期望结构之外的字段直接跳过
+'''
+import codecs
+import json
+
+from .common import ListMatcher, list_spec
+
+START_MAP = "start_map"
+END_MAP = "end_map"
+START_ARRAY = "start_array"
+END_ARRAY = "end_array"
+KEY = "key"
+VALUE = "value"
+
+_WHITESPACE = " \t\r\n"
+_NUMBER_CHARS = set("+-0123456789.eE")
+_LITERALS = {"true": True, "false": False, "null": None}
+# 缓冲区中已经解析的内容超过这个长度时丢弃
+_COMPACT_SIZE = 65536
+
+
+class JsonStreamError(AssertionError):
+    pass
+
+
+def iter_events(chunks, encoding="utf-8"):
+    '''
+    增量解析json，chunks是bytes或者str的可迭代对象，例如response.iter_content()
+    产生(事件, 值)，事件为start_map/end_map/start_array/end_array/key/value
+    内容为空、括号不匹配或者没有结束时抛出JsonStreamError
+    '''
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    chunks = iter(chunks)
+    buf = ""
+    pos = 0
+    eof = False
+    # 当前所在的容器，map或者array
+    containers = []
+    expect_key = False
+    # 是否已经有顶层的值
+    started = False
+
+    while True:
+        # 跳过空白和分隔符
+        while pos < len(buf) and (buf[pos] in _WHITESPACE or buf[pos] in ",:"):
+            if buf[pos] == "," and containers and containers[-1] == "map":
+                expect_key = True
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                if not started:
+                    raise JsonStreamError("返回内容为空，不是json结构")
+                if containers:
+                    raise JsonStreamError("返回非json结构，内容不完整")
+                break
+            chunk = next(chunks, None)
+            if chunk is None:
+                eof = True
+                buf = buf[pos:] + decoder.decode(b"", final=True)
+            else:
+                if isinstance(chunk, bytes):
+                    chunk = decoder.decode(chunk)
+                buf = buf[pos:] + chunk
+            pos = 0
+            continue
+
+        ch = buf[pos]
+        started = True
+        if ch == "{":
+            pos += 1
+            containers.append("map")
+            expect_key = True
+            yield START_MAP, None
+        elif ch == "}":
+            pos += 1
+            _close(containers, "map", ch)
+            expect_key = False
+            yield END_MAP, None
+        elif ch == "[":
+            pos += 1
+            containers.append("array")
+            yield START_ARRAY, None
+        elif ch == "]":
+            pos += 1
+            _close(containers, "array", ch)
+            yield END_ARRAY, None
+        else:
+            # 字符串、数字和字面量可能跨多个chunk，没有读到结尾时继续读取
+            end = _token_end(buf, pos, eof)
+            if end is None:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    eof = True
+                    buf += decoder.decode(b"", final=True)
+                else:
+                    buf += decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+                continue
+            raw = buf[pos:end]
+            pos = end
+            if raw[0] == '"':
+                value = json.loads(raw) if "\\" in raw else raw[1:-1]
+                if expect_key:
+                    expect_key = False
+                    yield KEY, value
+                    continue
+            elif raw in _LITERALS:
+                value = _LITERALS[raw]
+            else:
+                try:
+                    value = json.loads(raw)
+                except ValueError:
+                    raise JsonStreamError(f"返回非json结构，无法解析: {raw[:100]}")
+            yield VALUE, value
+
+        if pos > _COMPACT_SIZE:
+            buf = buf[pos:]
+            pos = 0
+
+
+def _close(containers, kind, ch):
+    if not containers or containers[-1] != kind:
+        raise JsonStreamError(f"返回非json结构，{ch}没有对应的开始")
+    containers.pop()
+
+
+def _token_end(buf, pos, eof):
+    '''
+    返回字符串、数字或字面量的结束位置，内容不完整时返回None
+    '''
+    if buf[pos] == '"':
+        i = pos + 1
+        while True:
+            i = buf.find('"', i)
+            if i == -1:
+                if eof:
+                    raise JsonStreamError("返回非json结构，字符串没有结束")
+                return None
+            # 前面连续的反斜杠为奇数个时是转义的引号
+            backslashes = 0
+            j = i - 1
+            while buf[j] == "\\":
+                backslashes += 1
+                j -= 1
+            if backslashes % 2 == 0:
+                return i + 1
+            i += 1
+    i = pos
+    if buf[pos] in _NUMBER_CHARS:
+        while i < len(buf) and buf[i] in _NUMBER_CHARS:
+            i += 1
+    else:
+        while i < len(buf) and buf[i].isalpha():
+            i += 1
+        if i == pos:
+            raise JsonStreamError(f"返回非json结构，无法解析: {buf[pos:pos + 100]}")
+    if i == len(buf) and not eof:
+        return None
+    return i
+
+
+# 期望之外的值，跳过不校验
+_SKIP = object()
+
+
+class _Builder:
+    '''
+    把一个完整的值的事件还原成python对象，用于subset/unordered方式的数组匹配
+    '''
+
+    def __init__(self):
+        self.stack = []
+        self.key = None
+        self.value = None
+
+    def _put(self, value):
+        if not self.stack:
+            self.value = value
+        elif isinstance(self.stack[-1], list):
+            self.stack[-1].append(value)
+        else:
+            self.stack[-1][self.key] = value
+
+    def feed(self, event, value):
+        '''
+        值已经完整时返回True
+        '''
+        if event == START_MAP or event == START_ARRAY:
+            container = {} if event == START_MAP else []
+            self._put(container)
+            self.stack.append(container)
+            return False
+        if event == END_MAP or event == END_ARRAY:
+            self.stack.pop()
+        elif event == KEY:
+            self.key = value
+            return False
+        else:
+            self._put(value)
+        return not self.stack
+
+
+def _check_scalar(ori, expt, is_container_compare):
+    if isinstance(ori, str) and is_container_compare and isinstance(expt, str):
+        assert expt in ori, f"返回值校验失败：期望值：{expt}, 实际值：{ori}, 非包含关系"
+    else:
+        assert ori == expt, f"返回值校验失败：期望值：{expt}, 实际值：{ori}"
+
+
+def stream_json_check(events, expt, is_container_compare=False):
+    '''
+    使用iter_events产生的事件和期望结构对比，校验规则和common.json_check一致
+    使用栈遍历，不受递归深度限制
+    '''
+    # 栈中的元素为：
+    # ["map", 期望字典, 已出现的key, 是否跳过全部key]
+    # ["array", 期望数组, 当前下标]
+    # ["match", ListMatcher, 正在还原的元素, 元素个数]
+    # ["skip", 嵌套深度]
+    frames = []
+    want = expt
+    # 是否已经有顶层的值
+    seen = False
+    for event, value in events:
+        seen = True
+        top = frames[-1] if frames else None
+        if top is not None and top[0] == "match":
+            # subset/unordered方式每次只还原一个元素，对比后丢弃
+            if top[2] is None:
+                if event == END_ARRAY:
+                    top[1].finish(top[3])
+                    frames.pop()
+                    continue
+                top[2] = _Builder()
+            if top[2].feed(event, value):
+                top[1].feed(top[2].value)
+                top[2] = None
+                top[3] += 1
+            continue
+        if top is not None and top[0] == "skip":
+            if event in (START_MAP, START_ARRAY):
+                top[1] += 1
+            elif event in (END_MAP, END_ARRAY):
+                top[1] -= 1
+                if top[1] == 0:
+                    frames.pop()
+            continue
+        if event == KEY:
+            expt_map = top[1]
+            if top[3] or value not in expt_map:
+                want = _SKIP
+            else:
+                top[2].add(value)
+                want = expt_map[value]
+            continue
+        if event == END_MAP:
+            if not top[3]:
+                for key in top[1]:
+                    assert key in top[2], f"返回值校验失败，返回值中没有要校验对象: {key}"
+            frames.pop()
+            continue
+        if event == END_ARRAY:
+            assert top[2] == len(top[1]), f"返回值校验失败，返回的数组长度{top[2]}和期望的数组长度不一致。" \
+                f"期望值: {top[1]}"
+            frames.pop()
+            continue
+
+        # 一个新的值开始
+        if top is not None and top[0] == "array":
+            assert top[2] < len(top[1]), f"返回值校验失败，返回的数组长度超出期望的数组长度。期望值: {top[1]}"
+            want = top[1][top[2]]
+            top[2] += 1
+        if want is _SKIP:
+            if event != VALUE:
+                frames.append(["skip", 1])
+        elif event == START_MAP:
+            assert isinstance(want, dict), f"返回值校验失败：期望值：{want}, 实际值为字典"
+            frames.append(["map", want, set(), "err_code" in want])
+        elif event == START_ARRAY:
+            spec = list_spec(want)
+            if spec is None:
+                assert isinstance(want, list), f"返回值校验失败：期望值：{want}, 实际值为数组"
+                frames.append(["array", want, 0])
+            elif spec[0] == "strict":
+                frames.append(["array", spec[2], 0])
+            else:
+                frames.append(["match", ListMatcher(spec, is_container_compare), None, 0])
+        else:
+            _check_scalar(value, want, is_container_compare)
+    assert seen, "返回值校验失败，返回内容为空"
+    assert not frames, "返回值校验失败，返回的json不完整"
@@ -0,0 +1,211 @@
+'''
+压测模式：按指定的速率重复执行已有的yml案例，统计每个步骤的耗时分布、吞吐量和错误率
+pytest --api-load rps=200,duration=60s,workers=50
+'''
+import math
+import re
+import threading
+import time
+from collections import ChainMap
+from concurrent.futures import ThreadPoolExecutor
+
+_DURATION_RE = re.compile(r"^(\d+(?:\.\d+)?)(ms|s|m|h)?$")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, None: 1}
+
+
+def parse_duration(text):
+    '''
+    解析时间，支持 500ms | 60s | 2m | 1h，不带单位时为秒
+    '''
+    m = _DURATION_RE.match(str(text).strip())
+    if not m:
+        raise ValueError(f"时间格式错误: {text}")
+    return float(m.group(1)) * _DURATION_UNITS[m.group(2)]
+
+
+def parse_load_spec(spec):
+    '''
+    解析--api-load的参数，格式为 rps=200,duration=60s,workers=50
+    rps        每秒开始执行的案例次数，必选
+    duration   压测时长，默认60s
+    workers    执行案例的线程数，默认为rps
+    '''
+    options = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        if "=" not in part:
+            raise ValueError(f"--api-load参数格式错误: {part}，应该是key=value")
+        key, value = part.split("=", 1)
+        options[key.strip()] = value.strip()
+    unknown = set(options) - {"rps", "duration", "workers"}
+    if unknown:
+        raise ValueError(f"--api-load不支持的参数: {','.join(sorted(unknown))}")
+    if "rps" not in options:
+        raise ValueError("--api-load必须指定rps")
+    try:
+        rps = float(options["rps"])
+        workers = int(options.get("workers", max(int(rps), 1)))
+    except ValueError:
+        raise ValueError(f"--api-load参数格式错误: {spec}，rps和workers必须是数字")
+    if rps <= 0 or workers <= 0:
+        raise ValueError("--api-load的rps和workers必须大于0")
+    duration = parse_duration(options.get("duration", "60s"))
+    return {"rps": rps, "duration": duration, "workers": workers}
+
+
+def percentile(values, percent):
+    '''
+    最近秩法计算百分位，values需要已经排序
+    '''
+    if not values:
+        return 0
+    index = max(math.ceil(percent / 100 * len(values)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+class StepStats:
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+
+    @property
+    def count(self):
+        return len(self.latencies)
+
+
+class LoadReport:
+    '''
+    压测结果，按"案例::步骤"统计
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.steps = {}
+        self.iterations = 0
+        # 积压过多或者压测时间结束时没有执行的次数
+        self.dropped = 0
+        self.max_lag = 0
+        self.duration = 0
+
+    def record(self, name, latency, ok):
+        with self._lock:
+            stats = self.steps.setdefault(name, StepStats())
+            stats.latencies.append(latency)
+            if not ok:
+                stats.errors += 1
+
+    def record_iteration(self, lag):
+        with self._lock:
+            self.iterations += 1
+            self.max_lag = max(self.max_lag, lag)
+
+    def record_dropped(self):
+        with self._lock:
+            self.dropped += 1
+
+    @property
+    def errors(self):
+        return sum(stats.errors for stats in self.steps.values())
+
+    def rows(self):
+        '''
+        每个步骤一行: 名称、次数、错误数、错误率、p50、p95、p99(毫秒)、吞吐量
+        '''
+        rows = []
+        for name, stats in self.steps.items():
+            latencies = sorted(stats.latencies)
+            rows.append((
+                name,
+                stats.count,
+                stats.errors,
+                stats.errors / stats.count * 100 if stats.count else 0,
+                percentile(latencies, 50) * 1000,
+                percentile(latencies, 95) * 1000,
+                percentile(latencies, 99) * 1000,
+                stats.count / self.duration if self.duration else 0,
+            ))
+        return rows
+
+
+class LoadTest:
+    '''
+    开环调度：按rps固定的间隔开始新的一次案例执行，不等待上一次执行完成
+    案例按顺序轮流执行，每次执行使用独立的变量作用域
+    耗时从计划开始的时间算起，线程不够时的排队时间也计入第一个步骤，避免漏掉排队的延迟
+    执行中的次数最多为workers个，排队中的也最多为workers个，即提交到线程池的次数不超过workers的2倍，
+    超过时不再提交并计入dropped，压测时间结束后还没开始的也不再执行
+    案例的前置在压测开始前执行一次，后置在压测结束后执行一次
+    '''
+
+    def __init__(self, items, rps, duration, workers):
+        self.items = items
+        self.rps = rps
+        self.duration = duration
+        self.workers = workers
+        self.deadline = None
+        self.report = LoadReport()
+
+    def run(self):
+        ready = []
+        for item in self.items:
+            try:
+                item.run_setups()
+                ready.append(item)
+            except Exception as e:
+                print(f"案例{item.name}前置执行失败，不参与压测: {e}")
+        if ready:
+            self._schedule(ready)
+        for item in self.items:
+            item._run(item.teardowns, True)
+        return self.report
+
+    def _schedule(self, items):
+        interval = 1 / self.rps
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pytest-api-load")
+        # 执行中(workers个)和排队中(workers个)的次数上限
+        slots = threading.BoundedSemaphore(self.workers * 2)
+        start = time.perf_counter()
+        self.deadline = start + self.duration
+        n = 0
+        try:
+            while True:
+                scheduled = start + n * interval
+                if scheduled >= self.deadline:
+                    break
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                item = items[n % len(items)]
+                n += 1
+                if not slots.acquire(blocking=False):
+                    self.report.record_dropped()
+                    continue
+                executor.submit(self._iteration, item, scheduled).add_done_callback(lambda f: slots.release())
+        finally:
+            executor.shutdown(wait=True)
+            self.report.duration = time.perf_counter() - start
+
+    def _iteration(self, item, scheduled):
+        now = time.perf_counter()
+        if now >= self.deadline:
+            self.report.record_dropped()
+            return
+        self.report.record_iteration(now - scheduled)
+        scope = ChainMap({}, item._global_params)
+        # 第一个步骤从计划开始的时间算起，之后每个步骤从上一个步骤结束算起
+        begin = scheduled
+        for step in item.steps:
+            if not item.is_selected(step):
+                continue
+            name = f"{item.name}::{step.name}"
+            try:
+                item.run_step(step, scope)
+            except Exception:
+                self.report.record(name, time.perf_counter() - begin, False)
+                # 后面的步骤可能依赖当前步骤的返回值，不再继续执行
+                return
+            end = time.perf_counter()
+            self.report.record(name, end - begin, True)
+            begin = end
@@ -0,0 +1,82 @@
+'''
+数据驱动的参数化
+案例中配置parameters时，每一行数据生成一个案例，所有案例共用同一份编译好的步骤，
+行中的字段作为变量，步骤中通过${name}引用
+parameters:                         # 直接写在案例中
+  - {user: a, code: 200}
+  - {user: b, code: 403}
+parameters: data/users.csv          # csv文件，第一行为字段名，路径相对于案例文件
+parameters: data/users.jsonl        # jsonl文件，每行一个json对象
+parameters:
+  file: data/users.csv
+  ids: user                         # 可选，使用user字段作为案例名称的后缀，默认为行号
+                                    # 字段值重复时在后面加上行号，保证案例名称不重复
+数据文件逐行读取，不会一次性加载到内存中
+'''
+import csv
+import json
+from pathlib import Path
+
+from .steps import CaseError
+
+
+def _iter_csv(path):
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            yield row
+
+
+def _iter_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                raise CaseError(f"{path}第{lineno}行不是json格式: {e}")
+            if not isinstance(row, dict):
+                raise CaseError(f"{path}第{lineno}行必须是json对象")
+            yield row
+
+
+def _iter_file(path):
+    if not path.exists():
+        raise CaseError(f"parameters的数据文件不存在: {path}")
+    if path.suffix == ".csv":
+        return _iter_csv(path)
+    if path.suffix in (".jsonl", ".ndjson"):
+        return _iter_jsonl(path)
+    raise CaseError(f"parameters只支持csv和jsonl文件: {path}")
+
+
+def iter_parameters(spec, case_path):
+    '''
+    @param spec       案例中的parameters
+    @param case_path  案例文件路径，数据文件的相对路径以案例文件所在目录为准
+    产生(案例名称后缀, 行数据)
+    '''
+    ids = None
+    if isinstance(spec, dict):
+        if "file" not in spec:
+            raise CaseError(f"{case_path}: parameters中必须要有file字段")
+        ids = spec.get("ids")
+        spec = spec["file"]
+    if isinstance(spec, list):
+        rows = iter(spec)
+    elif isinstance(spec, str):
+        rows = _iter_file(Path(str(case_path)).parent / Path(spec))
+    else:
+        raise CaseError(f"{case_path}: parameters必须是数组或者数据文件路径")
+    # 已经使用的后缀
+    seen = set()
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            raise CaseError(f"{case_path}: parameters的第{index}行必须是字典结构")
+        if ids is not None and ids not in row:
+            raise CaseError(f"{case_path}: parameters的第{index}行中没有{ids}字段")
+        suffix = str(row[ids]) if ids is not None else str(index)
+        while suffix in seen:
+            suffix = f"{suffix}-{index}"
+        seen.add(suffix)
+        yield suffix, row
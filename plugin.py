@@ -4,12 +4,26 @@
 原理： 使用pytest的mock功能 pytest_collect_file
 '''
 
-import json
-import re
+import time
 import pytest
+from collections import ChainMap
+from concurrent.futures import ThreadPoolExecutor
 from env import get_envs
-from common import read_yaml
-from runner import ApiRunner, Runner, ExecRunner
+from cache import load_case
+from common import import_cache
+from runner import ApiRunner, Runner, ExecRunner, interrupted
+from pool import close_session_pool
+from aio import AsyncApiRunner, close_async_engine
+from steps import CaseError, compile_case, known_actions
+from tags import TagSelector, get_tag_index
+from params import iter_parameters
+from scoped import get_scoped_setups
+from replay import get_replay_store, close_replay_store
+from shared import WORKERINPUT_KEY, start_store, stop_store, get_shared_variables
+from history import RUN_ID_KEY, get_run_id, get_run_history, close_run_history, order_by_duration
+from load import LoadTest, parse_load_spec
+from timing import StepTimer, TimingReport
+from variables import variables
 
 # 定义一个执行机
 runner = Runner()
@@ -38,8 +52,33 @@ def pytest_addoption(parser):
                      default="")
     parser.addoption("--pdebug", action="store", help="是否打印错误信息堆栈", default=False)
     parser.addoption("--step-name", action="store", help="指定步骤执行，包括前后置中的步骤", default="")
-    parser.addoption("--exclude", action="store", help="要排除的标签", default="")
-    parser.addoption("--include", action="store", help="要包括的标签", default="")
+    parser.addoption("--exclude", action="store", help="要排除的标签，支持and/or/not和括号，逗号表示or", default="")
+    parser.addoption("--include", action="store", help="要包括的标签，支持and/or/not和括号，逗号表示or", default="")
+    parser.addoption("--api-workers", action="store", type=int, help="并发执行案例的线程数，默认为1即串行执行",
+                     default=1)
+    parser.addoption("--api-load", action="store", help="压测模式，按指定速率重复执行案例，"
+                                                        "例如 rps=200,duration=60s,workers=50", default="")
+    parser.addoption("--api-timing-top", action="store", type=int, help="结果汇总中输出最慢的步骤个数，0为不输出",
+                     default=10)
+    parser.addoption("--api-timing-report", action="store", help="步骤耗时报告的输出文件，.csv后缀输出csv格式，其他为json格式",
+                     default="")
+    parser.addoption("--api-no-cache", action="store_true", help="不使用案例文件的解析缓存，每次都重新解析yml",
+                     default=False)
+    parser.addoption("--api-store-bind", action="store", help="pytest-xdist执行时共享变量服务监听的地址",
+                     default="127.0.0.1")
+    parser.addoption("--api-store-host", action="store", help="pytest-xdist的worker连接共享变量服务使用的地址，"
+                                                              "worker在其他机器上时需要指定", default="")
+    parser.addoption("--api-record", action="store", help="录制模式，把响应保存到指定的sqlite文件中", default="")
+    parser.addoption("--api-replay", action="store", help="回放模式，不发送请求，从指定的sqlite文件中返回录制的响应",
+                     default="")
+    parser.addoption("--api-no-history", action="store_true", help="不记录执行历史，也不输出耗时变慢的步骤和不稳定的案例",
+                     default=False)
+    parser.addoption("--api-history-runs", action="store", type=int, help="计算耗时基线和判断不稳定案例使用的最近执行次数",
+                     default=20)
+    parser.addoption("--api-order-by-duration", action="store_true", help="按历史耗时从长到短执行案例，同一个文件的案例放在一起",
+                     default=False)
+    parser.addoption("--env-reload", action="store_true", help="env.yml修改后是否重新加载，默认整个会话只加载一次",
+                     default=False)
 
 
 def pytest_collect_file(path, parent):
@@ -50,18 +89,209 @@ def pytest_collect_file(path, parent):
     :return: collector
     """
     if path.ext == ".yml" and not is_ignore_file(path):
+        # 指定了标签时先查标签索引，不匹配的文件不再解析
+        index = get_tag_index(parent.config)
+        if index is not None:
+            tags = index.tags(path)
+            if tags is not None and not parent.config._api_tags.match(tags):
+                return None
         return YamlFile.from_parent(parent, fspath=path)
 
 
 @pytest.mark.hookwrapper
-def pytest_runtest_makereport(item):
+def pytest_runtest_makereport(item, call):
     # 解决乱码
     outcome = yield
     report = outcome.get_result()
     getattr(report, 'extra', [])
+    if call.when == "call" and getattr(item, "duration", None) is not None:
+        # 并发执行时使用线程池中实际的执行耗时，而不是等待结果的时间
+        report.duration = item.duration
+    history = get_run_history(item.config)
+    if history is not None and isinstance(item, YamlItem):
+        history.add_case(item.nodeid, report.outcome, report.duration)
     report.nodeid = report.nodeid.encode("unicode_escape").decode("utf-8")
 
 
+def pytest_configure(config):
+    config._api_timings = TimingReport()
+    import_cache.clear()
+    interrupted.clear()
+    if config.getoption("--api-record") and config.getoption("--api-replay"):
+        raise pytest.UsageError("--api-record和--api-replay不能同时使用")
+    try:
+        config._api_tags = TagSelector(config.getoption("--include"), config.getoption("--exclude"))
+    except ValueError as e:
+        raise pytest.UsageError(str(e))
+    if getattr(config.option, "dist", "no") == "load" and not hasattr(config, "workerinput") \
+            and not _dist_specified(config):
+        # 只指定了-n时，pytest-xdist按文件分配案例，同一个文件的案例在同一个worker中执行
+        config.option.dist = "loadfile"
+    load = config.getoption("--api-load")
+    config._api_load = None
+    if load:
+        try:
+            config._api_load = parse_load_spec(load)
+        except ValueError as e:
+            raise pytest.UsageError(str(e))
+
+
+def _dist_specified(config):
+    '''
+    命令行或者addopts中是否指定了--dist，pytest-xdist在只指定-n时也会把dist设置为load
+    '''
+    known = getattr(config, "known_args_namespace", None)
+    if known is None:
+        return False
+    return getattr(known, "dist", "no") != "no" or bool(getattr(known, "distload", False))
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    """
+    pytest-xdist在主进程中为每个worker调用，把共享变量服务的连接信息和本次执行的run_id传给worker
+    """
+    node.workerinput[WORKERINPUT_KEY] = start_store(node.config)
+    node.workerinput[RUN_ID_KEY] = get_run_id(node.config)
+
+
+def pytest_collection_modifyitems(session, config, items):
+    """
+    --api-order-by-duration时按历史耗时从长到短执行
+    """
+    if not config.getoption("--api-order-by-duration"):
+        return
+    history = get_run_history(config)
+    if history is not None:
+        items[:] = order_by_duration(items, history.durations())
+
+
+def pytest_unconfigure(config):
+    stop_store(config)
+    close_run_history(config)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtestloop(session):
+    """
+    --api-load时执行压测，不再按普通案例执行
+    --api-workers大于1时，先把案例全部提交到线程池中并发执行，
+    再由pytest按原来的顺序等待每个案例的结果并生成报告
+    """
+    config = session.config
+    if config._api_load and not config.option.collectonly:
+        items = [item for item in session.items if isinstance(item, YamlItem)]
+        report = LoadTest(items, **config._api_load).run()
+        config._api_load_report = report
+        # 有失败的请求时返回非0
+        session.testsfailed = report.errors
+        return True
+    workers = config.getoption("--api-workers")
+    if workers <= 1 or config.option.collectonly:
+        return
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pytest-api")
+    config._api_executor = executor
+    for item in session.items:
+        if isinstance(item, YamlItem):
+            item.isolated = True
+            item.future = executor.submit(item.execute)
+
+
+def pytest_keyboard_interrupt(excinfo):
+    interrupted.set()
+
+
+def pytest_sessionfinish(session):
+    """
+    会话结束时取消还未执行的案例，并关闭共享的http连接池和事件循环
+    指定了--api-timing-report时输出步骤耗时报告，并把案例结果和步骤耗时写入执行历史
+    """
+    # 结束还在等待中的sleep和轮询步骤
+    interrupted.set()
+    executor = getattr(session.config, "_api_executor", None)
+    if executor is not None:
+        for item in session.items:
+            future = getattr(item, "future", None)
+            if future is not None:
+                future.cancel()
+        executor.shutdown(wait=True)
+    # 还没有执行teardown的共享前置，例如并发执行时
+    get_scoped_setups(session.config).finish_all()
+    close_session_pool(session.config)
+    close_async_engine(session.config)
+    close_replay_store(session.config)
+    index = getattr(session.config, "_api_tag_index", None)
+    if index is not None:
+        index.save()
+    report_path = session.config.getoption("--api-timing-report")
+    if report_path:
+        session.config._api_timings.write(report_path)
+    history = get_run_history(session.config)
+    if history is not None:
+        history.save(session.config._api_timings)
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    """
+    输出最慢的步骤、和历史相比耗时变慢的步骤、不稳定的案例、压测结果、!import缓存、回放和连接复用情况
+    """
+    top = config.getoption("--api-timing-top")
+    slowest = config._api_timings.slowest(top) if top > 0 else []
+    if slowest:
+        terminalreporter.write_sep("-", f"最慢的{len(slowest)}个步骤")
+        terminalreporter.write_line(f"{'总耗时(ms)':>10}{'替换':>8}{'组装':>8}{'请求':>10}{'校验':>8}{'返回值':>8}  步骤")
+        for record in slowest:
+            t = record.timer
+            terminalreporter.write_line(
+                f"{t.total * 1000:>12.1f}{t.get('substitute') * 1000:>10.1f}{t.get('prepare') * 1000:>10.1f}"
+                f"{t.get('network') * 1000:>12.1f}{t.get('check') * 1000:>10.1f}{t.get('return') * 1000:>11.1f}"
+                f"  {record.case}::{record.step}")
+    history = get_run_history(config)
+    if history is not None and not config.option.collectonly:
+        _write_history(terminalreporter, history)
+    report = getattr(config, "_api_load_report", None)
+    if report is not None:
+        terminalreporter.write_sep("-", "api压测结果")
+        terminalreporter.write_line(f"执行案例: {report.iterations}次, 丢弃: {report.dropped}次, "
+                                    f"耗时: {report.duration:.1f}s, 最大调度延迟: {report.max_lag * 1000:.1f}ms")
+        terminalreporter.write_line(f"{'步骤':<40}{'次数':>8}{'错误':>8}{'错误率':>8}"
+                                    f"{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'吞吐量/s':>10}")
+        for row in report.rows():
+            terminalreporter.write_line(f"{row[0]:<40}{row[1]:>8}{row[2]:>8}{row[3]:>7.1f}%"
+                                        f"{row[4]:>10.1f}{row[5]:>10.1f}{row[6]:>10.1f}{row[7]:>10.1f}")
+    if config.getoption("--pdebug"):
+        terminalreporter.write_sep("-", "!import缓存统计")
+        terminalreporter.write_line(f"命中: {import_cache.hits}, 未命中: {import_cache.misses}, "
+                                    f"缓存文件数: {len(import_cache.fragments)}")
+    store = getattr(config, "_api_replay_store", None)
+    if store is not None and store.mode == "replay":
+        terminalreporter.write_sep("-", "api回放统计")
+        terminalreporter.write_line(f"回放: {store.hits}, 未录制: {store.misses}")
+    pool = getattr(config, "_api_session_pool", None)
+    if pool is None:
+        return
+    stats = pool.stats
+    terminalreporter.write_sep("-", "api连接池统计")
+    terminalreporter.write_line(f"请求数: {stats.requests}, 新建连接: {stats.new_connections}, "
+                                f"复用连接: {stats.reused_connections}")
+
+
+def _write_history(terminalreporter, history):
+    regressions = history.regressions()
+    if regressions:
+        terminalreporter.write_sep("-", f"耗时变慢的{len(regressions)}个步骤")
+        terminalreporter.write_line(f"{'本次(ms)':>10}{'基线(ms)':>12}{'倍数':>8}{'历史次数':>8}  步骤")
+        for case, step, total, baseline, samples in regressions:
+            terminalreporter.write_line(f"{total:>12.1f}{baseline:>12.1f}{total / max(baseline, 0.001):>9.1f}"
+                                        f"{samples:>10}  {case}::{step}")
+    flaky = history.flaky()
+    if flaky:
+        terminalreporter.write_sep("-", f"不稳定的{len(flaky)}个案例")
+        terminalreporter.write_line(f"{'失败/执行':>10}{'结果变化':>8}  案例")
+        for case, failed, total, flips in flaky:
+            terminalreporter.write_line(f"{f'{failed}/{total}':>14}{flips:>12}  {case}")
+
+
 def is_ignore_file(path):
     api_ignores = ["variables.yml", "env.yml"]
     return path.basename in api_ignores
@@ -87,23 +317,41 @@ class YamlFile(pytest.File):
         debug = self.config.getoption("--pdebug")
 
         # 收集案例
-        case = read_yaml(self.fspath)
+        case = load_case(self.config, self.fspath)
 
-        setup = case["setup"] if "setup" in case else []
-        teardown = case["teardown"] if "teardown" in case else []
-        tags = case["tags"] if "tags" in case else []
+        tags = case["tags"] if isinstance(case, dict) and "tags" in case else []
         # 过滤exclude标签的案例，包含则跳过
         if self._is_exclude(tags):
             return
 
         # 收集只包含include的标签
         if self._is_include(tags):
+            # 编译并校验所有步骤，格式错误在收集阶段报告，被标签过滤掉的案例不校验
+            setup, steps, teardown, scoped = compile_case(case, known_actions(self.config, runner.handlers),
+                                                          self.fspath)
             step_name = self.config.getoption("--step-name")
-            yield YamlItem.from_parent(self, name=case["name"],
-                                       steps=case["steps"],
-                                       setup=setup,
-                                       teardown=teardown,
-                                       step_name=step_name)
+            if "parameters" not in case:
+                yield YamlItem.from_parent(self, name=case["name"],
+                                           steps=steps,
+                                           setup=setup,
+                                           teardown=teardown,
+                                           scoped=scoped,
+                                           step_name=step_name)
+                return
+            # 参数化的案例每行数据生成一个案例，共用编译好的步骤
+            for suffix, row in iter_parameters(case["parameters"], self.fspath):
+                yield YamlItem.from_parent(self, name=f"{case['name']}[{suffix}]",
+                                           steps=steps,
+                                           setup=setup,
+                                           teardown=teardown,
+                                           scoped=scoped,
+                                           step_name=step_name,
+                                           params=row)
+
+    def repr_failure(self, excinfo):
+        if isinstance(excinfo.value, CaseError):
+            return str(excinfo.value)
+        return super().repr_failure(excinfo)
 
     def _add_global_variables(self, envs):
         """
@@ -125,28 +373,17 @@ class YamlFile(pytest.File):
             variables["USER"] = auth[0]
             variables["PASSWORD"] = auth[1]
 
-        runner.register_handler("api", ApiRunner)
+        # 录制和回放通过requests的adapter实现，async方式下也使用requests发送
+        if envs["transport"] == "async" and get_replay_store(self.config) is None:
+            runner.register_handler("api", AsyncApiRunner)
+        else:
+            runner.register_handler("api", ApiRunner)
 
     def _is_exclude(self, tags):
-        exclude = self.config.getoption("--exclude")
-        if exclude == "":
-            return False
-        exclude_tags = exclude.split(",")
-        for exclude_tag in exclude_tags:
-            return exclude_tag in tags
-        return False
+        return self.config._api_tags.is_exclude(tags)
 
     def _is_include(self, tags):
-        include = self.config.getoption("--include")
-        if include == "":
-            return True
-        flag = False
-        include_tags = include.split(",")
-        for include_tag in include_tags:
-            if include_tag in tags:
-                flag = True
-                break
-        return flag
+        return self.config._api_tags.is_include(tags)
 
 
 class YamlItem(pytest.Item):
@@ -157,43 +394,87 @@ class YamlItem(pytest.Item):
         self.steps = kw["steps"]
         self.teardowns = kw["teardown"]
         self.step_name = kw["step_name"]
-        self._global_params = variables
-
-    def _re_step(self, step):
+        # 每个案例有自己的变量作用域，写入只影响当前案例，读取时再查全局变量
+        # pytest-xdist执行时最后再查其他worker共享的变量
+        # 共享前置的返回值和参数化案例当前行的数据放在案例变量和全局变量之间
+        self.shared = get_shared_variables(self.config)
+        self.scoped = None
+        scopes = [{}]
+        if kw.get("scoped"):
+            self.scoped = get_scoped_setups(self.config).get(kw["scoped"], self.fspath)
+            scopes.append(self.scoped.values)
+        if kw.get("params"):
+            scopes.append(kw["params"])
+        scopes.append(variables)
+        if self.shared is not None:
+            scopes.append(self.shared)
+        self._global_params = ChainMap(*scopes)
+        # 并发执行时变量互相隔离，future为线程池中的执行结果，串行执行时为None
+        self.isolated = False
+        self.future = None
+        # 并发执行时在线程池中记录的耗时(秒)，包括前置、步骤和后置
+        self.duration = None
+
+    def _re_step(self, step, scope=None):
         '''
         变量替换
-        @param step 步骤信息
+        @param step 编译后的步骤Step
+        @param scope 变量作用域，默认为案例自己的变量
         @return 替换后的步骤信息
         '''
-        step_json = json.dumps(step)
-        for k, v in self._global_params.items():
-            re_str = r"\"\$\{" + k + r"\}\""
-            re_str_2 = r"\\\"\$\{" + k + r"\}\\\""  # 为了给已有的案例做兼容
-            param_str = json.dumps(v)
-            if isinstance(v, str):
-                re_str = r"\$\{" + k + r"\}"
-                param_str = v
-
-            # 兼容以前的url中带变量类似"${continue}"这种写法
-            step_json = re.sub(re_str_2, param_str, step_json)
-            # 新写法 去掉引用 ${continue}
-            step_json = re.sub(re_str, param_str, step_json)
+        if scope is None:
+            scope = self._global_params
+        return step.template.render(scope)
 
-        return json.loads(step_json, strict=False)
+    def is_selected(self, step):
+        '''
+        步骤是否需要执行，跳过的步骤和--step-name不匹配的步骤不执行
+        '''
+        if step.skip:
+            return False
+        return self.step_name in step.name
 
-    def _run(self, steps, is_teardown=False):
+    def run_step(self, step, scope):
+        '''
+        变量替换后执行单个步骤，返回值写入scope
+        压测模式以外记录步骤各阶段的耗时
+        '''
+        timer = StepTimer()
+        ok = False
+        if self.shared is not None:
+            # 其他worker可能在上一个步骤之后共享了新的变量
+            self.shared.forget_misses()
+        try:
+            with timer.phase("substitute"):
+                rendered = self._re_step(step, scope)
+            res_params = runner.run(rendered, self.config, timer)
+            ok = True
+        finally:
+            if not self.config._api_load:
+                self.config._api_timings.add(self.nodeid, step.name, timer, ok)
+        scope.update(res_params)
+        return res_params
+
+    def _run(self, steps, is_teardown=False, publish=False, scope=None):
+        '''
+        @param publish  前置步骤的返回值是否共享给pytest-xdist的其他worker
+        @param scope    变量作用域，默认为案例自己的变量
+        '''
+        if scope is None:
+            scope = self._global_params
         step_name_prefix = "执行步骤"
         if is_teardown:
             step_name_prefix = "执行后置"
         for index, step in enumerate(steps):
-            step_msg = f"{step_name_prefix}{index}：{step['name']} 结果: Failed ✘ ,"
-            if "skip" in step and step["skip"]:
-                continue
-            if self.step_name in step["name"]:
+            step_msg = f"{step_name_prefix}{index}：{step.name} 结果: Failed ✘ ,"
+            if self.is_selected(step):
                 try:
-                    step = self._re_step(step)
-                    res_params = runner.run(step, self.config)
-                    self._global_params.update(res_params)
+                    res_params = self.run_step(step, scope)
+                    if not self.isolated:
+                        # 串行执行时保持原来的行为，返回值对后面的案例也可见
+                        variables.update(res_params)
+                    if publish and self.shared is not None:
+                        self.shared.publish(res_params)
                 except AssertionError as e:
                     step_msg += f"具体信息: {e}"
                     if not is_teardown:
@@ -216,8 +497,20 @@ class YamlItem(pytest.Item):
     def teardown(self):
         '''
         Item 对象的清理步骤
+        并发执行时清理步骤已经在线程池中执行过了
         '''
-        self._run(self.teardowns, True)
+        if self.future is None:
+            self._run(self.teardowns, True)
+            if self.scoped is not None:
+                get_scoped_setups(self.config).release(self, self.session.items)
+
+    def run_setups(self):
+        '''
+        执行前置，共享前置在作用域内只执行一次
+        '''
+        if self.scoped is not None:
+            get_scoped_setups(self.config).ensure(self)
+        self._run(self.setups, publish=True)
 
     def runtest(self):
         '''
@@ -225,9 +518,25 @@ class YamlItem(pytest.Item):
         所以这里定义具体的测试行为
         :return
         '''
-        self._run(self.setups)
+        if self.future is not None:
+            # 并发执行时等待线程池中的结果，失败会重新抛出原来的异常
+            self.future.result()
+            return
+        self.run_setups()
         self._run(self.steps)
 
+    def execute(self):
+        '''
+        并发执行时在线程池中调用，包括前置、步骤和后置
+        '''
+        start = time.perf_counter()
+        try:
+            self.run_setups()
+            self._run(self.steps)
+        finally:
+            self._run(self.teardowns, True)
+            self.duration = time.perf_counter() - start
+
     def repr_failure(self, excinfo):
         """ called when self.runtest() raises an exception. """
         if isinstance(excinfo.value, YamlException):
@@ -0,0 +1,142 @@
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .env import get_envs
+from .replay import ReplayAdapter, get_replay_store
+
+# 创建连接池时加锁，避免并发时重复创建
+_pool_lock = threading.Lock()
+
+
+class PoolStats:
+    """
+    连接统计信息
+    requests是发送的请求总数，new_connections是新建的TCP/TLS连接数
+    两者的差值就是复用已有连接的次数
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def incr(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    @property
+    def reused_connections(self):
+        return max(self.requests - self.new_connections, 0)
+
+
+def _counting_pool(base, stats):
+    """
+    包装urllib3的连接池类，每新建一个连接计数一次
+    """
+
+    class CountingPool(base):
+
+        def _new_conn(self):
+            stats.incr("new_connections")
+            return super()._new_conn()
+
+    return CountingPool
+
+
+class PooledAdapter(HTTPAdapter):
+    """
+    带连接统计的HTTPAdapter
+    keep_alive为False时，每个请求都带上Connection: close
+    """
+
+    def __init__(self, stats, keep_alive=True, **kw):
+        # HTTPAdapter的__init__会调用init_poolmanager，所以要先赋值
+        self.stats = stats
+        self.keep_alive = keep_alive
+        super().__init__(**kw)
+
+    def init_poolmanager(self, *args, **kw):
+        super().init_poolmanager(*args, **kw)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _counting_pool(HTTPConnectionPool, self.stats),
+            "https": _counting_pool(HTTPSConnectionPool, self.stats),
+        }
+
+    def send(self, request, **kw):
+        self.stats.incr("requests")
+        if not self.keep_alive:
+            request.headers["Connection"] = "close"
+        return super().send(request, **kw)
+
+
+class SessionPool:
+    """
+    整个pytest会话共用的http连接池
+    按(proto, host, port, auth)区分Session，相同环境的步骤和案例复用同一个Session
+    在pytest_sessionfinish时统一关闭
+    只共享连接，Session的cookie不保存，每个请求和原来每次新建Session一样，不会带上其他案例的cookie
+    replay_store不为None时，所有请求经过ReplayAdapter录制或者回放
+    """
+
+    def __init__(self, size=10, keep_alive=True, replay_store=None):
+        self.size = size
+        self.keep_alive = keep_alive
+        self.replay_store = replay_store
+        self.stats = PoolStats()
+        self.sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, proto, host, port, auth=None):
+        if isinstance(auth, list):
+            auth = tuple(auth)
+        key = (proto, host, str(port), auth)
+        with self._lock:
+            session = self.sessions.get(key)
+            if session is None:
+                session = self._new_session()
+                self.sessions[key] = session
+        return session
+
+    def _new_session(self):
+        s = Session()
+        # 同一个请求内的重定向使用请求自己的cookie，不受影响
+        s.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        adapter = PooledAdapter(self.stats,
+                                keep_alive=self.keep_alive,
+                                pool_connections=self.size,
+                                pool_maxsize=self.size)
+        if self.replay_store is not None:
+            adapter = ReplayAdapter(self.replay_store, adapter)
+        s.mount("http://", adapter)
+        s.mount("https://", adapter)
+        return s
+
+    def close(self):
+        with self._lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
+
+
+def get_session_pool(config):
+    """
+    获取当前pytest会话的连接池，第一次调用时根据env.yml的配置创建
+    """
+    pool = getattr(config, "_api_session_pool", None)
+    if pool is None:
+        with _pool_lock:
+            pool = getattr(config, "_api_session_pool", None)
+            if pool is None:
+                envs = get_envs(config)
+                pool = SessionPool(int(envs["pool_size"]), envs["keep_alive"], get_replay_store(config))
+                config._api_session_pool = pool
+    return pool
+
+
+def close_session_pool(config):
+    pool = getattr(config, "_api_session_pool", None)
+    if pool is not None:
+        pool.close()
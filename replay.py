@@ -0,0 +1,243 @@
+'''
+响应的录制和回放
+--api-record PATH  正常发送请求，同时把响应(状态码、响应头、内容)保存到sqlite文件中
+--api-replay PATH  不发送请求，从sqlite文件中返回录制的响应，校验和返回值处理和正常执行一样
+请求的指纹由method、url和请求内容计算，同一个请求多次发送时按顺序录制和回放，回放完后重复最后一次的响应
+流式上传的请求内容不读取文件，只使用内容长度计算指纹
+录制时不额外读取响应内容，校验读取内容的同时压缩保存，流式下载的大文件不会整个放在内存中
+'''
+import json
+import hashlib
+import sqlite3
+import threading
+import zlib
+
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.cookies import RequestsCookieJar
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers, stream_decode_response_unicode
+
+_store_lock = threading.Lock()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    fingerprint TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    method TEXT,
+    url TEXT,
+    status_code INTEGER,
+    reason TEXT,
+    headers TEXT,
+    cookies TEXT,
+    body BLOB,
+    PRIMARY KEY (fingerprint, seq)
+)
+"""
+
+
+def fingerprint(request):
+    '''
+    @param request  requests.PreparedRequest
+    '''
+    h = hashlib.sha256()
+    h.update(request.method.encode("utf-8"))
+    h.update(b"\0")
+    h.update(request.url.encode("utf-8"))
+    h.update(b"\0")
+    body = request.body
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if isinstance(body, bytes):
+        h.update(body)
+    elif body is not None:
+        h.update(f"<stream:{len(body)}>".encode("utf-8"))
+    return h.hexdigest()
+
+
+class _RecordedRaw:
+    '''
+    回放的响应没有连接，requests处理重定向和关闭响应时会调用这些方法
+    '''
+
+    def read(self, *args, **kw):
+        return b""
+
+    def release_conn(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _Recording:
+    '''
+    一个响应的录制，响应内容读取完或者响应关闭时写入
+    '''
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+        self.compressor = zlib.compressobj()
+        self.parts = []
+        self.done = False
+
+    def add(self, chunk):
+        if chunk:
+            self.parts.append(self.compressor.compress(chunk))
+
+    def finish(self):
+        if self.done:
+            return
+        self.done = True
+        self.parts.append(self.compressor.flush())
+        self.store._write(self.row + (b"".join(self.parts),))
+
+
+def _tee(response, recording):
+    '''
+    替换响应的iter_content和close，读取内容时同时录制，content也是通过iter_content读取的
+    '''
+    iter_content = response.iter_content
+    close = response.close
+
+    def tee_content(chunk_size=1, decode_unicode=False):
+        def chunks():
+            for chunk in iter_content(chunk_size):
+                recording.add(chunk)
+                yield chunk
+            recording.finish()
+        return stream_decode_response_unicode(chunks(), response) if decode_unicode else chunks()
+
+    def tee_close():
+        # 没有读取完时只录制已经读取的内容
+        recording.finish()
+        close()
+
+    response.iter_content = tee_content
+    response.close = tee_close
+
+
+class ReplayStore:
+    '''
+    @param path  sqlite文件路径
+    @param mode  record或者replay
+    '''
+
+    def __init__(self, path, mode):
+        self.path = path
+        self.mode = mode
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(_SCHEMA)
+        self.conn.commit()
+        self.lock = threading.Lock()
+        # 本次会话中每个指纹已经录制或者回放的次数
+        self.counters = {}
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, request, response):
+        '''
+        发送请求时就确定录制的顺序，响应内容读取完后写入
+        '''
+        key = fingerprint(request)
+        cookies = json.dumps(response.cookies.get_dict())
+        headers = json.dumps(list(response.headers.items()))
+        with self.lock:
+            seq = self.counters.get(key, 0)
+            if seq == 0:
+                # 第一次录制时清掉上次录制的结果
+                self.conn.execute("DELETE FROM responses WHERE fingerprint = ?", (key,))
+                self.conn.commit()
+            self.counters[key] = seq + 1
+        _tee(response, _Recording(self, (key, seq, request.method, request.url, response.status_code,
+                                         response.reason, headers, cookies)))
+
+    def _write(self, row):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+            self.conn.commit()
+
+    def replay(self, request):
+        '''
+        返回录制的响应，没有录制时返回None
+        '''
+        key = fingerprint(request)
+        with self.lock:
+            seq = self.counters.get(key, 0)
+            row = self.conn.execute(
+                "SELECT status_code, reason, headers, cookies, body FROM responses "
+                "WHERE fingerprint = ? AND seq <= ? ORDER BY seq DESC LIMIT 1", (key, seq)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.counters[key] = seq + 1
+            self.hits += 1
+        status_code, reason, headers, cookies, body = row
+        response = Response()
+        response.status_code = status_code
+        response.reason = reason
+        response.headers = CaseInsensitiveDict(json.loads(headers))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = zlib.decompress(body)
+        response._content_consumed = True
+        response.raw = _RecordedRaw()
+        response.url = request.url
+        response.request = request
+        jar = RequestsCookieJar()
+        for name, value in json.loads(cookies).items():
+            jar.set(name, value)
+        response.cookies = jar
+        return response
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    '''
+    挂载在连接池的Session上，录制时调用原来的adapter发送请求，回放时不发送请求
+    响应的connection指向ReplayAdapter，auth_provider收到401后重发的请求也会录制或者回放
+    '''
+
+    def __init__(self, store, adapter):
+        super().__init__()
+        self.store = store
+        self.adapter = adapter
+
+    def send(self, request, **kw):
+        if self.store.mode == "replay":
+            response = self.store.replay(request)
+            if response is None:
+                raise AssertionError(f"回放模式下没有录制的响应: {request.method} {request.url}")
+        else:
+            response = self.adapter.send(request, **kw)
+            self.store.record(request, response)
+        response.connection = self
+        return response
+
+    def close(self):
+        self.adapter.close()
+
+
+def get_replay_store(config):
+    '''
+    指定了--api-record或--api-replay时返回ReplayStore，否则返回None
+    '''
+    if not hasattr(config, "_api_replay_store"):
+        with _store_lock:
+            if not hasattr(config, "_api_replay_store"):
+                store = None
+                if config.getoption("--api-record"):
+                    store = ReplayStore(config.getoption("--api-record"), "record")
+                elif config.getoption("--api-replay"):
+                    store = ReplayStore(config.getoption("--api-replay"), "replay")
+                config._api_replay_store = store
+    return config._api_replay_store
+
+
+def close_replay_store(config):
+    store = getattr(config, "_api_replay_store", None)
+    if store is not None:
+        store.close()
@@ -1,31 +1,107 @@
+import os
 import json
+import uuid
 import warnings
 import urllib3
 from pathlib import Path
 # from .common import getcwd
 from pytest_api.common import getcwd
+from pytest_api.timing import StepTimer
 from requests import Request, Session
 
 # 忽略告警信息
 warnings.filterwarnings("ignore")
 urllib3.disable_warnings()
 
+# 上传文件时每次读取的大小
+UPLOAD_CHUNK_SIZE = 65536
+
+
+def _quote(value):
+    return str(value).replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
+
+
+class MultipartStream:
+    """
+    流式的multipart/form-data请求体
+    发送时才打开文件，按块读取，发送完成或者中途失败都会关闭文件，不会把整个文件加载到内存中
+    提供__len__，requests会据此设置Content-Length，不使用chunked编码
+    @param files   {字段名: 文件路径}
+    @param fields  {字段名: 值}  和文件一起上传的普通字段
+    """
+
+    def __init__(self, files, fields=None, chunk_size=UPLOAD_CHUNK_SIZE):
+        self.boundary = uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        # (头部, 文件路径或者内容)
+        self.parts = []
+        for name, value in (fields or {}).items():
+            if not isinstance(value, (bytes, str)):
+                value = json.dumps(value, ensure_ascii=False)
+            if isinstance(value, str):
+                value = value.encode("utf-8")
+            self.parts.append((self._header(f'name="{_quote(name)}"'), value))
+        for name, filepath in files.items():
+            filepath = Path(filepath)
+            self.parts.append((self._header(f'name="{_quote(name)}"; filename="{_quote(filepath.name)}"'),
+                               filepath))
+        self.closing = f"--{self.boundary}--\r\n".encode("utf-8")
+        self.length = len(self.closing)
+        for header, src in self.parts:
+            size = os.path.getsize(src) if isinstance(src, Path) else len(src)
+            self.length += len(header) + size + 2
+
+    def _header(self, disposition):
+        return f"--{self.boundary}\r\nContent-Disposition: form-data; {disposition}\r\n\r\n".encode("utf-8")
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        for header, src in self.parts:
+            yield header
+            if isinstance(src, Path):
+                with open(src, "rb") as f:
+                    while True:
+                        chunk = f.read(self.chunk_size)
+                        if not chunk:
+                            break
+                        yield chunk
+            else:
+                yield src
+            yield b"\r\n"
+        yield self.closing
+
 
 class ApiRequest:
     '''
     request操作的封装
     '''
 
-    def __init__(self, ip, port=80, urlprefix=""):
+    def __init__(self, ip, port=80, urlprefix="", session=None):
         self.ip = ip
         self.port = port
         self.headers = None
         self.proto = "https"
-        self.s = Session()
+        # 没有传入共享的session时，第一次发送请求时单独创建一个
+        self._s = session
         # url前缀
         self.urlprefix = urlprefix
         self.auth = None
+        # env.yml中配置的auth_provider，没有basic授权时使用
+        self.auth_provider = None
         self.url = ""
+        # 步骤各阶段的耗时
+        self.timer = StepTimer()
+        # 是否流式读取响应内容
+        self.stream = False
+
+    @property
+    def s(self):
+        if self._s is None:
+            self._s = Session()
+        return self._s
 
     def _url(self, url):
         self.url = f'{self.proto}://{self.ip}:{self.port}{self.urlprefix}' \
@@ -59,7 +135,8 @@ class ApiRequest:
                 headers = None
             else:
                 headers = kw["headers"]
-        return headers
+        # 复制一份，避免后续添加Content-Type时修改到全局的headers
+        return dict(headers) if headers else headers
 
     def handle_files(self, kw):
         """
@@ -75,15 +152,17 @@ class ApiRequest:
                     # 多个文件也类似这样写
                 }
         }
+        同时有data并且data是字典时，data中的字段作为普通字段一起上传
+        返回MultipartStream，发送时才打开文件，发送后自动关闭
         """
         _files = None if "files" not in kw else kw["files"]
         if _files:
             files = {}
             cur_work_path = getcwd()
             for file_key, filepath in _files.items():
-                filepath = Path(cur_work_path) / Path(filepath)
-                files[file_key] = open(filepath, 'rb')
-            return files
+                files[file_key] = Path(cur_work_path) / Path(filepath)
+            fields = kw.get("data") if isinstance(kw.get("data"), dict) else None
+            return MultipartStream(files, fields)
         return None
 
     def handle_urlprefix(self, kw):
@@ -96,7 +175,11 @@ class ApiRequest:
             else:
                 self.urlprefix = kw["urlprefix"]
 
-    def send(self, **kw):
+    def prepare(self, **kw):
+        """
+        根据步骤中的request字段组装请求
+        @return 组装好的请求和超时时间
+        """
         method = None if "method" not in kw else kw["method"]
         url = None if "url" not in kw else kw["url"]
         files = self.handle_files(kw)
@@ -122,6 +205,17 @@ class ApiRequest:
                 headers = None
             data = json.dumps(kw["json"], ensure_ascii=False).encode("utf-8")
 
+        if files is not None:
+            # 流式上传，请求体为MultipartStream
+            if headers is None:
+                headers = {}
+            headers["Content-Type"] = files.content_type
+            data = files
+            files = None
+
+        if auth is None and self.auth_provider is not None and kw.get("auth") != 'none':
+            auth = self.auth_provider
+
         if headers and "Cookie" in headers:
             # 避免cookie和auth共存的行为
             auth = None
@@ -139,5 +233,12 @@ class ApiRequest:
         )
         prepped = r.prepare()
         # prepped = self.s.prepare_request(r)
-        res = self.s.send(prepped, verify=False, timeout=timeout)
+        return prepped, timeout
+
+    def send(self, **kw):
+        with self.timer.phase("prepare"):
+            prepped, timeout = self.prepare(**kw)
+        with self.timer.phase("network"):
+            res = self.s.send(prepped, verify=False, timeout=timeout, stream=self.stream)
+        self.timer.status_code = res.status_code
         return res
\ No newline at end of file
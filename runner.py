@@ -1,15 +1,107 @@
+import os
 import json
 import time
+import signal
+import codecs
+import asyncio
+import hashlib
+import contextlib
+import threading
+import queue
 import subprocess
+from pathlib import Path
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from requests.exceptions import ChunkedEncodingError
 from requests.utils import dict_from_cookiejar
 
-from .env import get_envs
+from .env import get_envs, defaults_envs
 from .common import json_check, getcwd
 from .request import ApiRequest
+from .pool import get_session_pool
+from .auth import get_auth_provider
+from .timing import NULL_TIMER
+from .body import ResponseBody, get_json_loads
+from .jsonstream import iter_events, stream_json_check
+from .jsonpath import compile_return
 
 # 获取全局对比方式
 container_compare = True
 
+# 流式读取响应时每次读取的大小
+STREAM_CHUNK_SIZE = 65536
+
+# response中这些字段表示下载响应内容，自动使用stream模式
+DOWNLOAD_KEYS = ("save_to", "size", "checksum")
+# checksum支持的摘要算法
+CHECKSUM_ALGORITHMS = ("md5", "sha1", "sha256")
+
+# 轮询步骤的配置项，其余字段为每次执行的步骤
+POLL_OPTIONS = ("timeout", "interval", "backoff", "max_interval")
+
+# 会话结束或者中断时设置，正在sleep和轮询的步骤立即结束等待
+interrupted = threading.Event()
+
+
+def sleep(seconds):
+    '''
+    可中断的等待，支持小数秒
+    @return 被中断时返回False
+    '''
+    return not interrupted.wait(max(float(seconds), 0))
+
+
+async def sleep_async(seconds):
+    '''
+    事件循环中的等待，不占用线程，其他并发的步骤可以继续执行
+    '''
+    await asyncio.sleep(max(float(seconds), 0))
+    return not interrupted.is_set()
+
+
+def poll_options(spec):
+    '''
+    poll:                      # 或者wait_until
+        timeout: 30            # 最长等待时间，单位秒，默认30
+        interval: 0.5          # 第一次重试前的等待时间，默认1
+        backoff: 2             # 每次重试后等待时间乘以backoff，默认1
+        max_interval: 5        # 等待时间的上限，默认不限制
+        api:                   # 每次执行的步骤，response校验通过时结束轮询
+            request: ...
+            response: ...
+    @return (timeout, interval, backoff, max_interval, 执行的步骤)
+    '''
+    assert isinstance(spec, dict), f"poll的格式错误，请检查当前yml文件: {spec}"
+    timeout = float(spec.get("timeout", 30))
+    interval = float(spec.get("interval", 1))
+    backoff = float(spec.get("backoff", 1))
+    max_interval = float(spec.get("max_interval", timeout))
+    assert backoff >= 1, f"poll的backoff不能小于1，当前为: {backoff}"
+    inner = {k: v for k, v in spec.items() if k not in POLL_OPTIONS}
+    assert set(inner) - {"name"}, "poll中没有要执行的步骤，请检查当前yml文件"
+    return timeout, interval, backoff, max_interval, inner
+
+
+@lru_cache(maxsize=None)
+def parse_status_codes(expt_status_code):
+    '''
+    把期望状态码解析成集合，支持200和"200,201"两种写法
+    '''
+    if isinstance(expt_status_code, bool):
+        raise ValueError(f"状态码格式错误: {expt_status_code}")
+    if isinstance(expt_status_code, int):
+        return frozenset((expt_status_code,))
+    if isinstance(expt_status_code, str):
+        try:
+            return frozenset(int(code) for code in expt_status_code.split(","))
+        except ValueError:
+            raise ValueError(f"状态码格式错误: {expt_status_code}")
+    raise ValueError(f"状态码格式错误: {expt_status_code}")
+
+
+def _poll_failed(attempt, timeout, error):
+    return AssertionError(f"轮询{attempt}次，{timeout}秒内未满足条件: {error}")
+
 
 class CheckMixIn():
     """
@@ -57,22 +149,9 @@ class ReturnMixIn():
         '''
         @param obj      dict    请求的返回值的json字典结构
         @param rule     str     获取变量的规则，规则可能是a.b.c | a | a.b.1 嵌套获取
+                                也支持items[*].id | items[0:2] | items[?name=='x'].id，见jsonpath
         '''
-        value = None
-        for key in rule.split("."):
-            if key.isdigit():
-                try:
-                    value = obj[int(key)]
-                    obj = value
-                except IndexError:
-                    raise AssertionError(f"请检查返回值规则:{rule} 中的{key}，超过数组长度")
-            else:
-                if key in obj:
-                    value = obj[key]
-                    obj = value
-                else:
-                    raise AssertionError(f"请检查返回值规则:{rule} 中的key:{key} 不存在")
-        return value
+        return compile_return({"value": rule}).extract(obj)["value"]
 
     def _return(self, response, return_rule):
         '''
@@ -80,6 +159,10 @@ class ReturnMixIn():
         @param return_rule    返回规则
         '''
         res_param = {}
+        if isinstance(return_rule, str):
+            # 直接把return的值当做变量的名称，返回的内容当做变量的值
+            res_param[return_rule] = self.get_response_text(response)
+            return res_param
         response_is_json = True
         try:
             response_json = self.get_response_json(response)
@@ -87,14 +170,16 @@ class ReturnMixIn():
             response_is_json = False
         if response_is_json:
             # 获取返回json
-            # 遍历规则，取每个规则value值当做返回值的key取返回值中的数据
-            for key, value in return_rule.items():
-                res_value = self._get_json_value_by_rule(response_json, value)
+            # 所有规则编译成一棵前缀树，只遍历一次返回值就取出全部变量
+            values = compile_return(return_rule).extract(response_json)
+            for key in return_rule:
+                res_value = values.get(key)
                 if res_value:
                     res_param[key] = res_value
         else:
-            # 如果是文本，则直接把return的值，当做变量的名称，返回的文件当做变量的值
-            res_param[return_rule] = self.get_response_text(response)
+            # 文本内容只能用字符串规则整体保存
+            raise AssertionError(f"返回内容不是json，不能按规则{return_rule}提取返回值，"
+                                 f"可以把return写成变量名保存整个返回内容")
         return res_param
 
     def get_cookie(self, response):
@@ -124,21 +209,53 @@ class ReturnMixIn():
 
 class RunerMixin():
 
+    # 步骤各阶段的耗时，由Runner在执行前设置
+    timer = NULL_TIMER
+    # json解析函数，由env.yml中的json_backend决定
+    json_loads = staticmethod(json.loads)
+    # 当前步骤的响应和对应的ResponseBody
+    _body = (None, None)
+
+    def _response_body(self, response):
+        '''
+        同一个响应只创建一次ResponseBody，json和文本只解析一次
+        '''
+        cached, body = self._body
+        if cached is not response:
+            body = self._make_body(response)
+            self._body = (response, body)
+        return body
+
     def run(self, step):
-        res_param = {}
         # 发送请求
         assert "request" in step, "步骤中必须要有request字段，请检查当前yml文件"
         r = self._run(step["request"])
+        return self._handle_response(r, step)
+
+    def _handle_response(self, r, step):
+        res_param = {}
         # 请求对比
         if "response" in step:
-            self._resonse_compare(r, step["response"])
+            with self.timer.phase("check"):
+                self._resonse_compare(r, step["response"])
+            if "max_latency_ms" in step["response"]:
+                self._check_latency(step["response"]["max_latency_ms"])
         # 返回值处理
-        if "return" in step:
-            res_param = self._return(r, step["return"])
-        if "return_header" in step:
-            res_param.update(self._return_header(r, step["return_header"]))
+        with self.timer.phase("return"):
+            if "return" in step:
+                res_param = self._return(r, step["return"])
+            if "return_header" in step:
+                res_param.update(self._return_header(r, step["return_header"]))
         return res_param
 
+    def _check_latency(self, max_latency_ms):
+        '''
+        功能校验通过但是请求耗时超过阈值时，也认为步骤失败
+        '''
+        latency_ms = self.timer.get("network") * 1000
+        assert latency_ms <= float(max_latency_ms), \
+            f'请求耗时超过阈值：期望值:{max_latency_ms}ms, 实际值: {latency_ms:.1f}ms'
+
 class ApiRunner(ApiRequest, CheckMixIn, ReturnMixIn, RunerMixin):
     """
     API 步骤的格式是：
@@ -159,6 +276,13 @@ class ApiRunner(ApiRequest, CheckMixIn, ReturnMixIn, RunerMixin):
         var_b: a.b.1             # 可选
     """
 
+    @classmethod
+    def _pooled_session(cls, config, envs):
+        """
+        相同环境的步骤复用连接池中的session
+        """
+        return get_session_pool(config).get(envs["proto"], envs["host"], envs["port"], envs["auth"])
+
     @classmethod
     def from_config_and_env(cls, config):
         envs = get_envs(config)
@@ -171,12 +295,13 @@ class ApiRunner(ApiRequest, CheckMixIn, ReturnMixIn, RunerMixin):
         #           config.getoption("--port"),
         #           urlprefix
         #           )
+        auth = envs["auth"]
         obj = cls(envs["host"],
                   envs["port"],
-                  urlprefix
+                  urlprefix,
+                  cls._pooled_session(config, envs)
                   )
         print("obj=", obj)
-        auth = envs["auth"]
         if isinstance(auth, list):
             obj.auth = tuple(auth)
         else:
@@ -184,50 +309,144 @@ class ApiRunner(ApiRequest, CheckMixIn, ReturnMixIn, RunerMixin):
                 print("授权格式错误，请检查")
         obj.headers = headers
         obj.proto = proto
+        obj.auth_provider = get_auth_provider(config)
+        obj.json_loads = get_json_loads(envs["json_backend"])
         return obj
 
+    def _set_stream(self, step):
+        '''
+        response中带stream: true或者下载相关字段时流式读取和校验响应，不把整个响应加载到内存中
+        sync和async方式执行步骤前都要调用
+        '''
+        response = step.get("response") or {}
+        self.stream = bool(response.get("stream")) or any(k in response for k in DOWNLOAD_KEYS)
+        assert not (self.stream and "return" in step), "stream模式下不支持return，请检查当前yml文件"
+
+    def run(self, step):
+        self._set_stream(step)
+        return super().run(step)
+
     def _run(self, request):
         '''
         发送请求
         '''
         return self.send(**request)
 
+    def _make_body(self, response):
+        return ResponseBody(response.content, lambda: response.text, self.json_loads, response.encoding)
+
     def get_response_json(self, response):
+        body = self._response_body(response)
         try:
-            return response.json()
-        except json.decoder.JSONDecodeError:
+            return body.json()
+        except ValueError:
             raise AssertionError(
-                f"返回非json结构，当前状态码为:{response.status_code}, 内容为{response.text}")
+                f"返回非json结构，当前状态码为:{response.status_code}, 内容为{body.text}")
 
     def get_response_text(self, response):
-        return response.text
+        return self._response_body(response).text
 
     def _resonse_compare(self, response, exptResponse):
         '''
         @param response       请求的返回值
         @param exptResponse   期望返回值，即yaml里面的response
         '''
+        if self.stream:
+            self._stream_compare(response, exptResponse)
+            return
         if "status_code" in exptResponse:
             self._compare_status_code(response.status_code, exptResponse[
-                "status_code"], response.text)
+                "status_code"], self.get_response_text(response))
         self._json_text_check(response, exptResponse)
 
+    def _stream_compare(self, response, exptResponse):
+        '''
+        流式校验，边读取边校验，遇到第一个不一致的地方立即失败并关闭连接
+        '''
+        try:
+            if "status_code" in exptResponse:
+                self._compare_status_code(response.status_code, exptResponse["status_code"],
+                                          "stream模式，未读取返回内容")
+            assert not ("json" in exptResponse and "text" in exptResponse), \
+                "stream模式下json和text只能二选一，请检查当前yml文件"
+            chunks = response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+            encoding = response.encoding or "utf-8"
+            if any(k in exptResponse for k in DOWNLOAD_KEYS):
+                assert "json" not in exptResponse and "text" not in exptResponse, \
+                    "save_to/size/checksum不能和json、text一起使用，请检查当前yml文件"
+                self._download(chunks, exptResponse, _content_length(response))
+            if "json" in exptResponse:
+                stream_json_check(iter_events(chunks, encoding), exptResponse["json"], container_compare)
+            if "text" in exptResponse:
+                self._stream_text_check(chunks, str(exptResponse["text"]), encoding)
+        except ChunkedEncodingError as e:
+            # 连接中断或者内容比Content-Length短
+            raise AssertionError(f"读取返回内容失败，内容不完整: {e}")
+        finally:
+            response.close()
+
+    def _download(self, chunks, exptResponse, content_length=None):
+        '''
+        边读取边统计大小和计算摘要，有save_to时同时写入文件
+        content_length为响应头中的长度，读取的内容比它短时失败
+        response:
+            save_to: download/a.zip     # 相对于当前工作目录
+            size: 1024
+            checksum:
+                sha256: 9f86d0...       # 支持md5/sha1/sha256
+        '''
+        checksum = exptResponse.get("checksum") or {}
+        for name in checksum:
+            assert name in CHECKSUM_ALGORITHMS, \
+                f"checksum只支持{'/'.join(CHECKSUM_ALGORITHMS)}，当前为: {name}"
+        hashes = {name: hashlib.new(name) for name in checksum}
+        path = None
+        if exptResponse.get("save_to"):
+            path = Path(getcwd()) / Path(exptResponse["save_to"])
+            path.parent.mkdir(parents=True, exist_ok=True)
+        size = 0
+        with open(path, "wb") if path else contextlib.nullcontext() as f:
+            for chunk in chunks:
+                size += len(chunk)
+                for h in hashes.values():
+                    h.update(chunk)
+                if f is not None:
+                    f.write(chunk)
+        assert content_length is None or size == content_length, \
+            f"下载内容不完整：Content-Length为{content_length}, 实际读取：{size}"
+        if "size" in exptResponse:
+            assert size == int(exptResponse["size"]), \
+                f"下载内容大小校验失败：期望值：{exptResponse['size']}, 实际值：{size}"
+        for name, h in hashes.items():
+            actual = h.hexdigest()
+            assert actual == str(checksum[name]).lower(), \
+                f"下载内容{name}校验失败：期望值：{checksum[name]}, 实际值：{actual}"
+
+    def _stream_text_check(self, chunks, expected, encoding):
+        '''
+        只保留上一块末尾的内容，用来匹配跨块的期望文本
+        '''
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        keep = len(expected) - 1
+        tail = ""
+        for chunk in chunks:
+            text = tail + decoder.decode(chunk)
+            if expected in text:
+                return
+            tail = text[-keep:] if keep > 0 else ""
+        assert expected in tail + decoder.decode(b"", final=True), \
+            f'期望结果：{expected}, 实际结果中不包含'
+
     def _compare_status_code(self, status_code, expt_status_code, text):
         '''
         状态码校验支持多状态码校验，比如同时有200和400,只要有一个校验通过，就是通过
         '''
-        if isinstance(expt_status_code, int):
-            assert status_code == expt_status_code,\
-                f'状态码不一致：期望值:{expt_status_code},' \
-                f'实际值: {status_code}， 返回内容:{text}'
-        elif isinstance(expt_status_code, str):
-            ok = False
-            for code in expt_status_code.split(","):
-                if int(code) == status_code:
-                    ok = True
-                    break
-            assert ok, f'状态码不一致：期望值:{expt_status_code},' \
-                f'实际值: {status_code}， 返回内容:{text}'
+        try:
+            codes = parse_status_codes(expt_status_code)
+        except ValueError as e:
+            raise AssertionError(str(e))
+        assert status_code in codes, f'状态码不一致：期望值:{expt_status_code},' \
+            f'实际值: {status_code}， 返回内容:{text}'
 
 
 class ExecRunner(CheckMixIn, ReturnMixIn, RunerMixin):
@@ -238,6 +457,9 @@ class ExecRunner(CheckMixIn, ReturnMixIn, RunerMixin):
         args: python test.py 或者 ["python", "test.py"]  # 必选
         cwd:  /tmp                                       # 可选
         shell: False                                     # 可选
+        timeout: 60                                      # 可选，超时后结束命令，默认为env.yml中的exec_timeout
+        max_output: 1048576                              # 可选，最多保留的输出字节数，默认为env.yml中的exec_max_output
+        stop_on_match: True                              # 可选，输出中出现response.text时立即结束命令
       response:                                          # 同API是个校验字段
         text: test                                       # 返回文本和json是互斥关系
         json: {"a": "b"}                                 # 返回json和文本是互斥关系
@@ -245,34 +467,166 @@ class ExecRunner(CheckMixIn, ReturnMixIn, RunerMixin):
         var_a: a                                         # 返回值变量处理
     """
 
+    timeout = defaults_envs["exec_timeout"]
+    max_output = defaults_envs["exec_max_output"]
+    # stop_on_match时要匹配的文本
+    _stop_text = None
+
     @classmethod
     def from_config_and_env(cls, config):
-        return cls()
+        obj = cls()
+        envs = get_envs(config)
+        obj.json_loads = get_json_loads(envs["json_backend"])
+        obj.timeout = envs["exec_timeout"]
+        obj.max_output = envs["exec_max_output"]
+        return obj
+
+    def run(self, step):
+        request = step.get("request") or {}
+        response = step.get("response") or {}
+        self._stop_text = None
+        if request.get("stop_on_match") and "text" in response:
+            assert "return" not in step and "json" not in response, \
+                "stop_on_match时只能校验text，不支持json和return，请检查当前yml文件"
+            self._stop_text = str(response["text"])
+        return super().run(step)
 
     def _run(self, request):
         assert "args" in request, "args为命令扩展动作的必选传参，请检查当前的yml文件"
         args = request["args"]
         cwd = request["cwd"] if "cwd" in request else getcwd()
         shell = request["shell"] if "shell" in request else False
-        res = subprocess.check_output(args, shell=shell, cwd=cwd)
-        try:
-            return res.decode("utf-8")
-        except UnicodeDecodeError:
-            return res.decode('gbk')
+        timeout = float(request.get("timeout", self.timeout) or 0) or None
+        max_output = int(request.get("max_output", self.max_output))
+        with self.timer.phase("network"):
+            # 单独的进程组，结束命令时shell启动的子进程一起结束
+            proc = subprocess.Popen(args, shell=shell, cwd=cwd, start_new_session=os.name == "posix",
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            try:
+                chunks, matched = self._communicate(proc, timeout, max_output)
+            finally:
+                _kill(proc)
+        if not matched and proc.returncode != 0:
+            raise AssertionError(f"命令执行失败，返回码: {proc.returncode}, 命令: {args}, "
+                                 f"错误输出: {_decode(b''.join(self._stderr))}")
+        return _decode(b"".join(chunks))
+
+    def _communicate(self, proc, timeout, max_output):
+        '''
+        后台线程按块读取stdout和stderr，超过max_output的部分丢弃，超时后结束命令
+        @return (保留的输出, 是否已经匹配到stop_on_match的文本)
+        '''
+        chunks = queue.Queue()
+        self._stderr = []
+        readers = [
+            threading.Thread(target=_read_chunks, args=(proc.stdout, chunks.put), daemon=True),
+            threading.Thread(target=_read_chunks, args=(proc.stderr, _capped(self._stderr, max_output)),
+                             daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        output = []
+        size = 0
+        # 只保留上一块末尾的内容，用来匹配跨块的文本
+        tail = ""
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        while True:
+            try:
+                wait = None if deadline is None else max(deadline - time.monotonic(), 0)
+                chunk = chunks.get(timeout=wait)
+            except queue.Empty:
+                raise AssertionError(f"命令执行超过{timeout}秒，已结束命令: {proc.args}")
+            if chunk is None:
+                break
+            if size < max_output:
+                output.append(chunk[:max_output - size])
+                size += len(output[-1])
+            if self._stop_text is not None:
+                text = tail + decoder.decode(chunk)
+                if self._stop_text in text:
+                    return output, True
+                keep = len(self._stop_text) - 1
+                tail = text[-keep:] if keep > 0 else ""
+        for reader in readers:
+            reader.join()
+        return output, False
 
     def _resonse_compare(self, response, exptResponse):
         self._json_text_check(response, exptResponse)
 
+    def _make_body(self, response):
+        return ResponseBody(response, lambda: response, self.json_loads)
+
     def get_response_json(self, response):
         try:
-            return json.loads(response)
-        except json.decoder.JSONDecodeError:
+            return self._response_body(response).json()
+        except ValueError:
             raise AssertionError(
                 f"返回非json结构，内容为{response}")
 
     def get_response_text(self, response):
         return response
 
+
+def _decode(raw):
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("gbk", errors="replace")
+
+
+def _content_length(response):
+    '''
+    响应头中的内容长度，压缩传输时解压后的长度和它不同，返回None不校验
+    '''
+    headers = response.headers
+    if headers.get("Content-Encoding", "identity") != "identity":
+        return None
+    try:
+        return int(headers["Content-Length"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _kill(proc):
+    if proc.poll() is None:
+        if os.name == "posix":
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        else:
+            proc.kill()
+    proc.wait()
+
+
+def _read_chunks(stream, put):
+    '''
+    读取命令的输出直到结束，结束时放入None
+    read1每次返回当前已经输出的内容(最多STREAM_CHUNK_SIZE)，不用等到行结束或者块读满
+    '''
+    try:
+        for chunk in iter(lambda: stream.read1(STREAM_CHUNK_SIZE), b""):
+            put(chunk)
+    finally:
+        stream.close()
+        put(None)
+
+
+def _capped(chunks, max_output):
+    '''
+    最多保留max_output字节的输出，超过的部分读取后丢弃
+    '''
+    size = [0]
+
+    def put(chunk):
+        if chunk is not None and size[0] < max_output:
+            chunks.append(chunk[:max_output - size[0]])
+            size[0] += len(chunks[-1])
+    return put
+
+
 class Runner:
 
     def __init__(self):
@@ -282,13 +636,23 @@ class Runner:
     def register_handler(self, key, handler):
         self.handlers[key] = handler
 
-    def run(self, step, config):
+    def run(self, step, config, timer=None):
+        '''
+        @param timer  StepTimer  记录步骤各阶段的耗时，为None时不记录
+        '''
         res_param = {}
         for k in step:
             if k == "name":
                 continue
             if k == "sleep":
-                time.sleep(int(step[k]))
+                sleep(step[k])
+                continue
+            if k in ("poll", "wait_until"):
+                res_param.update(self.poll(step[k], config, timer))
+                continue
+            if k == "parallel":
+                with (timer or NULL_TIMER).phase("network"):
+                    res_param.update(self.run_parallel(step[k], config))
                 continue
             if k not in self.handlers:
                 # 获取环境变量
@@ -301,6 +665,106 @@ class Runner:
                 # 通过调用from_config_and_env这个类方法将ip, port, urlprefix这三个参数传入，构造完整的url
                 # k=api时handler=ApiRunner, k=exec时handler=ExecRunner
                 hander = self.handlers[k].from_config_and_env(config)
+                if timer is not None:
+                    hander.timer = timer
                 res_param = hander.run(step[k])
         return res_param
 
+    def poll(self, spec, config, timer=None):
+        '''
+        重复执行步骤直到校验通过，两次执行之间按backoff增加等待时间，超时后抛出最后一次的错误
+        '''
+        timeout, interval, backoff, max_interval, inner = poll_options(spec)
+        deadline = time.monotonic() + timeout
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return self.run(inner, config, timer)
+            except AssertionError as e:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not sleep(min(interval, remaining)):
+                    raise _poll_failed(attempt, timeout, e)
+            interval = min(interval * backoff, max_interval)
+
+    async def _poll_async(self, spec, config):
+        '''
+        async模式下只有api的轮询，等待时让出事件循环
+        '''
+        timeout, interval, backoff, max_interval, inner = poll_options(spec)
+        deadline = time.monotonic() + timeout
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                hander = self.handlers["api"].from_config_and_env(config)
+                return await hander.run_async(inner["api"])
+            except AssertionError as e:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not await sleep_async(min(interval, remaining)):
+                    raise _poll_failed(attempt, timeout, e)
+            interval = min(interval * backoff, max_interval)
+
+    def run_parallel(self, steps, config):
+        """
+        并发执行parallel中的多个步骤，这些步骤之间不能有数据依赖
+        parallel:
+          - name: 步骤1
+            api: ...
+          - name: 步骤2
+            api: ...
+        api的transport为async时在事件循环中并发发送，否则使用线程池
+        返回值按步骤的顺序合并
+        """
+        steps = [s for s in steps if not s.get("skip")]
+        if not steps:
+            return {}
+        api_handler = self.handlers.get("api")
+        if hasattr(api_handler, "run_async"):
+            engine = api_handler.from_config_and_env(config).engine
+            results = engine.run(self._gather(steps, config))
+        else:
+            with ThreadPoolExecutor(max_workers=len(steps)) as executor:
+                results = list(executor.map(lambda s: self._run_sub_step(s, config), steps))
+        res_param = {}
+        for result in results:
+            res_param.update(result)
+        return res_param
+
+    async def _gather(self, steps, config):
+        '''
+        和线程池一样等待所有步骤结束后再抛出第一个错误，失败时其他步骤的下载等操作不会被中途放弃
+        '''
+        results = await asyncio.gather(*[self._run_sub_step_async(s, config) for s in steps],
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
+
+    async def _run_sub_step_async(self, step, config):
+        """
+        只有api、sleep或者轮询api的步骤直接在事件循环中执行，其他动作放到线程池中执行
+        """
+        try:
+            keys = set(step) - {"name"}
+            if keys == {"api"}:
+                hander = self.handlers["api"].from_config_and_env(config)
+                return await hander.run_async(step["api"])
+            if keys == {"sleep"}:
+                await sleep_async(step["sleep"])
+                return {}
+            if len(keys) == 1 and keys <= {"poll", "wait_until"}:
+                spec = step[keys.pop()]
+                if isinstance(spec, dict) and set(spec) - set(POLL_OPTIONS) - {"name"} == {"api"}:
+                    return await self._poll_async(spec, config)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.run, step, config)
+        except AssertionError as e:
+            raise AssertionError(f"并发步骤{step.get('name', '')}: {e}")
+
+    def _run_sub_step(self, step, config):
+        try:
+            return self.run(step, config)
+        except AssertionError as e:
+            raise AssertionError(f"并发步骤{step.get('name', '')}: {e}")
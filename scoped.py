@@ -0,0 +1,134 @@
+'''
+按作用域共享的前置
+setup写成字典时，前置只在作用域内执行一次，返回值提供给作用域内所有使用它的案例，
+作用域内最后一个案例执行完后执行其中的teardown
+setup:
+  scope: session          # session: 整个会话, directory: 同一个目录, file: 同一个文件
+  key: login-admin        # 可选，key相同的前置只执行一次，默认按前置的内容区分
+  steps:                  # 前置步骤
+    - name: 登录
+      api: ...
+      return: {token: data.token}
+  teardown:               # 可选，作用域结束时执行
+    - name: 退出登录
+      api: ...
+并发执行(--api-workers)和pytest-xdist时，teardown在会话结束时执行
+'''
+import hashlib
+import json
+import os
+import threading
+from collections import ChainMap
+
+SCOPES = ("session", "directory", "file")
+
+_registry_lock = threading.Lock()
+
+
+def default_key(raw):
+    '''
+    没有指定key时按前置的内容区分，内容相同的前置共用
+    '''
+    content = json.dumps(raw, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def scope_path(scope, path):
+    if scope == "file":
+        return str(path)
+    if scope == "directory":
+        return os.path.dirname(str(path))
+    return ""
+
+
+class ScopedSetup:
+    '''
+    一个作用域内共享的前置，values为前置步骤的返回值
+    '''
+
+    def __init__(self, key, setups, teardowns):
+        self.key = key
+        self.setups = setups
+        self.teardowns = teardowns
+        self.values = {}
+        self.lock = threading.Lock()
+        self.done = False
+        self.error = None
+        self.finished = False
+        self.scope = None
+
+    def ensure(self, item):
+        '''
+        第一次调用时执行前置，之后直接返回，前置失败时每个案例都抛出同样的错误
+        '''
+        with self.lock:
+            if not self.done:
+                self.scope = ChainMap(self.values, item._global_params)
+                try:
+                    item._run(self.setups, publish=True, scope=self.scope)
+                except Exception as e:
+                    self.error = e
+                finally:
+                    self.done = True
+        if self.error is not None:
+            raise self.error
+
+    def finish(self, item):
+        with self.lock:
+            if self.done and not self.finished:
+                self.finished = True
+                item._run(self.teardowns, True, scope=self.scope)
+
+
+class ScopedSetups:
+    '''
+    当前pytest会话中所有的共享前置
+    '''
+
+    def __init__(self):
+        self.setups = {}
+        self.lock = threading.Lock()
+        # 每个共享前置的最后一个案例，第一次释放时按最终的执行顺序计算
+        self.last_items = None
+        # 共享前置对应的任意一个案例，会话结束时用来执行teardown
+        self.owners = {}
+
+    def get(self, spec, path):
+        key = (spec["scope"], scope_path(spec["scope"], path), spec["key"])
+        with self.lock:
+            setup = self.setups.get(key)
+            if setup is None:
+                setup = ScopedSetup(key, spec["steps"], spec["teardown"])
+                self.setups[key] = setup
+        return setup
+
+    def ensure(self, item):
+        with self.lock:
+            self.owners.setdefault(item.scoped.key, item)
+        item.scoped.ensure(item)
+
+    def release(self, item, items):
+        '''
+        案例执行完后调用，作用域内最后一个案例执行完时执行teardown
+        '''
+        with self.lock:
+            if self.last_items is None:
+                self.last_items = {}
+                for other in items:
+                    scoped = getattr(other, "scoped", None)
+                    if scoped is not None:
+                        self.last_items[scoped.key] = other
+        if self.last_items.get(item.scoped.key) is item:
+            item.scoped.finish(item)
+
+    def finish_all(self):
+        for key, item in list(self.owners.items()):
+            self.setups[key].finish(item)
+
+
+def get_scoped_setups(config):
+    if not hasattr(config, "_api_scoped_setups"):
+        with _registry_lock:
+            if not hasattr(config, "_api_scoped_setups"):
+                config._api_scoped_setups = ScopedSetups()
+    return config._api_scoped_setups
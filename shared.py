@@ -0,0 +1,139 @@
+'''
+pytest-xdist分布式执行时的共享变量
+主进程启动一个变量服务，地址和密钥通过workerinput传给各个worker，
+worker执行前置步骤得到的返回值写入服务，其他worker的案例引用本地没有的变量时从服务中读取
+worker在其他机器上(--tx ssh=...)时，需要用--api-store-host指定worker能访问到的主进程地址
+'''
+import os
+import threading
+from collections.abc import Mapping
+from multiprocessing.managers import BaseManager
+
+# workerinput中共享变量服务的key
+WORKERINPUT_KEY = "pytest_api_store"
+
+_store_lock = threading.Lock()
+
+
+class _Store:
+    '''
+    在变量服务进程中保存所有共享的变量
+    '''
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def contains(self, key):
+        return key in self.data
+
+    def lookup(self, key):
+        '''
+        一次调用返回(是否存在, 值)
+        '''
+        if key in self.data:
+            return True, self.data[key]
+        return False, None
+
+    def update(self, mapping):
+        self.data.update(mapping)
+
+
+_store = None
+
+
+def _get_store():
+    global _store
+    if _store is None:
+        _store = _Store()
+    return _store
+
+
+class StoreManager(BaseManager):
+    pass
+
+
+StoreManager.register("store", callable=_get_store)
+
+
+class SharedVariables(Mapping):
+    '''
+    只读的共享变量，读取过的变量缓存在本地，作为案例变量作用域的最后一层
+    不存在的变量也记录下来，同一个步骤中不再重复查询，每个步骤开始时调用forget_misses清空
+    '''
+
+    def __init__(self, store):
+        self.store = store
+        self.cache = {}
+        self.misses = set()
+
+    def __getitem__(self, key):
+        if key in self.cache:
+            return self.cache[key]
+        if key in self.misses:
+            raise KeyError(key)
+        found, value = self.store.lookup(key)
+        if not found:
+            self.misses.add(key)
+            raise KeyError(key)
+        self.cache[key] = value
+        return value
+
+    def forget_misses(self):
+        self.misses = set()
+
+    def __iter__(self):
+        return iter(self.cache)
+
+    def __len__(self):
+        return len(self.cache)
+
+    def publish(self, mapping):
+        if mapping:
+            self.cache.update(mapping)
+            self.misses.difference_update(mapping)
+            self.store.update(dict(mapping))
+
+
+def start_store(config):
+    '''
+    在主进程中启动变量服务，返回传给worker的连接信息
+    '''
+    with _store_lock:
+        info = getattr(config, "_api_store_info", None)
+        if info is None:
+            authkey = os.urandom(16)
+            manager = StoreManager(address=(config.getoption("--api-store-bind"), 0), authkey=authkey)
+            manager.start()
+            host = config.getoption("--api-store-host") or manager.address[0]
+            info = {"host": host, "port": manager.address[1], "authkey": authkey.hex()}
+            config._api_store_manager = manager
+            config._api_store_info = info
+    return info
+
+
+def stop_store(config):
+    manager = getattr(config, "_api_store_manager", None)
+    if manager is not None:
+        manager.shutdown()
+        config._api_store_manager = None
+
+
+def get_shared_variables(config):
+    '''
+    xdist的worker中返回SharedVariables，其他情况返回None
+    '''
+    if not hasattr(config, "_api_shared"):
+        with _store_lock:
+            if not hasattr(config, "_api_shared"):
+                shared = None
+                info = getattr(config, "workerinput", {}).get(WORKERINPUT_KEY)
+                if info is not None:
+                    manager = StoreManager(address=(info["host"], info["port"]),
+                                           authkey=bytes.fromhex(info["authkey"]))
+                    manager.connect()
+                    shared = SharedVariables(manager.store())
+                config._api_shared = shared
+    return config._api_shared
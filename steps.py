@@ -0,0 +1,229 @@
+'''
+案例步骤的编译和校验
+收集案例时把每个步骤编译成Step对象，变量替换模板、状态码集合和返回值规则在收集时准备好，
+格式错误在收集阶段一次性报告，不会在执行了前置之后才发现
+'''
+from .template import Template
+from .jsonpath import compile_return
+from .runner import poll_options, parse_status_codes
+from .scoped import SCOPES, default_key
+
+# Runner内置处理的动作
+BUILTIN_ACTIONS = ("sleep", "parallel", "poll", "wait_until")
+# 步骤中不是动作的字段
+STEP_FIELDS = ("name", "skip")
+
+
+class CaseError(Exception):
+    '''
+    案例格式错误，收集时抛出
+    '''
+    pass
+
+
+class Step:
+    '''
+    编译后的步骤，raw为yml中原始的步骤
+    returns为步骤中(包括parallel和poll中)不带变量的返回值规则编译后的ReturnPlan，
+    由步骤持有，执行时compile_return直接取到，不会因为案例多被缓存淘汰
+    '''
+    __slots__ = ("name", "skip", "raw", "template", "actions", "returns")
+
+    def __init__(self, raw, returns=()):
+        self.raw = raw
+        self.name = raw["name"]
+        self.skip = bool(raw.get("skip"))
+        self.template = Template(raw)
+        self.actions = tuple(k for k in raw if k not in STEP_FIELDS)
+        self.returns = tuple(returns)
+
+    def __getitem__(self, key):
+        return self.raw[key]
+
+    def __repr__(self):
+        return f"Step({self.name!r})"
+
+
+def _is_template(value):
+    return isinstance(value, str) and "${" in value
+
+
+class StepCompiler:
+    '''
+    @param actions  set|None  所有可用的动作名称，为None时不校验未知的动作
+    '''
+
+    def __init__(self, actions=None):
+        self.actions = actions
+        self.errors = []
+        # 当前步骤中编译好的返回值规则
+        self.returns = []
+
+    def compile(self, steps, where):
+        '''
+        编译一组步骤，错误记录到errors中，返回编译成功的Step
+        '''
+        if steps is None:
+            return []
+        if not isinstance(steps, list):
+            self.errors.append(f"{where}必须是数组")
+            return []
+        compiled = []
+        for index, raw in enumerate(steps):
+            before = len(self.errors)
+            self.returns = []
+            self._check_step(raw, f"{where}{index}")
+            if len(self.errors) == before:
+                compiled.append(Step(raw, self.returns))
+        return compiled
+
+    def _check_step(self, raw, where, named=True):
+        if not isinstance(raw, dict):
+            self.errors.append(f"{where}: 步骤必须是字典结构")
+            return
+        if "name" in raw:
+            where = f"{where}({raw['name']})"
+        elif named:
+            self.errors.append(f"{where}: 步骤中必须要有name字段")
+        for key, value in raw.items():
+            if key in STEP_FIELDS:
+                continue
+            check = self._checks.get(key)
+            if check is not None:
+                check(self, value, f"{where}.{key}")
+            elif self.actions is not None and key not in self.actions:
+                self.errors.append(f"{where}: 未知的动作{key}")
+
+    def _check_sleep(self, value, where):
+        if _is_template(value):
+            return
+        try:
+            float(value)
+        except (TypeError, ValueError):
+            self.errors.append(f"{where}: sleep必须是数字，当前为: {value}")
+
+    def _check_parallel(self, value, where):
+        if not isinstance(value, list):
+            self.errors.append(f"{where}: parallel必须是步骤数组")
+            return
+        for index, sub in enumerate(value):
+            self._check_step(sub, f"{where}{index}")
+
+    def _check_poll(self, value, where):
+        try:
+            inner = poll_options(value)[-1]
+        except (AssertionError, TypeError, ValueError) as e:
+            self.errors.append(f"{where}: {e}")
+            return
+        self._check_step(inner, where, named=False)
+
+    def _check_request_response(self, value, where):
+        if not isinstance(value, dict):
+            self.errors.append(f"{where}: 必须是字典结构")
+            return None
+        if "request" not in value or not isinstance(value["request"], dict):
+            self.errors.append(f"{where}: 步骤中必须要有request字段")
+            return None
+        response = value.get("response")
+        if response is not None and not isinstance(response, dict):
+            self.errors.append(f"{where}.response: 必须是字典结构")
+        elif response and "status_code" in response and not _is_template(response["status_code"]):
+            try:
+                parse_status_codes(response["status_code"])
+            except ValueError as e:
+                self.errors.append(f"{where}.response: {e}")
+        return_rule = value.get("return")
+        # 字符串时整个返回内容保存到这个变量中，字典时按规则提取
+        if return_rule is not None and not isinstance(return_rule, str):
+            if not isinstance(return_rule, dict):
+                self.errors.append(f"{where}.return: 必须是字典结构或者变量名")
+            else:
+                rules = {k: v for k, v in return_rule.items() if not _is_template(v)}
+                try:
+                    plan = compile_return(rules)
+                except AssertionError as e:
+                    self.errors.append(f"{where}.return: {e}")
+                else:
+                    # 带变量的规则执行时才能确定，只保存完整的规则
+                    if len(rules) == len(return_rule):
+                        self.returns.append(plan)
+        return value["request"]
+
+    def _check_api(self, value, where):
+        request = self._check_request_response(value, where)
+        if request is None:
+            return
+        for key in ("url", "method"):
+            if key not in request:
+                self.errors.append(f"{where}.request: 缺少{key}字段")
+
+    def _check_exec(self, value, where):
+        request = self._check_request_response(value, where)
+        if request is not None and "args" not in request:
+            self.errors.append(f"{where}.request: args为命令扩展动作的必选传参")
+
+    # 动作名称对应的校验方法
+    _checks = {
+        "sleep": _check_sleep,
+        "parallel": _check_parallel,
+        "poll": _check_poll,
+        "wait_until": _check_poll,
+        "api": _check_api,
+        "exec": _check_exec,
+    }
+
+
+def known_actions(config, handlers):
+    '''
+    所有可用的动作：内置动作、注册的执行器和插件通过pytest_api_action_names声明的动作
+    实现了pytest_api_add_action但是没有声明动作名称的插件存在时，返回None不校验未知的动作
+    '''
+    declared = set()
+    for names in config.hook.pytest_api_action_names(config=config):
+        declared.update(names or ())
+    if not declared and config.pluginmanager.hook.pytest_api_add_action.get_hookimpls():
+        return None
+    return set(BUILTIN_ACTIONS) | set(handlers) | declared
+
+
+def compile_case(case, actions, path):
+    '''
+    编译案例的前置、步骤和后置，有错误时一次性抛出所有错误
+    @return (setups, steps, teardowns, 共享前置)，没有共享前置时为None
+    '''
+    compiler = StepCompiler(actions)
+    if not isinstance(case, dict):
+        raise CaseError(f"{path}: 案例必须是字典结构")
+    if "name" not in case:
+        compiler.errors.append("案例中必须要有name字段")
+    if "steps" not in case:
+        compiler.errors.append("案例中必须要有steps字段")
+    setup = case.get("setup")
+    scoped = None
+    if isinstance(setup, dict):
+        scoped = _compile_scoped(compiler, setup)
+        setups = []
+    else:
+        setups = compiler.compile(setup, "前置")
+    steps = compiler.compile(case.get("steps"), "步骤")
+    teardowns = compiler.compile(case.get("teardown"), "后置")
+    if compiler.errors:
+        raise CaseError("\n".join([f"{path}: 案例格式错误"] + [f"  {e}" for e in compiler.errors]))
+    return setups, steps, teardowns, scoped
+
+
+def _compile_scoped(compiler, setup):
+    '''
+    编译按作用域共享的前置，格式见scoped.py
+    '''
+    scope = setup.get("scope", "session")
+    if scope not in SCOPES:
+        compiler.errors.append(f"前置的scope只支持{'/'.join(SCOPES)}，当前为: {scope}")
+    if "steps" not in setup:
+        compiler.errors.append("共享前置中必须要有steps字段")
+    return {
+        "scope": scope,
+        "key": str(setup["key"]) if "key" in setup else default_key(setup),
+        "steps": compiler.compile(setup.get("steps"), "前置"),
+        "teardown": compiler.compile(setup.get("teardown"), "前置的后置"),
+    }
@@ -0,0 +1,185 @@
+'''
+按标签选择案例
+--include/--exclude支持标签表达式：and、or、not和括号，逗号和or相同，例如
+    --include "smoke,regression"            包含smoke或者regression标签
+    --include "smoke and not slow"          包含smoke并且不包含slow标签
+    --exclude "slow,(db and nightly)"       排除包含slow标签或者同时包含db和nightly标签的案例
+标签索引记录每个案例文件的标签，保存在pytest的缓存中，文件修改时间和大小不变时直接使用，
+不匹配的文件在收集时直接跳过，不再解析yml
+'''
+import os
+import re
+import threading
+
+from .cache import load_case
+
+_TOKEN_RE = re.compile(r"\s*(\(|\)|,|[^\s(),]+)")
+_KEYWORDS = ("and", "or", "not")
+# pytest缓存中标签索引的key
+INDEX_KEY = "pytest_api/tag_index"
+
+
+def _tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        m = _TOKEN_RE.match(text, pos)
+        if m is None:
+            break
+        tokens.append(m.group(1))
+        pos = m.end()
+    return tokens
+
+
+class _Parser:
+    '''
+    expr := term (("or" | ",") term)*
+    term := factor ("and" factor)*
+    factor := "not" factor | "(" expr ")" | 标签
+    '''
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _next(self):
+        token = self._peek()
+        if token is None:
+            raise ValueError(f"标签表达式不完整: {self.text}")
+        self.pos += 1
+        return token
+
+    def parse(self):
+        func = self._expr()
+        if self._peek() is not None:
+            raise ValueError(f"标签表达式格式错误: {self.text}，多余的内容: {self._peek()}")
+        return func
+
+    def _expr(self):
+        funcs = [self._term()]
+        while self._peek() in ("or", ","):
+            self._next()
+            funcs.append(self._term())
+        if len(funcs) == 1:
+            return funcs[0]
+        return lambda tags: any(f(tags) for f in funcs)
+
+    def _term(self):
+        funcs = [self._factor()]
+        while self._peek() == "and":
+            self._next()
+            funcs.append(self._factor())
+        if len(funcs) == 1:
+            return funcs[0]
+        return lambda tags: all(f(tags) for f in funcs)
+
+    def _factor(self):
+        token = self._next()
+        if token == "not":
+            func = self._factor()
+            return lambda tags: not func(tags)
+        if token == "(":
+            func = self._expr()
+            if self._next() != ")":
+                raise ValueError(f"标签表达式中的括号没有结束: {self.text}")
+            return func
+        if token in _KEYWORDS or token in (")", ","):
+            raise ValueError(f"标签表达式格式错误: {self.text}，位置: {token}")
+        return lambda tags: token in tags
+
+
+def parse_tag_expr(text):
+    '''
+    把标签表达式编译成函数，参数为案例的标签集合，返回是否匹配
+    '''
+    return _Parser(text).parse()
+
+
+def normalize_tags(tags):
+    if tags is None:
+        return frozenset()
+    if isinstance(tags, (list, tuple, set, frozenset)):
+        return frozenset(str(tag) for tag in tags)
+    return frozenset((str(tags),))
+
+
+class TagSelector:
+    '''
+    @param include  str  要包括的标签表达式，为空时包括所有案例
+    @param exclude  str  要排除的标签表达式，为空时不排除
+    '''
+
+    def __init__(self, include="", exclude=""):
+        self.include = parse_tag_expr(include) if include.strip() else None
+        self.exclude = parse_tag_expr(exclude) if exclude.strip() else None
+
+    @property
+    def active(self):
+        return self.include is not None or self.exclude is not None
+
+    def is_exclude(self, tags):
+        return self.exclude is not None and self.exclude(normalize_tags(tags))
+
+    def is_include(self, tags):
+        return self.include is None or self.include(normalize_tags(tags))
+
+    def match(self, tags):
+        return not self.is_exclude(tags) and self.is_include(tags)
+
+
+class TagIndex:
+    '''
+    {案例文件路径: [修改时间, 大小, 标签]}
+    标签需要直接写在案例文件中，!import导入的文件修改不会刷新索引
+    '''
+
+    def __init__(self, config):
+        self.config = config
+        self.cache = getattr(config, "cache", None)
+        self.entries = self.cache.get(INDEX_KEY, {}) if self.cache is not None else {}
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def tags(self, path):
+        '''
+        返回文件中案例的标签，文件无法解析时返回None
+        '''
+        path = str(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        entry = self.entries.get(path)
+        if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            return frozenset(entry[2])
+        try:
+            case = load_case(self.config, path)
+        except Exception:
+            # 解析错误在收集案例时报告
+            return None
+        tags = normalize_tags(case.get("tags") if isinstance(case, dict) else None)
+        with self.lock:
+            self.entries[path] = [st.st_mtime_ns, st.st_size, sorted(tags)]
+            self.dirty = True
+        return tags
+
+    def save(self):
+        if self.dirty and self.cache is not None:
+            # 删除已经不存在的文件
+            entries = {path: entry for path, entry in self.entries.items() if os.path.exists(path)}
+            self.cache.set(INDEX_KEY, entries)
+            self.dirty = False
+
+
+def get_tag_index(config):
+    '''
+    指定了--include或--exclude时返回标签索引，否则返回None
+    '''
+    if not hasattr(config, "_api_tag_index"):
+        config._api_tag_index = TagIndex(config) if config._api_tags.active else None
+    return config._api_tag_index
@@ -0,0 +1,120 @@
+import json
+import re
+
+# 变量引用的写法是${name}
+_VAR_RE = re.compile(r"\$\{([^}]+)\}")
+
+# 变量未定义时保持原样
+_missing = object()
+
+
+def _json_key(key):
+    """
+    和json序列化一致，非字符串的key转成字符串
+    """
+    return key if isinstance(key, str) else json.dumps(key)
+
+
+def _compile_str(text, names):
+    """
+    把字符串解析成片段，支持以下写法，和原来的正则替换结果保持一致：
+    "${name}"          整个值就是变量，替换成变量原始类型的值
+    "a/\\"${name}\\"/b"  带引号的变量，连同引号一起替换成变量的值，非字符串变量使用json格式
+    "a/${name}/b"      不带引号的变量，只替换字符串类型的变量
+    """
+    matches = list(_VAR_RE.finditer(text))
+    if not matches:
+        return None
+    if len(matches) == 1 and matches[0].group(0) == text:
+        name = matches[0].group(1)
+        names.add(name)
+
+        def render_whole(variables):
+            value = variables.get(name, _missing)
+            return text if value is _missing else value
+
+        return render_whole
+
+    # 片段是字符串或者(变量名, 是否带引号, 原始文本)
+    parts = []
+    pos = 0
+    for m in matches:
+        start, end = m.span()
+        quoted = start > 0 and text[start - 1] == '"' and text[end:end + 1] == '"'
+        if quoted:
+            start, end = start - 1, end + 1
+        if start > pos:
+            parts.append(text[pos:start])
+        name = m.group(1)
+        names.add(name)
+        parts.append((name, quoted, text[start:end]))
+        pos = end
+    if pos < len(text):
+        parts.append(text[pos:])
+
+    def render_parts(variables):
+        out = []
+        for part in parts:
+            if isinstance(part, str):
+                out.append(part)
+                continue
+            name, quoted, raw = part
+            value = variables.get(name, _missing)
+            if value is _missing:
+                out.append(raw)
+            elif isinstance(value, str):
+                out.append(value)
+            elif quoted:
+                out.append(json.dumps(value))
+            else:
+                # 不带引号时非字符串的变量不做替换
+                out.append(raw)
+        return "".join(out)
+
+    return render_parts
+
+
+def _compile(obj, names):
+    if isinstance(obj, dict):
+        items = []
+        for key, value in obj.items():
+            key = _json_key(key)
+            key_render = _compile_str(key, names)
+            items.append((key, key_render, _compile(value, names)))
+
+        def render_dict(variables):
+            res = {}
+            for key, key_render, value_render in items:
+                if key_render is not None:
+                    key = _json_key(key_render(variables))
+                res[key] = value_render(variables)
+            return res
+
+        return render_dict
+    if isinstance(obj, (list, tuple)):
+        renders = [_compile(value, names) for value in obj]
+
+        def render_list(variables):
+            return [render(variables) for render in renders]
+
+        return render_list
+    if isinstance(obj, str):
+        render = _compile_str(obj, names)
+        if render is not None:
+            return render
+    return lambda variables: obj
+
+
+class Template:
+    """
+    步骤的变量替换模板
+    收集案例时把步骤中的${name}解析一次，执行时只替换引用到的变量
+    直接生成新的python结构，不再经过json的序列化和反序列化
+    """
+
+    def __init__(self, obj):
+        self.names = set()
+        self._render = _compile(obj, self.names)
+
+    def render(self, variables):
+        return self._render(variables)
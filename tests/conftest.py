@@ -0,0 +1,150 @@
+import json
+import threading
+import time
+from collections import ChainMap
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from pytest_api.env import defaults_envs
+
+pytest_plugins = ["pytester"]
+
+# plugin.py使用顶层导入，把包中的模块按顶层名称注册后再加载插件
+PLUGIN_CONFTEST = '''
+import importlib
+import os
+import sys
+
+import pytest_api
+
+for name in sorted(os.listdir(list(pytest_api.__path__)[0])):
+    if name.endswith(".py") and name[:-3] not in ("plugin", "setup"):
+        sys.modules[name[:-3]] = importlib.import_module("pytest_api." + name[:-3])
+
+pytest_plugins = ["pytest_api.plugin"]
+'''
+
+
+def _payload(size):
+    return (bytes(range(256)) * (size // 256 + 1))[:size]
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    '''
+    GET   返回请求带的Cookie，查询参数中有set_cookie时设置cookie，有size时返回size字节的data字段
+    GET   /bytes?size=N&short=K  返回N字节的二进制内容，short时少发送K字节后关闭连接
+    POST  返回请求体的长度、Content-Type和内容
+    查询参数中有delay时先等待delay毫秒
+    '''
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body, content_type="application/json", length=None):
+        self.send_response(200)
+        for cookie in parse_qs(urlparse(self.path).query).get("set_cookie", []):
+            self.send_header("Set-Cookie", f"{cookie}; Path=/")
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body) if length is None else length))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        time.sleep(int(query.get("delay", ["0"])[0]) / 1000)
+        size = int(query.get("size", ["0"])[0])
+        if url.path == "/bytes":
+            short = int(query.get("short", ["0"])[0])
+            self.close_connection = bool(short)
+            self._reply(_payload(size)[:size - short], "application/octet-stream", size)
+            return
+        self._reply(json.dumps({"path": self.path, "cookie": self.headers.get("Cookie"),
+                                "data": "x" * size}).encode("utf-8"))
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self._reply(json.dumps({"path": self.path, "length": len(body),
+                                "content_type": self.headers.get("Content-Type"),
+                                "body": body.decode("utf-8", "replace")}).encode("utf-8"))
+
+
+@pytest.fixture
+def payload():
+    '''
+    http_server的/bytes返回的内容，payload(size)
+    '''
+    return _payload
+
+
+@pytest.fixture(scope="session")
+def http_server():
+    '''
+    本地http服务，返回"http://host:port"
+    '''
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), EchoHandler)
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    host, port = httpd.server_address[:2]
+    yield f"http://{host}:{port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class FakeConfig:
+    '''
+    使用已经解析好的env.yml配置，代替pytest的config
+    '''
+
+    def __init__(self, options=None, **envs):
+        self._api_envs = (None, ChainMap(envs, defaults_envs))
+        self.options = options or {}
+
+    def getoption(self, name, default=None):
+        return self.options.get(name, default)
+
+
+@pytest.fixture
+def make_config():
+    '''
+    创建FakeConfig，结束时关闭创建的连接池和事件循环
+    '''
+    from pytest_api.aio import close_async_engine
+    from pytest_api.pool import close_session_pool
+
+    configs = []
+
+    def make(**envs):
+        config = FakeConfig(**envs)
+        configs.append(config)
+        return config
+
+    yield make
+    for config in configs:
+        close_session_pool(config)
+        close_async_engine(config)
+
+
+@pytest.fixture
+def server_config(make_config, http_server):
+    '''
+    指向http_server的配置，transport等其他配置通过参数传入
+    '''
+    url = urlparse(http_server)
+
+    def make(**envs):
+        return make_config(proto="http", host=url.hostname, port=url.port, **envs)
+    return make
+
+
+@pytest.fixture
+def project(pytester):
+    '''
+    加载了插件的pytest项目，使用runpytest_subprocess执行
+    '''
+    pytester.makeconftest(PLUGIN_CONFTEST)
+    return pytester
@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+from pytest_api.aio import AsyncApiRunner, AsyncEngine, AsyncResponse
+from pytest_api.runner import Runner
+
+
+@pytest.fixture
+def async_runner(server_config):
+    runner = Runner()
+    runner.register_handler("api", AsyncApiRunner)
+    return runner, server_config(transport="async")
+
+
+def get(url, name="get", **response):
+    step = {"name": name, "api": {"request": {"url": url, "method": "GET"}, "return": {name: "path"}}}
+    if response:
+        step["api"]["response"] = response
+    return step
+
+
+def test_single_step(async_runner):
+    runner, config = async_runner
+    values = runner.run(get("/a?x=中文", status_code=200, json={"cookie": None}), config)
+    assert values == {"get": "/a?x=%E4%B8%AD%E6%96%87"}
+    with pytest.raises(AssertionError, match="状态码不一致"):
+        runner.run(get("/a", status_code=201), config)
+
+
+def test_parallel_steps_run_concurrently(async_runner):
+    runner, config = async_runner
+    steps = [get(f"/slow/{i}?delay=300", name=f"s{i}") for i in range(5)]
+    start = time.monotonic()
+    values = runner.run({"name": "p", "parallel": steps}, config)
+    assert time.monotonic() - start < 1.2
+    assert values == {f"s{i}": f"/slow/{i}?delay=300" for i in range(5)}
+
+
+def test_parallel_step_failure_names_the_step(async_runner):
+    runner, config = async_runner
+    steps = [get("/a", name="ok", status_code=200), get("/b", name="bad", status_code=404)]
+    with pytest.raises(AssertionError, match="并发步骤bad"):
+        runner.run({"name": "p", "parallel": steps}, config)
+
+
+def test_parallel_mixes_sleep_and_other_actions(async_runner):
+    runner, config = async_runner
+    steps = [get("/a", name="a"), {"name": "wait", "sleep": 0.2}, {"name": "skip", "skip": True, "sleep": 10}]
+    start = time.monotonic()
+    assert runner.run({"name": "p", "parallel": steps}, config) == {"a": "/a"}
+    assert time.monotonic() - start < 1
+
+
+def test_cookies_are_not_kept(async_runner):
+    runner, config = async_runner
+    runner.run(get("/login?set_cookie=sid=1"), config)
+    runner.run(get("/next", json={"cookie": None}), config)
+
+
+def test_engine_headers_and_cookies(http_server):
+    from requests import Request
+
+    engine = AsyncEngine()
+    try:
+        prepped = Request("GET", f"{http_server}/a?set_cookie=sid=1").prepare()
+        res = engine.run(engine.send(("http",), prepped, 5))
+        assert isinstance(res, AsyncResponse)
+        assert res.status_code == 200
+        assert res.headers["content-type"] == "application/json"
+        assert res.cookies.get("sid") == "1"
+        assert res.json()["path"] == "/a?set_cookie=sid=1"
+        assert b"".join(res.iter_content(3)) == res.content
+    finally:
+        engine.close()
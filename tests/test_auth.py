@@ -0,0 +1,133 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from pytest_api.auth import AuthProvider
+from pytest_api.pool import SessionPool
+from pytest_api.replay import ReplayStore
+
+
+class LoginHandler(BaseHTTPRequestHandler):
+    '''
+    POST /login返回新的token，GET /data只接受有效的token，否则返回401
+    '''
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        state = self.server.state
+        state["logins"] += 1
+        token = f"t{state['logins']}"
+        state["valid"].add(token)
+        self._reply(200, {"data": {"token": token}})
+
+    def do_GET(self):
+        token = self.headers.get("Authorization", "").replace("Bearer ", "")
+        if token not in self.server.state["valid"]:
+            self._reply(401, {"error": "expired"})
+        else:
+            self._reply(200, {"token": token})
+
+
+@pytest.fixture
+def login_server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), LoginHandler)
+    httpd.daemon_threads = True
+    httpd.state = {"logins": 0, "valid": set()}
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+SPEC = {"type": "bearer", "url": "/login", "json": {"user": "a"}, "token": "data.token"}
+
+
+def provider_for(server, store=None):
+    host, port = server.server_address[:2]
+    pool = SessionPool(replay_store=store)
+    session = pool.get("http", host, port)
+    return pool, session, AuthProvider(SPEC, f"http://{host}:{port}", session)
+
+
+def test_login_once_and_retry_after_401(login_server):
+    pool, session, provider = provider_for(login_server)
+    url = provider.url.replace("/login", "/data")
+    assert session.get(url, auth=provider).json() == {"token": "t1"}
+    assert session.get(url, auth=provider).json() == {"token": "t1"}
+    login_server.state["valid"].clear()
+    response = session.get(url, auth=provider)
+    assert response.json() == {"token": "t2"}
+    assert [r.status_code for r in response.history] == [401]
+    assert provider.logins == 2
+    # 登录和重发都经过连接池
+    assert pool.stats.reused_connections >= 3
+    pool.close()
+
+
+def test_login_and_retry_are_replayed(tmp_path, login_server):
+    path = str(tmp_path / "replay.db")
+    store = ReplayStore(path, "record")
+    pool, session, provider = provider_for(login_server, store)
+    url = provider.url.replace("/login", "/data")
+    session.get(url, auth=provider)
+    login_server.state["valid"].clear()
+    assert session.get(url, auth=provider).json() == {"token": "t2"}
+    pool.close()
+    store.close()
+    logins = login_server.state["logins"]
+
+    store = ReplayStore(path, "replay")
+    pool, session, provider = provider_for(login_server, store)
+    assert session.get(url, auth=provider).json() == {"token": "t1"}
+    response = session.get(url, auth=provider)
+    assert response.json() == {"token": "t2"}
+    assert [r.status_code for r in response.history] == [401]
+    # 回放时没有发送请求
+    assert login_server.state["logins"] == logins
+    assert store.misses == 0
+    pool.close()
+    store.close()
+
+
+def test_async_transport_logs_in_off_the_loop_and_retries(login_server, make_config):
+    from pytest_api.aio import AsyncApiRunner
+    from pytest_api.auth import get_auth_provider
+    from pytest_api.runner import Runner
+
+    host, port = login_server.server_address[:2]
+    config = make_config(proto="http", host=host, port=port, transport="async", auth_provider=SPEC)
+    provider = get_auth_provider(config)
+    login = provider.login
+    threads = []
+
+    def recording_login():
+        threads.append(threading.current_thread().name)
+        login()
+
+    provider.login = recording_login
+    runner = Runner()
+    runner.register_handler("api", AsyncApiRunner)
+    step = {"name": "data", "api": {"request": {"url": "/data", "method": "GET"},
+                                    "response": {"status_code": 200}, "return": {"token": "token"}}}
+    assert runner.run(step, config) == {"token": "t1"}
+    login_server.state["valid"].clear()
+    parallel = {"name": "p", "parallel": [dict(step, name="a"), dict(step, name="b")]}
+    assert runner.run(parallel, config) == {"token": "t2"}
+    # 两个并发的请求都返回401，只重新登录一次
+    assert provider.logins == 2
+    assert "pytest-api-aio" not in threads
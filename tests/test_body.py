@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from pytest_api.body import ResponseBody, get_json_loads
+
+
+def _body(content, encoding=None, loads=json.loads):
+    calls = []
+
+    def text():
+        calls.append(1)
+        return content.decode(encoding or "utf-8")
+
+    return ResponseBody(content, text, loads, encoding), calls
+
+
+@pytest.mark.parametrize("encoding", [None, "utf-8", "UTF8", "gbk", "GB2312", "gb18030", "big5"])
+def test_json_honours_declared_encoding(encoding):
+    content = json.dumps({"msg": "成功"}, ensure_ascii=False).encode(encoding or "utf-8")
+    body, _ = _body(content, encoding)
+    assert body.json() == {"msg": "成功"}
+
+
+def test_json_is_parsed_once():
+    parsed = []
+
+    def loads(data):
+        parsed.append(data)
+        return json.loads(data)
+
+    body, calls = _body(b'{"a": 1}', loads=loads)
+    assert body.json() is body.json()
+    assert len(parsed) == 1
+    # utf-8内容直接解析bytes，不需要转成文本
+    assert calls == []
+
+
+def test_json_error_is_raised_every_time():
+    body, _ = _body(b"not json")
+    with pytest.raises(ValueError) as first:
+        body.json()
+    with pytest.raises(ValueError) as second:
+        body.json()
+    assert first.value is second.value
+
+
+def test_get_json_loads():
+    assert get_json_loads("json") is json.loads
+    assert get_json_loads("orjson")(b'{"a": 1}') == {"a": 1}
@@ -0,0 +1,142 @@
+import os
+
+import pytest
+
+from pytest_api import cache as cache_module
+from pytest_api.cache import CaseCache, get_case_cache, load_case
+from pytest_api.common import import_cache
+
+
+class FakeCacheProvider:
+    '''
+    代替pytest的config.cache
+    '''
+
+    def __init__(self, root):
+        self.root = root
+
+    def mkdir(self, name):
+        path = self.root / name
+        path.mkdir(exist_ok=True)
+        return path
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    '''
+    记录实际解析yml的次数
+    '''
+    calls = []
+    read = cache_module.read_yaml_with_imports
+
+    def counting(path):
+        calls.append(path)
+        return read(path)
+    monkeypatch.setattr(cache_module, "read_yaml_with_imports", counting)
+    import_cache.clear()
+    yield calls
+    import_cache.clear()
+
+
+@pytest.fixture
+def config(make_config, tmp_path):
+    config = make_config()
+    config.cache = FakeCacheProvider(tmp_path)
+    return config
+
+
+@pytest.fixture
+def case(tmp_path):
+    path = tmp_path / "case.yml"
+    path.write_text("name: a\nsteps: []\n", encoding="utf-8")
+    return path
+
+
+def rewrite(path, content, keep_mtime=False):
+    st = os.stat(path)
+    path.write_text(content, encoding="utf-8")
+    if keep_mtime:
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    else:
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_second_load_uses_cache(make_config, config, case, parses):
+    assert load_case(config, case) == {"name": "a", "steps": []}
+    # 新的会话使用同一个缓存目录
+    config = make_config()
+    config.cache = FakeCacheProvider(case.parent)
+    assert load_case(config, case) == {"name": "a", "steps": []}
+    assert parses == [case]
+
+
+@pytest.mark.parametrize("content, keep_mtime", [
+    ("name: b\nsteps: []\n", False),     # 修改时间变化
+    ("name: bb\nsteps: []\n", True),     # 修改时间不变，大小变化
+])
+def test_changed_case_is_parsed_again(config, case, parses, content, keep_mtime):
+    load_case(config, case)
+    rewrite(case, content, keep_mtime)
+    assert load_case(config, case)["name"] == content[6:-11]
+    assert len(parses) == 2
+
+
+def test_changed_import_is_parsed_again(config, tmp_path, parses):
+    shared = tmp_path / "shared.yml"
+    shared.write_text("token: a\n", encoding="utf-8")
+    case = tmp_path / "case.yml"
+    case.write_text("headers: !import shared.yml\n", encoding="utf-8")
+    load_case(config, case)
+    assert load_case(config, case) == {"headers": {"token": "a"}}
+    rewrite(shared, "token: b\n")
+    import_cache.clear()
+    assert load_case(config, case) == {"headers": {"token": "b"}}
+    assert len(parses) == 2
+    # 导入的文件被删除时缓存也失效
+    shared.unlink()
+    import_cache.clear()
+    with pytest.raises(FileNotFoundError):
+        load_case(config, case)
+
+
+def test_no_cache_option(config, tmp_path, case, parses):
+    config.options["--api-no-cache"] = True
+    assert get_case_cache(config) is None
+    load_case(config, case)
+    load_case(config, case)
+    assert len(parses) == 2
+    assert not (tmp_path / "pytest_api_cases").exists()
+
+
+def test_without_cache_plugin(make_config, case, parses):
+    # -p no:cacheprovider时config没有cache
+    config = make_config()
+    assert get_case_cache(config) is None
+    assert load_case(config, case) == {"name": "a", "steps": []}
+
+
+@pytest.mark.parametrize("content", [b"", b"not a pickle", b"\x80\x05\x95garbage"])
+def test_corrupt_cache_falls_back_to_parsing(config, case, parses, content):
+    load_case(config, case)
+    cache = get_case_cache(config)
+    with open(cache._file(case), "wb") as f:
+        f.write(content)
+    assert cache.get(case) is None
+    assert load_case(config, case) == {"name": "a", "steps": []}
+    assert len(parses) == 2
+    # 重新解析后缓存被修复
+    assert cache.get(case) == {"name": "a", "steps": []}
+
+
+def test_stale_version_is_ignored(tmp_path, case, monkeypatch):
+    cache = CaseCache(str(tmp_path))
+    cache.set(case, {"name": "a"}, [])
+    assert cache.get(case) == {"name": "a"}
+    monkeypatch.setattr(cache_module, "CACHE_VERSION", cache_module.CACHE_VERSION + 1)
+    assert cache.get(case) is None
+
+
+def test_write_failure_is_ignored(tmp_path, case):
+    cache = CaseCache(str(tmp_path / "missing"))
+    cache.set(case, {"name": "a"}, [])
+    assert cache.get(case) is None
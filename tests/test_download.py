@@ -0,0 +1,142 @@
+import hashlib
+
+import pytest
+
+from pytest_api import request as request_module
+from pytest_api.aio import AsyncApiRunner
+from pytest_api.request import MultipartStream
+from pytest_api.runner import ApiRunner, Runner
+
+
+@pytest.fixture(params=["sync", "async"])
+def runner(request, server_config):
+    '''
+    按transport注册api执行器的Runner，返回(runner, config)
+    '''
+    r = Runner()
+    if request.param == "async":
+        r.register_handler("api", AsyncApiRunner)
+    else:
+        r.register_handler("api", ApiRunner)
+    return r, server_config(transport=request.param)
+
+
+def download(response, size=1000, short=0):
+    return {"name": "download", "api": {"request": {"url": f"/bytes?size={size}&short={short}", "method": "GET"},
+                                        "response": response}}
+
+
+def test_save_to_size_and_checksum(runner, tmp_path, monkeypatch, payload):
+    r, config = runner
+    monkeypatch.chdir(tmp_path)
+    sha256 = hashlib.sha256(payload(100000)).hexdigest()
+    md5 = hashlib.md5(payload(100000)).hexdigest()
+    r.run(download({"status_code": 200, "save_to": "out/d.bin", "size": 100000,
+                    "checksum": {"sha256": sha256, "md5": md5.upper()}}, 100000), config)
+    assert (tmp_path / "out" / "d.bin").read_bytes() == payload(100000)
+
+
+@pytest.mark.parametrize("response, message", [
+    ({"size": 999}, "下载内容大小校验失败"),
+    ({"checksum": {"sha1": "0" * 40}}, "sha1校验失败"),
+    ({"checksum": {"crc32": "0"}}, "checksum只支持"),
+    ({"size": 1000, "json": {}}, "不能和json、text一起使用"),
+])
+def test_download_failures(runner, tmp_path, monkeypatch, response, message):
+    r, config = runner
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(AssertionError, match=message):
+        r.run(download(response), config)
+
+
+def test_download_keys_are_checked_in_parallel_steps(runner, tmp_path, monkeypatch, payload):
+    r, config = runner
+    monkeypatch.chdir(tmp_path)
+    steps = [download({"save_to": "out/d1.bin", "size": 999}), download({"save_to": "out/d2.bin", "size": 1000})]
+    with pytest.raises(AssertionError, match="下载内容大小校验失败"):
+        r.run({"name": "p", "parallel": steps}, config)
+    assert (tmp_path / "out" / "d1.bin").stat().st_size == 1000
+    assert (tmp_path / "out" / "d2.bin").read_bytes() == payload(1000)
+
+
+def test_stream_with_return_is_rejected(runner):
+    r, config = runner
+    step = download({"stream": True})
+    step["api"]["return"] = "body"
+    with pytest.raises(AssertionError, match="stream模式下不支持return"):
+        r.run(step, config)
+
+
+def test_stream_json(runner):
+    r, config = runner
+    step = {"name": "s", "api": {"request": {"url": "/j?size=10", "method": "GET"},
+                                 "response": {"stream": True, "json": {"data": "x" * 10}}}}
+    r.run(step, config)
+    step["api"]["response"]["json"] = {"data": "y"}
+    with pytest.raises(AssertionError):
+        r.run(step, config)
+
+
+def test_short_body_fails_sync(server_config):
+    r = Runner()
+    r.register_handler("api", ApiRunner)
+    with pytest.raises(AssertionError, match="内容不完整"):
+        r.run(download({"size": 1000}, short=100), server_config())
+
+
+def test_download_checks_content_length():
+    runner = ApiRunner("127.0.0.1")
+    with pytest.raises(AssertionError, match="Content-Length为10"):
+        runner._download(iter([b"12345"]), {}, 10)
+    runner._download(iter([b"12345"]), {"size": 5}, None)
+
+
+def test_multipart_stream(tmp_path):
+    path = tmp_path / "名字.txt"
+    path.write_bytes(b"a" * 200000)
+    stream = MultipartStream({"file": path}, {"meta": {"k": "中文"}, "text": "v"}, chunk_size=65536)
+    content = b"".join(stream)
+    assert len(stream) == len(content)
+    assert stream.content_type == f"multipart/form-data; boundary={stream.boundary}"
+    assert 'name="meta"\r\n\r\n{"k": "中文"}\r\n'.encode("utf-8") in content
+    assert 'filename="名字.txt"'.encode("utf-8") in content
+    assert content.endswith(f"--{stream.boundary}--\r\n".encode("utf-8"))
+    # 可以重复发送
+    assert b"".join(stream) == content
+
+
+def test_multipart_stream_closes_file(tmp_path, monkeypatch):
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"a" * 200000)
+    opened = []
+
+    def tracking_open(*args, **kw):
+        f = open(*args, **kw)
+        opened.append(f)
+        return f
+
+    monkeypatch.setattr(request_module, "open", tracking_open, raising=False)
+    stream = MultipartStream({"file": path}, chunk_size=1024)
+    b"".join(stream)
+    assert opened[-1].closed
+    # 中途停止发送时也关闭文件
+    chunks = iter(stream)
+    next(chunks)
+    next(chunks)
+    assert not opened[-1].closed
+    chunks.close()
+    assert opened[-1].closed
+
+
+def test_multipart_upload(runner, tmp_path, monkeypatch):
+    r, config = runner
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "up.txt").write_text("hello", encoding="utf-8")
+    step = {"name": "u", "api": {"request": {"url": "/upload", "method": "POST", "files": {"file": "up.txt"},
+                                             "data": {"field": "v"}},
+                                 "return": {"length": "length", "body": "body", "type": "content_type"}}}
+    values = r.run(step, config)
+    assert values["type"].startswith("multipart/form-data; boundary=")
+    assert 'filename="up.txt"\r\n\r\nhello\r\n' in values["body"]
+    assert 'name="field"\r\n\r\nv\r\n' in values["body"]
+    assert values["length"] == len(values["body"].encode("utf-8"))
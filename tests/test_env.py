@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from pytest_api import env as env_module
+from pytest_api.env import get_envs
+
+
+@pytest.fixture
+def env_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "env.yml"
+    path.write_text("host: a.example.com\nport: 8080\n", encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    '''
+    记录实际读取env.yml的次数
+    '''
+    calls = []
+    read_yaml = env_module.read_yaml
+
+    def counting(path):
+        calls.append(path)
+        return read_yaml(path)
+    monkeypatch.setattr(env_module, "read_yaml", counting)
+    return calls
+
+
+@pytest.fixture
+def config(make_config):
+    def make(**options):
+        config = make_config()
+        # 不使用FakeConfig中已经解析好的配置
+        del config._api_envs
+        config.options.update(options)
+        return config
+    return make
+
+
+def modify(path, content):
+    st = os.stat(path)
+    path.write_text(content, encoding="utf-8")
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_env_is_loaded_once(config, env_file, reads):
+    config = config()
+    envs = get_envs(config)
+    assert (envs["host"], envs["port"], envs["proto"]) == ("a.example.com", 8080, "https")
+    modify(env_file, "host: b.example.com\n")
+    assert get_envs(config) is envs
+    assert envs["host"] == "a.example.com"
+    assert reads == [env_file]
+
+
+def test_env_reload(config, env_file, reads):
+    config = config(**{"--env-reload": True})
+    assert get_envs(config)["host"] == "a.example.com"
+    # 没有修改时不重新解析
+    get_envs(config)
+    assert len(reads) == 1
+    modify(env_file, "host: b.example.com\n")
+    envs = get_envs(config)
+    assert envs["host"] == "b.example.com"
+    assert "port" not in envs.maps[1]
+    assert len(reads) == 2
+
+
+def test_env_reload_when_file_removed(config, env_file, reads):
+    config = config(**{"--env-reload": True})
+    get_envs(config)
+    env_file.unlink()
+    assert get_envs(config)["proto"] == "https"
+    assert "host" not in get_envs(config)
+    assert len(reads) == 1
+
+
+def test_command_line_auth(config, env_file):
+    config = config(**{"--user": "admin", "--password": "secret"})
+    assert get_envs(config)["auth"] == ["admin", "secret"]
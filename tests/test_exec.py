@@ -0,0 +1,68 @@
+import sys
+import time
+
+import pytest
+
+from pytest_api.runner import ExecRunner
+
+
+def run(script, response=None, returns=None, **request):
+    step = {"request": dict(request, args=[sys.executable, "-c", script])}
+    if response is not None:
+        step["response"] = response
+    if returns is not None:
+        step["return"] = returns
+    return ExecRunner().run(step)
+
+
+def test_text_and_json_output():
+    assert run("print('hello 中文')", {"text": "中文"}, "out") == {"out": "hello 中文\n"}
+    assert run("print('{\"a\": {\"b\": 1}}')", {"json": {"a": {"b": 1}}}, {"b": "a.b"}) == {"b": 1}
+
+
+def test_large_output_is_read_in_chunks():
+    script = "import sys\nfor _ in range(80):\n    sys.stdout.write('x' * 65535 + '\\n')"
+    start = time.monotonic()
+    out = run(script, returns="out")["out"]
+    assert len(out) == 80 * 65536
+    assert time.monotonic() - start < 5
+
+
+def test_max_output_truncates():
+    assert run("print('x' * 100000)", returns="out", max_output=10) == {"out": "x" * 10}
+
+
+def test_multibyte_character_split_between_chunks():
+    # 中文字符跨越读取块的边界
+    script = "import sys\nsys.stdout.write('a' * 65535)\nsys.stdout.flush()\nprint('中文')"
+    assert run(script, returns="out")["out"] == "a" * 65535 + "中文\n"
+
+
+def test_stop_on_match_ends_command():
+    script = "import sys, time\nprint('ready', flush=True)\ntime.sleep(30)"
+    start = time.monotonic()
+    run(script, {"text": "ready"}, stop_on_match=True)
+    assert time.monotonic() - start < 10
+
+
+def test_stop_on_match_across_chunks():
+    script = ("import sys, time\nsys.stdout.write('rea')\nsys.stdout.flush()\ntime.sleep(0.2)\n"
+              "sys.stdout.write('dy')\nsys.stdout.flush()\ntime.sleep(30)")
+    start = time.monotonic()
+    run(script, {"text": "ready"}, stop_on_match=True)
+    assert time.monotonic() - start < 10
+
+
+def test_stop_on_match_rejects_return():
+    with pytest.raises(AssertionError, match="stop_on_match"):
+        run("print(1)", {"text": "1"}, "out", stop_on_match=True)
+
+
+def test_timeout():
+    with pytest.raises(AssertionError, match="命令执行超过"):
+        run("import time\ntime.sleep(30)", timeout=0.5)
+
+
+def test_failed_command_reports_stderr():
+    with pytest.raises(AssertionError, match="返回码: 3.*boom"):
+        run("import sys\nsys.stderr.write('boom')\nsys.exit(3)")
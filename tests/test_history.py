@@ -0,0 +1,93 @@
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+from pytest_api import history
+from pytest_api.history import RunHistory, order_by_duration
+from pytest_api.timing import StepTimer, TimingReport
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    # 每次保存的开始时间递增，保证执行顺序确定
+    counter = itertools.count(1)
+    monkeypatch.setattr(history, "time", SimpleNamespace(time=lambda: next(counter)))
+
+
+def timings(*steps):
+    report = TimingReport()
+    for case, step, seconds, ok in steps:
+        timer = StepTimer()
+        timer.phases["network"] = seconds
+        report.add(case, step, timer, ok)
+    return report
+
+
+def run(path, run_id, cases, steps=()):
+    h = RunHistory(path, run_id)
+    for nodeid, outcome, duration in cases:
+        h.add_case(nodeid, outcome, duration)
+    h.save(timings(*steps))
+    return h
+
+
+def test_case_duration_sums_report_phases(tmp_path):
+    path = str(tmp_path / "history.db")
+    h = RunHistory(path, "r1")
+    h.add_case("a", "passed", 0.1)
+    h.add_case("a", "passed", 2.0)
+    h.add_case("a", "failed", 0.2)
+    h.save(timings())
+    assert h.conn.execute("SELECT outcome, duration_ms FROM cases").fetchall() == [("failed", 2300.0)]
+    h.close()
+    assert RunHistory(path, "r2").durations() == {"a": 2300.0}
+
+
+def test_durations_average_recent_runs(tmp_path):
+    path = str(tmp_path / "history.db")
+    run(path, "r1", [("a", "passed", 1.0), ("b", "skipped", 9.0)]).close()
+    run(path, "r2", [("a", "failed", 3.0)]).close()
+    assert RunHistory(path, "r3").durations() == {"a": 2000.0}
+
+
+def test_regressions(tmp_path):
+    path = str(tmp_path / "history.db")
+    for i in range(3):
+        run(path, f"r{i}", [("a", "passed", 1)], [("a", "login", 0.1, True), ("a", "query", 0.1, True)]).close()
+    current = run(path, "now", [("a", "passed", 1)],
+                  [("a", "login", 0.5, True), ("a", "query", 0.105, True)])
+    assert current.regressions() == [("a", "login", 500.0, 100.0, 3)]
+
+
+def test_regressions_need_enough_history(tmp_path):
+    path = str(tmp_path / "history.db")
+    run(path, "r1", [("a", "passed", 1)], [("a", "login", 0.1, True)]).close()
+    assert run(path, "now", [("a", "passed", 1)], [("a", "login", 1.0, True)]).regressions() == []
+
+
+def test_flaky(tmp_path):
+    path = str(tmp_path / "history.db")
+    for run_id, outcome in [("r1", "passed"), ("r2", "failed"), ("r3", "passed")]:
+        run(path, run_id, [("a", outcome, 1), ("b", "passed", 1), ("c", "failed", 1)]).close()
+    current = run(path, "now", [("a", "failed", 1), ("b", "passed", 1), ("c", "failed", 1)])
+    assert current.flaky() == [("a", 2, 4, 3)]
+
+
+def test_old_runs_are_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "KEEP_RUNS", 2)
+    path = str(tmp_path / "history.db")
+    for i in range(4):
+        h = run(path, f"r{i}", [("a", "passed", 1)], [("a", "s", 0.1, True)])
+    assert [row[0] for row in h.conn.execute("SELECT run_id FROM runs ORDER BY started")] == ["r2", "r3"]
+    assert h.conn.execute("SELECT COUNT(*) FROM steps").fetchone() == (2,)
+
+
+def test_order_by_duration_keeps_files_together():
+    items = [SimpleNamespace(fspath=f, nodeid=f"{f}::{n}") for f, n in
+             [("a.yml", "1"), ("a.yml", "2"), ("b.yml", "1"), ("c.yml", "1")]]
+    durations = {"a.yml::1": 1, "a.yml::2": 1, "b.yml::1": 10}
+    ordered = [item.nodeid for item in order_by_duration(items, durations)]
+    # c.yml没有历史记录，按平均耗时4计算
+    assert ordered == ["b.yml::1", "c.yml::1", "a.yml::1", "a.yml::2"]
+    assert order_by_duration(items, {}) == items
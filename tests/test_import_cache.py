@@ -0,0 +1,84 @@
+import re
+
+import pytest
+import yaml
+
+from pytest_api.common import ImportCache, import_cache, read_yaml_with_imports
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    import_cache.clear()
+    yield
+    import_cache.clear()
+
+
+def write(path, content):
+    path.write_text(content, encoding="utf-8")
+    return path
+
+
+def test_import_is_parsed_once(tmp_path):
+    shared = write(tmp_path / "shared.yml", "headers:\n  token: abc\n")
+    write(tmp_path / "a.yml", "steps: !import shared.yml\n")
+    write(tmp_path / "b.yml", "first: !import shared.yml\nsecond: !import shared.yml\n")
+    data, imports = read_yaml_with_imports(tmp_path / "a.yml")
+    assert data == {"steps": {"headers": {"token": "abc"}}}
+    assert imports == [str(shared.resolve())]
+    read_yaml_with_imports(tmp_path / "b.yml")
+    assert (import_cache.misses, import_cache.hits) == (1, 2)
+    assert list(import_cache.fragments) == [shared.resolve()]
+
+
+def test_nested_imports_are_reported(tmp_path):
+    inner = write(tmp_path / "inner.yml", "value: 1\n")
+    outer = write(tmp_path / "outer.yml", "inner: !import inner.yml\n")
+    write(tmp_path / "case.yml", "outer: !import outer.yml\n")
+    for _ in range(2):
+        data, imports = read_yaml_with_imports(tmp_path / "case.yml")
+        assert data == {"outer": {"inner": {"value": 1}}}
+        # 命中缓存时也要返回嵌套导入的文件，CaseCache用来判断缓存是否失效
+        assert imports == [str(outer.resolve()), str(inner.resolve())]
+
+
+def test_cached_data_is_deep_copied(tmp_path):
+    write(tmp_path / "shared.yml", "headers:\n  token: abc\nlist: [1, 2]\n")
+    write(tmp_path / "case.yml", "a: !import shared.yml\nb: !import shared.yml\n")
+    data, _ = read_yaml_with_imports(tmp_path / "case.yml")
+    data["a"]["headers"]["token"] = "changed"
+    data["a"]["list"].append(3)
+    assert data["b"] == {"headers": {"token": "abc"}, "list": [1, 2]}
+    again, _ = read_yaml_with_imports(tmp_path / "case.yml")
+    assert again["a"] == {"headers": {"token": "abc"}, "list": [1, 2]}
+
+
+def test_circular_import(tmp_path):
+    write(tmp_path / "a.yml", "b: !import b.yml\n")
+    write(tmp_path / "b.yml", "a: !import a.yml\n")
+    write(tmp_path / "case.yml", "a: !import a.yml\n")
+    a, b = (tmp_path / "a.yml").resolve(), (tmp_path / "b.yml").resolve()
+    with pytest.raises(yaml.YAMLError, match=re.escape(f"!import循环导入: {a} -> {b} -> {a}")):
+        read_yaml_with_imports(tmp_path / "case.yml")
+    # 出错后导入栈被清空，不影响后面的导入
+    assert import_cache._stack() == []
+    assert not import_cache.fragments
+
+
+def test_self_import(tmp_path):
+    write(tmp_path / "a.yml", "a: !import a.yml\n")
+    write(tmp_path / "case.yml", "a: !import a.yml\n")
+    a = (tmp_path / "a.yml").resolve()
+    with pytest.raises(yaml.YAMLError, match=re.escape(f"{a} -> {a}")):
+        read_yaml_with_imports(tmp_path / "case.yml")
+
+
+def test_clear(tmp_path):
+    cache = ImportCache()
+    shared = write(tmp_path / "shared.yml", "value: 1\n")
+    cache.load(shared)
+    cache.load(shared)
+    write(tmp_path / "shared.yml", "value: 2\n")
+    assert cache.load(shared) == ({"value": 1}, [])
+    cache.clear()
+    assert (cache.hits, cache.misses, cache.fragments) == (0, 0, {})
+    assert cache.load(shared) == ({"value": 2}, [])
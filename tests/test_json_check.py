@@ -0,0 +1,116 @@
+import json
+
+import pytest
+
+from pytest_api.common import json_check
+from pytest_api.jsonstream import JsonStreamError, iter_events, stream_json_check
+
+
+def _bytes_chunks(obj, size):
+    content = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+    return [content[i:i + size] for i in range(0, len(content), size)]
+
+
+def _passes(func):
+    try:
+        func()
+    except AssertionError:
+        return False
+    return True
+
+
+CASES = [
+    ({"a": 1, "b": {"c": [1, 2]}}, {"b": {"c": [1, 2]}}, True),
+    ({"a": 1}, {"a": 2}, False),
+    ({"a": 1}, {"b": 1}, False),
+    ([1, 2, 3], [1, 2], False),
+    ([1, 2], [1, 2, 3], False),
+    ({"msg": "操作成功"}, {"msg": "操作成功"}, True),
+    ({"s": "a\"b\\c\n"}, {"s": "a\"b\\c\n"}, True),
+    ({"n": 1.5e3, "t": True, "f": False, "z": None}, {"n": 1500.0, "t": True, "f": False, "z": None}, True),
+    ({"err_code": 1, "x": 2}, {"err_code": 0, "y": 3}, True),
+    ({"items": [{"id": 1, "skip": [1, {"deep": 2}]}]}, {"items": [{"id": 1}]}, True),
+]
+
+
+@pytest.mark.parametrize("ori, expt, ok", CASES)
+def test_json_check(ori, expt, ok):
+    assert _passes(lambda: json_check(ori, expt)) is ok
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 65536])
+@pytest.mark.parametrize("ori, expt, ok", CASES)
+def test_stream_json_check_agrees_with_json_check(ori, expt, ok, size):
+    chunks = _bytes_chunks(ori, size)
+    assert _passes(lambda: stream_json_check(iter_events(chunks), expt)) is ok
+
+
+def test_container_compare():
+    json_check({"msg": "hello world"}, {"msg": "world"}, True)
+    with pytest.raises(AssertionError):
+        json_check({"msg": "hello world"}, {"msg": "world"})
+    stream_json_check(iter_events(_bytes_chunks({"msg": "hello world"}, 4)), {"msg": "world"}, True)
+
+
+def test_deep_nesting_does_not_recurse():
+    depth = 20000
+    ori = expt = 1
+    for _ in range(depth):
+        ori = {"a": ori}
+        expt = {"a": expt}
+    json_check(ori, expt)
+    content = ('{"a":' * depth + "1" + "}" * depth).encode("utf-8")
+    stream_json_check(iter_events([content[i:i + 4096] for i in range(0, len(content), 4096)]), expt)
+
+
+def test_iter_events_splits_multibyte_characters():
+    content = json.dumps({"名称": "中文"}, ensure_ascii=False).encode("utf-8")
+    events = list(iter_events([content[i:i + 1] for i in range(len(content))]))
+    assert events == [("start_map", None), ("key", "名称"), ("value", "中文"), ("end_map", None)]
+
+
+def test_iter_events_accepts_str_chunks():
+    assert list(iter_events(['[1, tr', 'ue, nu', 'll, "x"]'])) == [
+        ("start_array", None), ("value", 1), ("value", True), ("value", None), ("value", "x"), ("end_array", None)]
+
+
+def test_iter_events_decodes_declared_encoding():
+    content = json.dumps({"msg": "成功"}, ensure_ascii=False).encode("gbk")
+    stream_json_check(iter_events([content], "gbk"), {"msg": "成功"})
+
+
+@pytest.mark.parametrize("content", [b'{"a": "unterminated', b'{"a": @}', b'[1, 2, nope]'])
+def test_iter_events_rejects_invalid_json(content):
+    with pytest.raises(JsonStreamError):
+        list(iter_events([content]))
+
+
+@pytest.mark.parametrize("content, expt", [
+    (b"", {"a": 1}),
+    (b" \r\n\t", {"a": 1}),
+    (b'{"a": 1', {"a": 1, "b": 2}),
+    (b'{"a": 1, "b"', {"a": 1, "b": 2}),
+    (b'{"a": 1, "b": ', {"a": 1}),
+    (b'[1,2', [1, 2, 3]),
+    (b'[1,2', [1, 2]),
+    (b'{"a": [1', {"a": {"$mode": "subset", "$items": [1]}}),
+    (b'{"a": {"b": 1}', {"a": {"b": 1}}),
+])
+@pytest.mark.parametrize("size", [1, 65536])
+def test_stream_json_check_rejects_empty_and_truncated(content, expt, size):
+    chunks = [content[i:i + size] for i in range(0, len(content), size)]
+    with pytest.raises(AssertionError):
+        stream_json_check(iter_events(chunks), expt)
+
+
+def test_stream_json_check_requires_complete_events():
+    with pytest.raises(AssertionError, match="返回内容为空"):
+        stream_json_check(iter([]), {"a": 1})
+    with pytest.raises(AssertionError, match="不完整"):
+        stream_json_check(iter([("start_map", None), ("key", "a"), ("value", 1)]), {"a": 1})
+
+
+@pytest.mark.parametrize("content", [b"}", b"]", b'{"a": 1}}', b"[1]]", b"[1}", b'{"a": 1]'])
+def test_iter_events_rejects_unbalanced_input(content):
+    with pytest.raises(JsonStreamError):
+        list(iter_events([content]))
@@ -0,0 +1,77 @@
+import pytest
+
+from pytest_api.jsonpath import compile_return, compile_rule
+
+DATA = {
+    "code": 0,
+    "data": {
+        "total": 3,
+        "1": "one",
+        "items": [
+            {"id": 1, "name": "a", "price": 10, "meta": {"tag": "x"}},
+            {"id": 2, "name": "b", "price": 20, "meta": {"tag": "y"}},
+            {"id": 3, "name": "c", "price": 30},
+        ],
+    },
+}
+
+
+def extract(rule):
+    return compile_return({"value": rule}).extract(DATA)["value"]
+
+
+def test_compile_rule():
+    assert compile_rule("a.b[0].c") == (("key", "a"), ("key", "b"), ("index", 0), ("key", "c"))
+    assert compile_rule("a.1") == (("key", "a"), ("index", 1))
+    assert compile_rule("a['x.y']") == (("key", "a"), ("key", "x.y"))
+    assert compile_rule("a[*]") == (("key", "a"), ("wild",))
+    assert compile_rule("a[1:-1:2]") == (("key", "a"), ("slice", 1, -1, 2))
+    assert compile_rule("a[?b.c>=1]") == (("key", "a"), ("filter", ("b", "c"), ">=", 1))
+
+
+@pytest.mark.parametrize("rule, value", [
+    ("code", 0),
+    ("data.total", 3),
+    ("data.items.0.name", "a"),
+    ("data.items[1].name", "b"),
+    ("data.items[-1].id", 3),
+    ("data.1", "one"),
+    ("data.items[*].id", [1, 2, 3]),
+    ("data.items.*.name", ["a", "b", "c"]),
+    ("data.items[*].meta.tag", ["x", "y"]),
+    ("data.items[0:2].id", [1, 2]),
+    ("data.items[::-1].id", [3, 2, 1]),
+    ("data.items[?name=='b'].id", [2]),
+    ("data.items[?price>10].name", ["b", "c"]),
+    ("data.items[?price!=20].id", [1, 3]),
+    ("data.items[?meta.tag==\"y\"].id", [2]),
+    ("data.items[?missing==1].id", []),
+])
+def test_extract(rule, value):
+    assert extract(rule) == value
+
+
+@pytest.mark.parametrize("rule, message", [
+    ("data.nothing", "key:nothing 不存在"),
+    ("data.items[5].id", "超过数组长度"),
+    ("code[*]", "不是数组"),
+    ("data.items[?x~1]", "返回值规则格式错误"),
+    ("data.items[0", "返回值规则格式错误"),
+])
+def test_extract_errors(rule, message):
+    with pytest.raises(AssertionError, match=message):
+        extract(rule)
+
+
+def test_shared_prefix_rules():
+    values = compile_return({
+        "first": "data.items[0].id",
+        "names": "data.items[*].name",
+        "total": "data.total",
+        "all": "data.items",
+    }).extract(DATA)
+    assert values == {"first": 1, "names": ["a", "b", "c"], "total": 3, "all": DATA["data"]["items"]}
+
+
+def test_compile_return_is_cached():
+    assert compile_return({"a": "code"}) is compile_return({"a": "code"})
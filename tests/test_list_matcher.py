@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+from pytest_api.common import json_check, list_spec
+from pytest_api.jsonstream import iter_events, stream_json_check
+
+
+def _check(ori, expt, stream):
+    if stream:
+        content = json.dumps(ori).encode("utf-8")
+        stream_json_check(iter_events([content[i:i + 5] for i in range(0, len(content), 5)]), expt)
+    else:
+        json_check(ori, expt)
+
+
+@pytest.fixture(params=[False, True], ids=["json_check", "stream"])
+def check(request):
+    return lambda ori, expt: _check(ori, expt, request.param)
+
+
+def test_list_spec():
+    assert list_spec([1, 2]) is None
+    assert list_spec({"a": 1}) is None
+    assert list_spec({"$items": [1]}) == ("strict", None, [1])
+    assert list_spec({"$match_by": "id", "$items": []}) == ("subset", "id", [])
+    assert list_spec({"$mode": "unordered", "$items": []}) == ("unordered", None, [])
+
+
+@pytest.mark.parametrize("expt", [
+    {"$mode": "random", "$items": []},
+    {"$mode": "strict", "$match_by": "id", "$items": []},
+    {"$items": {"id": 1}},
+])
+def test_list_spec_errors(expt):
+    with pytest.raises(AssertionError):
+        list_spec(expt)
+
+
+def test_strict_mode(check):
+    check({"l": [1, 2]}, {"l": {"$items": [1, 2]}})
+    with pytest.raises(AssertionError):
+        check({"l": [2, 1]}, {"l": {"$items": [1, 2]}})
+
+
+def test_subset_mode(check):
+    check({"l": [3, 2, 1]}, {"l": {"$mode": "subset", "$items": [1, 2]}})
+    check({"l": [{"a": 1, "b": 2}, {"a": 3}]}, {"l": {"$mode": "subset", "$items": [{"a": 3}]}})
+    with pytest.raises(AssertionError):
+        check({"l": [3, 2]}, {"l": {"$mode": "subset", "$items": [1]}})
+
+
+def test_unordered_mode(check):
+    check({"l": [2, 1]}, {"l": {"$mode": "unordered", "$items": [1, 2]}})
+    with pytest.raises(AssertionError):
+        check({"l": [2, 1, 3]}, {"l": {"$mode": "unordered", "$items": [1, 2]}})
+
+
+def test_duplicate_expected_items_need_distinct_elements(check):
+    check({"l": [1, 1]}, {"l": {"$mode": "unordered", "$items": [1, 1]}})
+    with pytest.raises(AssertionError):
+        check({"l": [1, 2]}, {"l": {"$mode": "unordered", "$items": [1, 1]}})
+
+
+def test_general_item_does_not_steal_specific_match(check):
+    # 第一个返回的元素两个期望的元素都能匹配，贪心匹配时会占用第一个期望元素，导致第二个返回元素无法匹配
+    ori = {"l": [{"a": 1, "b": 2}, {"a": 1}]}
+    check(ori, {"l": {"$mode": "unordered", "$items": [{"a": 1}, {"a": 1, "b": 2}]}})
+    check(ori, {"l": {"$mode": "subset", "$items": [{"a": 1}, {"a": 1, "b": 2}]}})
+
+
+def test_augmenting_path_through_several_elements(check):
+    ori = {"l": [{"a": 1, "b": 1, "c": 1}, {"a": 1, "b": 1}, {"a": 1}]}
+    expt = {"l": {"$mode": "unordered", "$items": [{"a": 1}, {"b": 1}, {"c": 1}]}}
+    check(ori, expt)
+
+
+def test_match_by(check):
+    ori = {"l": [{"id": 2, "name": "b"}, {"id": 1, "name": "a"}, {"id": 3}]}
+    check(ori, {"l": {"$match_by": "id", "$items": [{"id": 1, "name": "a"}, {"id": 2}]}})
+    with pytest.raises(AssertionError, match="id为2的元素不一致"):
+        check(ori, {"l": {"$match_by": "id", "$items": [{"id": 2, "name": "x"}]}})
+    with pytest.raises(AssertionError, match="没有id为4的元素"):
+        check(ori, {"l": {"$match_by": "id", "$items": [{"id": 4}]}})
+    with pytest.raises(AssertionError):
+        check(ori, {"l": {"$match_by": "id", "$mode": "unordered", "$items": [{"id": 1}]}})
+
+
+def test_match_by_requires_key_in_expected_items(check):
+    with pytest.raises(AssertionError):
+        check({"l": [{"id": 1}]}, {"l": {"$match_by": "id", "$items": [{"name": "a"}]}})
@@ -0,0 +1,88 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from pytest_api.load import LoadTest, parse_duration, parse_load_spec, percentile
+
+
+class FakeItem:
+    '''
+    代替YamlItem，每个步骤等待cost秒，fail为True时步骤失败
+    '''
+
+    def __init__(self, name="case", cost=0.0, fail=False):
+        self.name = name
+        self.cost = cost
+        self.fail = fail
+        self.steps = [SimpleNamespace(name="s1"), SimpleNamespace(name="s2")]
+        self.teardowns = []
+        self._global_params = {}
+        self.torn_down = False
+
+    def run_setups(self):
+        pass
+
+    def is_selected(self, step):
+        return True
+
+    def run_step(self, step, scope):
+        time.sleep(self.cost)
+        if self.fail:
+            raise AssertionError("failed")
+
+    def _run(self, steps, teardown):
+        self.torn_down = True
+
+
+@pytest.mark.parametrize("text, seconds", [("500ms", 0.5), ("2", 2), ("1.5s", 1.5), ("2m", 120), ("1h", 3600)])
+def test_parse_duration(text, seconds):
+    assert parse_duration(text) == seconds
+
+
+def test_parse_load_spec():
+    assert parse_load_spec("rps=20") == {"rps": 20, "duration": 60, "workers": 20}
+    assert parse_load_spec("rps=0.5, duration=10s, workers=3") == {"rps": 0.5, "duration": 10, "workers": 3}
+
+
+@pytest.mark.parametrize("spec", ["", "duration=1s", "rps", "rps=a", "rps=0", "rps=1,workers=0", "rps=1,x=1",
+                                  "rps=1,duration=soon"])
+def test_parse_load_spec_errors(spec):
+    with pytest.raises(ValueError):
+        parse_load_spec(spec)
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile([], 50) == 0
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([1, 2, 3], 50) == 2
+
+
+def test_run_counts_steps_and_errors():
+    ok, bad = FakeItem("ok"), FakeItem("bad", fail=True)
+    report = LoadTest([ok, bad], rps=40, duration=0.5, workers=4).run()
+    assert report.iterations == 20
+    assert report.steps["ok::s2"].count == 10
+    # 失败的步骤之后不再执行
+    assert report.steps["bad::s1"].errors == 10
+    assert "bad::s2" not in report.steps
+    assert report.errors == 10
+    assert ok.torn_down and bad.torn_down
+
+
+def test_latency_includes_queueing_and_backlog_is_bounded():
+    # 每次执行0.1秒，一个线程只能达到10次每秒，按50次每秒调度时大部分次数被丢弃
+    test = LoadTest([FakeItem(cost=0.05)], rps=50, duration=1, workers=1)
+    start = time.perf_counter()
+    report = test.run()
+    elapsed = time.perf_counter() - start
+    assert report.dropped > 0
+    assert report.iterations + report.dropped == 50
+    # 排队的时间计入第一个步骤的耗时
+    assert max(report.steps["case::s1"].latencies) > 0.08
+    # 压测时间结束后不再执行排队中的次数
+    assert elapsed < 1.5
+    assert report.duration == pytest.approx(elapsed, abs=0.1)
@@ -0,0 +1,55 @@
+import pytest
+
+from pytest_api.params import iter_parameters
+from pytest_api.steps import CaseError
+
+
+def test_inline_rows(tmp_path):
+    rows = [{"user": "a"}, {"user": "b"}]
+    assert list(iter_parameters(rows, tmp_path / "case.yml")) == [("0", rows[0]), ("1", rows[1])]
+
+
+def test_csv_file(tmp_path):
+    (tmp_path / "data").mkdir()
+    # 带BOM的csv
+    (tmp_path / "data" / "users.csv").write_text("\ufeffuser,code\na,200\n中文,403\n", encoding="utf-8")
+    rows = list(iter_parameters({"file": "data/users.csv", "ids": "user"}, tmp_path / "case.yml"))
+    assert rows == [("a", {"user": "a", "code": "200"}), ("中文", {"user": "中文", "code": "403"})]
+
+
+def test_jsonl_file(tmp_path):
+    (tmp_path / "users.jsonl").write_text('{"user": "a", "code": 200}\n\n{"user": "b", "code": 403}\n',
+                                          encoding="utf-8")
+    rows = list(iter_parameters("users.jsonl", tmp_path / "case.yml"))
+    assert rows == [("0", {"user": "a", "code": 200}), ("1", {"user": "b", "code": 403})]
+
+
+def test_duplicate_ids_are_made_unique(tmp_path):
+    rows = [{"user": "a"}, {"user": "a"}, {"user": "a-1"}, {"user": 1}, {"user": "1"}]
+    suffixes = [suffix for suffix, _ in iter_parameters({"file": rows, "ids": "user"}, tmp_path / "case.yml")]
+    assert suffixes == ["a", "a-1", "a-1-2", "1", "1-4"]
+    assert len(set(suffixes)) == len(rows)
+
+
+def test_rows_are_read_lazily(tmp_path):
+    (tmp_path / "users.jsonl").write_text('{"user": "a"}\nbroken\n', encoding="utf-8")
+    rows = iter_parameters("users.jsonl", tmp_path / "case.yml")
+    assert next(rows) == ("0", {"user": "a"})
+    with pytest.raises(CaseError, match="第2行不是json格式"):
+        next(rows)
+
+
+@pytest.mark.parametrize("spec, content, message", [
+    ({"ids": "user"}, None, "必须要有file字段"),
+    (1, None, "必须是数组或者数据文件路径"),
+    ("missing.csv", None, "数据文件不存在"),
+    ("users.txt", "user\n", "只支持csv和jsonl文件"),
+    ("users.jsonl", "[1]\n", "必须是json对象"),
+    ([1], None, "必须是字典结构"),
+    ({"file": [{"name": "a"}], "ids": "user"}, None, "没有user字段"),
+])
+def test_errors(tmp_path, spec, content, message):
+    if content is not None:
+        (tmp_path / spec).write_text(content, encoding="utf-8")
+    with pytest.raises(CaseError, match=message):
+        list(iter_parameters(spec, tmp_path / "case.yml"))
@@ -0,0 +1,155 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from pytest_api import runner as runner_module
+from pytest_api.aio import AsyncApiRunner
+from pytest_api.runner import Runner, poll_options, sleep, sleep_async
+
+
+class Probe:
+    '''
+    前几次执行校验失败的动作，记录每次执行的时间
+    '''
+
+    def __init__(self, fail_times):
+        self.fail_times = fail_times
+        self.calls = []
+
+    def from_config_and_env(self, config):
+        return self
+
+    def _attempt(self):
+        self.calls.append(time.monotonic())
+        if len(self.calls) <= self.fail_times:
+            raise AssertionError(f"第{len(self.calls)}次未就绪")
+        return {"ready": len(self.calls)}
+
+    def run(self, spec):
+        return self._attempt()
+
+    async def run_async(self, spec):
+        return self._attempt()
+
+    def gaps(self):
+        return [b - a for a, b in zip(self.calls, self.calls[1:])]
+
+
+@pytest.fixture
+def probe_runner():
+    def make(fail_times):
+        probe = Probe(fail_times)
+        runner = Runner()
+        runner.register_handler("api", probe)
+        return runner, probe
+    return make
+
+
+@pytest.fixture(autouse=True)
+def reset_interrupted():
+    yield
+    runner_module.interrupted.clear()
+
+
+def test_sleep_fractional_seconds():
+    start = time.monotonic()
+    assert sleep(0.15) is True
+    assert sleep("0.05") is True
+    assert sleep(-1) is True
+    assert 0.2 <= time.monotonic() - start < 0.5
+
+
+def test_sleep_is_interrupted():
+    timer = threading.Timer(0.1, runner_module.interrupted.set)
+    timer.start()
+    start = time.monotonic()
+    assert sleep(5) is False
+    assert time.monotonic() - start < 1
+    timer.join()
+    assert asyncio.run(sleep_async(0)) is False
+
+
+def test_poll_options():
+    assert poll_options({"api": {}}) == (30, 1, 1, 30, {"api": {}})
+    assert poll_options({"timeout": "2", "interval": 0.5, "backoff": 2, "max_interval": 1, "api": {}}) \
+        == (2, 0.5, 2, 1, {"api": {}})
+    with pytest.raises(AssertionError, match="backoff不能小于1"):
+        poll_options({"backoff": 0.5, "api": {}})
+    with pytest.raises(AssertionError, match="没有要执行的步骤"):
+        poll_options({"name": "p", "timeout": 1})
+    with pytest.raises(AssertionError, match="格式错误"):
+        poll_options([{"api": {}}])
+
+
+@pytest.mark.parametrize("key", ["poll", "wait_until"])
+def test_poll_until_success(probe_runner, key):
+    runner, probe = probe_runner(2)
+    step = {"name": "wait", key: {"timeout": 5, "interval": 0.05, "api": {}}}
+    assert runner.run(step, None) == {"ready": 3}
+    assert len(probe.calls) == 3
+    assert all(gap >= 0.05 for gap in probe.gaps())
+
+
+def test_poll_backoff_and_max_interval(probe_runner):
+    runner, probe = probe_runner(4)
+    runner.poll({"timeout": 5, "interval": 0.05, "backoff": 2, "max_interval": 0.12, "api": {}}, None)
+    gaps = probe.gaps()
+    # 等待时间依次为0.05, 0.1, 0.12, 0.12
+    for gap, expected in zip(gaps, (0.05, 0.1, 0.12, 0.12)):
+        assert expected <= gap < expected + 0.08
+    assert gaps[1] > gaps[0] + 0.03
+
+
+def test_poll_timeout_message(probe_runner):
+    runner, probe = probe_runner(100)
+    start = time.monotonic()
+    with pytest.raises(AssertionError) as e:
+        runner.poll({"timeout": 0.3, "interval": 0.1, "api": {}}, None)
+    elapsed = time.monotonic() - start
+    assert 0.3 <= elapsed < 0.6
+    attempts = len(probe.calls)
+    assert attempts >= 3
+    assert str(e.value) == f"轮询{attempts}次，0.3秒内未满足条件: 第{attempts}次未就绪"
+
+
+def test_poll_stops_when_interrupted(probe_runner):
+    runner, probe = probe_runner(100)
+    timer = threading.Timer(0.1, runner_module.interrupted.set)
+    timer.start()
+    start = time.monotonic()
+    with pytest.raises(AssertionError, match="轮询1次"):
+        runner.poll({"timeout": 10, "interval": 5, "api": {}}, None)
+    assert time.monotonic() - start < 1
+    timer.join()
+
+
+def test_poll_async_until_success(probe_runner):
+    runner, probe = probe_runner(2)
+    spec = {"timeout": 5, "interval": 0.05, "backoff": 2, "api": {}}
+    assert asyncio.run(runner._poll_async(spec, None)) == {"ready": 3}
+    assert probe.gaps()[1] >= 0.1
+
+
+def test_poll_async_timeout_message(probe_runner):
+    runner, probe = probe_runner(100)
+    with pytest.raises(AssertionError) as e:
+        asyncio.run(runner._poll_async({"timeout": 0.2, "interval": 0.05, "api": {}}, None))
+    assert str(e.value).startswith(f"轮询{len(probe.calls)}次，0.2秒内未满足条件: ")
+
+
+def test_parallel_polls_share_event_loop(server_config):
+    runner = Runner()
+    runner.register_handler("api", AsyncApiRunner)
+    config = server_config(transport="async")
+    api = {"request": {"url": "/status", "method": "GET"}, "response": {"status_code": 201}}
+    steps = [{"name": f"p{i}", "poll": {"timeout": 0.5, "interval": 0.1, "api": api}} for i in range(3)]
+    start = time.monotonic()
+    with pytest.raises(AssertionError, match=r"并发步骤p\d: 轮询\d+次，0.5秒内未满足条件: .*状态码不一致"):
+        runner.run({"name": "p", "parallel": steps}, config)
+    # 等待时让出事件循环，三个轮询同时进行
+    assert time.monotonic() - start < 1.2
+    api = {"request": {"url": "/ok", "method": "GET"}, "return": {"path": "path"}}
+    ok = {"name": "ok", "poll": {"timeout": 1, "api": api}}
+    assert runner.run({"name": "p", "parallel": [ok]}, config) == {"path": "/ok"}
@@ -0,0 +1,25 @@
+from urllib.parse import urlparse
+
+from pytest_api.pool import SessionPool
+
+
+def test_sessions_are_shared_per_target():
+    pool = SessionPool()
+    assert pool.get("http", "h", 80) is pool.get("http", "h", "80")
+    assert pool.get("http", "h", 80) is not pool.get("https", "h", 80)
+    assert pool.get("http", "h", 80, ["u", "p"]) is pool.get("http", "h", 80, ("u", "p"))
+    pool.close()
+    assert pool.sessions == {}
+
+
+def test_cookies_do_not_leak_between_requests(http_server):
+    url = urlparse(http_server)
+    pool = SessionPool()
+    session = pool.get("http", url.hostname, url.port)
+    first = session.get(f"{http_server}/login?set_cookie=sid=1")
+    assert first.cookies.get("sid") == "1"
+    assert session.get(f"{http_server}/next").json()["cookie"] is None
+    # 显式带上的cookie照常发送
+    assert session.get(f"{http_server}/next", headers={"Cookie": "sid=2"}).json()["cookie"] == "sid=2"
+    assert pool.stats.reused_connections > 0
+    pool.close()
@@ -0,0 +1,93 @@
+from urllib.parse import urlparse
+
+import pytest
+
+from pytest_api.pool import SessionPool
+from pytest_api.replay import ReplayStore
+
+
+def session(store, server):
+    url = urlparse(server)
+    pool = SessionPool(replay_store=store)
+    return pool, pool.get("http", url.hostname, url.port)
+
+
+def test_record_and_replay(tmp_path, http_server):
+    path = str(tmp_path / "replay.db")
+    store = ReplayStore(path, "record")
+    pool, s = session(store, http_server)
+    recorded = s.get(f"{http_server}/login?set_cookie=sid=1")
+    assert recorded.json()["path"] == "/login?set_cookie=sid=1"
+    pool.close()
+    store.close()
+
+    store = ReplayStore(path, "replay")
+    pool, s = session(store, http_server)
+    # 同一个请求回放完后重复最后一次的响应
+    for _ in range(2):
+        replayed = s.get(f"{http_server}/login?set_cookie=sid=1")
+        assert replayed.status_code == 200
+        assert replayed.content == recorded.content
+        assert replayed.headers["Content-Type"] == "application/json"
+        assert replayed.cookies.get("sid") == "1"
+    assert store.hits == 2
+    with pytest.raises(AssertionError, match="没有录制的响应"):
+        s.get(f"{http_server}/other")
+    assert store.misses == 1
+    pool.close()
+    store.close()
+
+
+def test_streamed_download_is_recorded_while_read(tmp_path, http_server):
+    path = str(tmp_path / "replay.db")
+    url = f"{http_server}/download?size=1000000"
+    store = ReplayStore(path, "record")
+    pool, s = session(store, http_server)
+    response = s.get(url, stream=True)
+    # 还没有读取内容时不写入
+    assert store.conn.execute("SELECT COUNT(*) FROM responses").fetchone() == (0,)
+    size = sum(len(chunk) for chunk in response.iter_content(65536))
+    assert store.conn.execute("SELECT COUNT(*) FROM responses").fetchone() == (1,)
+    response.close()
+    pool.close()
+    store.close()
+
+    store = ReplayStore(path, "replay")
+    pool, s = session(store, http_server)
+    assert len(s.get(url).content) == size
+    pool.close()
+    store.close()
+
+
+def test_partially_read_response_records_what_was_read(tmp_path, http_server):
+    path = str(tmp_path / "replay.db")
+    store = ReplayStore(path, "record")
+    pool, s = session(store, http_server)
+    response = s.get(f"{http_server}/download?size=1000000", stream=True)
+    first = next(response.iter_content(1024))
+    response.close()
+    pool.close()
+    store.close()
+
+    store = ReplayStore(path, "replay")
+    pool, s = session(store, http_server)
+    assert s.get(f"{http_server}/download?size=1000000").content == first
+    pool.close()
+    store.close()
+
+
+def test_decode_unicode_while_recording(tmp_path, http_server):
+    store = ReplayStore(str(tmp_path / "replay.db"), "record")
+    pool, s = session(store, http_server)
+    response = s.get(f"{http_server}/text", stream=True)
+    response.encoding = "utf-8"
+    text = "".join(response.iter_content(16, decode_unicode=True))
+    assert text.startswith('{"path": "/text"')
+    pool.close()
+    store.close()
+
+    store = ReplayStore(str(tmp_path / "replay.db"), "replay")
+    pool, s = session(store, http_server)
+    assert s.get(f"{http_server}/text").text == text
+    pool.close()
+    store.close()
@@ -0,0 +1,18 @@
+from pytest_api.aio import AsyncApiRunner
+from pytest_api.runner import ApiRunner
+
+
+def test_sync_runner_uses_pooled_session(make_config):
+    config = make_config(host="127.0.0.1", port=80)
+    first = ApiRunner.from_config_and_env(config)
+    second = ApiRunner.from_config_and_env(config)
+    assert first.s is second.s
+    assert first.s is config._api_session_pool.get("https", "127.0.0.1", 80)
+
+
+def test_async_runner_does_not_create_sync_session(make_config):
+    config = make_config(host="127.0.0.1", port=80)
+    runner = AsyncApiRunner.from_config_and_env(config)
+    assert runner._s is None
+    assert not hasattr(config, "_api_session_pool")
+    assert runner.engine is config._api_async_engine
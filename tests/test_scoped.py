@@ -0,0 +1,134 @@
+import threading
+import time
+
+import pytest
+
+from pytest_api.scoped import ScopedSetups, default_key, scope_path
+
+
+class FakeItem:
+    '''
+    代替YamlItem，_run记录执行的步骤，步骤中的return写入作用域
+    '''
+
+    def __init__(self, name, path, spec, registry, log):
+        self.name = name
+        self.fspath = path
+        self._global_params = {"global": 1}
+        self.log = log
+        self.scoped = registry.get(spec, path) if spec else None
+
+    def _run(self, steps, is_teardown=False, publish=False, scope=None):
+        for step in steps:
+            time.sleep(step.get("sleep", 0))
+            self.log.append((self.name, step["name"], dict(scope)))
+            if step.get("fail"):
+                raise AssertionError(f"{step['name']} failed")
+            scope.update(step.get("return", {}))
+
+
+def spec(scope="session", key="login", steps=None, teardown=None):
+    return {"scope": scope, "key": key,
+            "steps": steps if steps is not None else [{"name": "login", "return": {"token": "t"}}],
+            "teardown": teardown if teardown is not None else [{"name": "logout"}]}
+
+
+@pytest.fixture
+def registry():
+    return ScopedSetups()
+
+
+def test_scope_path():
+    assert scope_path("session", "/a/b/c.yml") == ""
+    assert scope_path("directory", "/a/b/c.yml") == "/a/b"
+    assert scope_path("file", "/a/b/c.yml") == "/a/b/c.yml"
+
+
+def test_default_key():
+    assert default_key({"steps": [1], "scope": "file"}) == default_key({"scope": "file", "steps": [1]})
+    assert default_key({"steps": [1]}) != default_key({"steps": [2]})
+
+
+@pytest.mark.parametrize("scope, same, different", [
+    ("session", ["/a/x.yml", "/b/y.yml"], []),
+    ("directory", ["/a/x.yml", "/a/y.yml"], ["/b/x.yml"]),
+    ("file", ["/a/x.yml", "/a/x.yml"], ["/a/y.yml"]),
+])
+def test_setups_are_shared_within_scope(registry, scope, same, different):
+    first = registry.get(spec(scope), same[0])
+    assert all(registry.get(spec(scope), path) is first for path in same)
+    assert all(registry.get(spec(scope), path) is not first for path in different)
+    # key不同时不共享
+    assert registry.get(spec(scope, key="other"), same[0]) is not first
+
+
+def test_setup_runs_once_and_shares_values(registry):
+    log = []
+    items = [FakeItem(f"c{i}", f"/d/c{i}.yml", spec(), registry, log) for i in range(3)]
+    for item in items:
+        registry.ensure(item)
+    assert [entry[:2] for entry in log] == [("c0", "login")]
+    assert items[2].scoped.values == {"token": "t"}
+    # 前置步骤可以读取全局变量
+    assert log[0][2] == {"global": 1}
+
+
+def test_setup_runs_once_under_concurrency(registry):
+    log = []
+    steps = [{"name": "login", "sleep": 0.05, "return": {"token": "t"}}]
+    items = [FakeItem(f"c{i}", "/d/c.yml", spec(steps=steps), registry, log) for i in range(8)]
+    threads = [threading.Thread(target=registry.ensure, args=(item,)) for item in items]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(log) == 1
+
+
+def test_failed_setup_raises_for_every_item(registry):
+    log = []
+    steps = [{"name": "login", "fail": True}]
+    items = [FakeItem(f"c{i}", "/d/c.yml", spec(steps=steps), registry, log) for i in range(2)]
+    for item in items:
+        with pytest.raises(AssertionError, match="login failed"):
+            registry.ensure(item)
+    assert len(log) == 1
+
+
+def test_teardown_runs_after_last_item_of_each_scope(registry):
+    log = []
+    file_spec = spec("file", key="f", steps=[{"name": "f-setup", "return": {"f": 1}}],
+                     teardown=[{"name": "f-teardown"}])
+    items = [
+        FakeItem("a1", "/d/a.yml", file_spec, registry, log),
+        FakeItem("a2", "/d/a.yml", file_spec, registry, log),
+        FakeItem("b1", "/d/b.yml", spec(), registry, log),
+        FakeItem("plain", "/d/c.yml", None, registry, log),
+        FakeItem("b2", "/e/b.yml", spec(), registry, log),
+    ]
+    for item in items:
+        if item.scoped is not None:
+            registry.ensure(item)
+        log.append((item.name, "run", {}))
+        if item.scoped is not None:
+            registry.release(item, items)
+    assert [entry[:2] for entry in log] == [
+        ("a1", "f-setup"), ("a1", "run"), ("a2", "run"), ("a2", "f-teardown"),
+        ("b1", "login"), ("b1", "run"), ("plain", "run"), ("b2", "run"), ("b2", "logout"),
+    ]
+    # teardown可以使用前置的返回值
+    assert log[3][2] == {"f": 1, "global": 1}
+    # 会话结束时不会重复执行
+    registry.finish_all()
+    assert len(log) == 9
+
+
+def test_finish_all_runs_remaining_teardowns(registry):
+    log = []
+    items = [FakeItem("a", "/d/a.yml", spec(), registry, log),
+             FakeItem("b", "/d/b.yml", spec("file", key="never"), registry, log)]
+    registry.ensure(items[0])
+    # 并发执行时最后一个案例可能不是最后结束的，会话结束时执行剩下的teardown
+    registry.finish_all()
+    registry.finish_all()
+    assert [entry[:2] for entry in log] == [("a", "login"), ("a", "logout")]
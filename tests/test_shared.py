@@ -0,0 +1,62 @@
+import pytest
+
+from pytest_api.shared import SharedVariables, _Store
+
+
+class CountingStore(_Store):
+    '''
+    记录查询次数，代替变量服务进程的代理
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.lookups = 0
+
+    def lookup(self, key):
+        self.lookups += 1
+        return super().lookup(key)
+
+
+def test_found_values_are_cached():
+    store = CountingStore()
+    store.update({"token": "t"})
+    shared = SharedVariables(store)
+    assert shared["token"] == "t"
+    assert shared.get("token") == "t"
+    assert store.lookups == 1
+    assert dict(shared) == {"token": "t"}
+
+
+def test_misses_are_cached_until_next_step():
+    store = CountingStore()
+    shared = SharedVariables(store)
+    for _ in range(3):
+        assert shared.get("token") is None
+        assert "token" not in shared
+    assert store.lookups == 1
+
+    # 其他worker发布后，下一个步骤能读到
+    store.update({"token": "t"})
+    assert shared.get("token") is None
+    shared.forget_misses()
+    assert shared["token"] == "t"
+    assert store.lookups == 2
+
+
+def test_publish_clears_misses():
+    store = CountingStore()
+    shared = SharedVariables(store)
+    with pytest.raises(KeyError):
+        shared["token"]
+    shared.publish({"token": "t"})
+    assert shared["token"] == "t"
+    assert store.get("token") == "t"
+    assert store.lookups == 1
+
+
+def test_store_values_can_be_none():
+    store = _Store()
+    store.update({"empty": None})
+    assert store.lookup("empty") == (True, None)
+    assert store.lookup("missing") == (False, None)
+    assert SharedVariables(store)["empty"] is None
@@ -0,0 +1,81 @@
+import pytest
+
+from pytest_api.jsonpath import _compile_return, compile_return
+from pytest_api.runner import ExecRunner
+from pytest_api.steps import CaseError, compile_case
+
+
+def api(**extra):
+    step = {"request": {"url": "/a", "method": "GET"}}
+    step.update(extra)
+    return step
+
+
+def case(*steps, **extra):
+    c = {"name": "c", "steps": [dict(name=f"s{i}", **s) for i, s in enumerate(steps)]}
+    c.update(extra)
+    return c
+
+
+def test_compile_case():
+    setups, steps, teardowns, scoped = compile_case(
+        case({"api": api(response={"status_code": 200}, **{"return": {"id": "data.id"}})}, {"sleep": 1},
+             teardown=[{"name": "t", "sleep": "${wait}"}]),
+        None, "case.yml")
+    assert setups == [] and scoped is None
+    assert [s.name for s in steps] == ["s0", "s1"]
+    assert steps[0].actions == ("api",)
+    assert [s.name for s in teardowns] == ["t"]
+
+
+def test_string_return_rule_is_accepted():
+    _, steps, _, _ = compile_case(case({"api": api(**{"return": "body"})},
+                                       {"exec": {"request": {"args": "echo"}, "return": "out"}}), None, "case.yml")
+    assert len(steps) == 2
+
+
+def test_string_return_rule_stores_whole_output():
+    runner = ExecRunner()
+    assert runner._return('{"a": 1}', "out") == {"out": '{"a": 1}'}
+    assert runner._return('{"a": 1}', {"a": "a"}) == {"a": 1}
+    with pytest.raises(AssertionError, match="返回内容不是json"):
+        runner._return("plain text", {"a": "a"})
+
+
+@pytest.mark.parametrize("c, message", [
+    ([], "案例必须是字典结构"),
+    ({"steps": []}, "必须要有name字段"),
+    (case({"api": api(**{"return": ["a"]})}), "return: 必须是字典结构或者变量名"),
+    (case({"api": api(**{"return": {"a": "items[0"}})}), "返回值规则格式错误"),
+    (case({"api": api(response={"status_code": "abc"})}), "response"),
+    (case({"api": {"request": {"url": "/a"}}}), "缺少method字段"),
+    (case({"exec": {"request": {}}}), "args为命令扩展动作的必选传参"),
+    (case({"sleep": "soon"}), "sleep必须是数字"),
+    (case({"unknown": 1}), "未知的动作unknown"),
+])
+def test_compile_case_errors(c, message):
+    with pytest.raises(CaseError, match=message):
+        compile_case(c, {"api", "exec", "sleep"}, "case.yml")
+
+
+def test_compile_case_reports_all_errors():
+    with pytest.raises(CaseError) as e:
+        compile_case(case({"sleep": "x"}, {"api": {}}), None, "case.yml")
+    assert len(str(e.value).splitlines()) == 3
+
+
+def test_return_plans_are_kept_on_step():
+    poll = {"timeout": 1, "api": api(**{"return": {"state": "data.state"}})}
+    parallel = [{"name": "p", "api": api(**{"return": {"a": "data.a", "b": "data.b"}})}]
+    templated = api(**{"return": {"c": "data.c", "d": "${path}"}})
+    _, steps, _, _ = compile_case(case({"api": api(**{"return": {"id": "data.id"}})}, {"poll": poll},
+                                       {"parallel": parallel}, {"api": templated}, {"api": api(**{"return": "body"})}),
+                                  None, "case.yml")
+    assert [len(s.returns) for s in steps] == [1, 1, 1, 0, 0]
+    # 缓存被其他规则挤满后，执行时仍然取到步骤上编译好的规则
+    _compile_return.cache_clear()
+    for i in range(1100):
+        compile_return({"x": f"data.x{i}"})
+    assert compile_return({"id": "data.id"}) is steps[0].returns[0]
+    assert compile_return({"a": "data.a", "b": "data.b"}) is steps[2].returns[0]
+    assert compile_return({"id": "data.id"}).extract({"data": {"id": 7}}) == {"id": 7}
@@ -0,0 +1,115 @@
+import os
+
+import pytest
+
+from pytest_api.tags import INDEX_KEY, TagIndex, TagSelector, normalize_tags, parse_tag_expr
+
+
+class FakeCache:
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key, default):
+        return self.data.get(key, default)
+
+    def set(self, key, value):
+        self.data[key] = value
+
+
+class FakeConfig:
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def getoption(self, name, default=None):
+        # 不使用案例解析缓存
+        return name == "--api-no-cache"
+
+
+@pytest.mark.parametrize("expr, tags, expected", [
+    ("smoke", {"smoke"}, True),
+    ("smoke", {"slow"}, False),
+    ("smoke,regression", {"regression"}, True),
+    ("smoke or regression", set(), False),
+    ("smoke and not slow", {"smoke"}, True),
+    ("smoke and not slow", {"smoke", "slow"}, False),
+    ("not not smoke", {"smoke"}, True),
+    # and的优先级高于or
+    ("a or b and c", {"a"}, True),
+    ("a or b and c", {"b"}, False),
+    ("(a or b) and c", {"a"}, False),
+    ("(a or b) and c", {"b", "c"}, True),
+    ("slow,(db and nightly)", {"db", "nightly"}, True),
+    ("slow,(db and nightly)", {"db"}, False),
+    ("(a,b)and(c)", {"b", "c"}, True),
+])
+def test_parse_tag_expr(expr, tags, expected):
+    assert parse_tag_expr(expr)(frozenset(tags)) is expected
+
+
+@pytest.mark.parametrize("expr", ["", "a and", "not", "(a", "a)", "a b", "and a", "a,,b", "()"])
+def test_parse_tag_expr_errors(expr):
+    with pytest.raises(ValueError):
+        parse_tag_expr(expr)
+
+
+def test_normalize_tags():
+    assert normalize_tags(None) == frozenset()
+    assert normalize_tags("smoke") == frozenset({"smoke"})
+    assert normalize_tags(["a", 1]) == frozenset({"a", "1"})
+
+
+def test_tag_selector():
+    assert not TagSelector().active
+    assert TagSelector().match(None)
+    selector = TagSelector("smoke", "slow")
+    assert selector.active
+    assert selector.match(["smoke"])
+    assert not selector.match(["smoke", "slow"])
+    assert not selector.match([])
+    assert TagSelector(exclude="slow").match([])
+
+
+def test_tag_index(tmp_path):
+    path = tmp_path / "case.yml"
+    path.write_text("tags: [smoke, db]\nsteps: []\n", encoding="utf-8")
+    missing = tmp_path / "missing.yml"
+    cache = FakeCache()
+
+    index = TagIndex(FakeConfig(cache))
+    assert index.tags(path) == frozenset({"smoke", "db"})
+    assert index.tags(missing) is None
+    index.save()
+    assert cache.data[INDEX_KEY][str(path)][2] == ["db", "smoke"]
+
+    # 文件没有变化时使用索引，不再读取文件
+    index = TagIndex(FakeConfig(cache))
+    cache.data[INDEX_KEY][str(path)][2] = ["cached"]
+    assert index.tags(path) == frozenset({"cached"})
+    index.save()
+    assert not index.dirty
+
+    # 修改文件后重新读取
+    path.write_text("tags: slow\nsteps: []\n", encoding="utf-8")
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000))
+    assert index.tags(path) == frozenset({"slow"})
+    path.unlink()
+    index.save()
+    assert cache.data[INDEX_KEY] == {}
+
+
+def test_tag_index_unparsable_file(tmp_path):
+    path = tmp_path / "bad.yml"
+    path.write_text("tags: [a\n", encoding="utf-8")
+    assert TagIndex(FakeConfig(FakeCache())).tags(path) is None
+
+
+def test_tag_index_without_cache(tmp_path):
+    path = tmp_path / "case.yml"
+    path.write_text("tags: a\n", encoding="utf-8")
+    config = FakeConfig(None)
+    index = TagIndex(config)
+    assert index.tags(path) == frozenset({"a"})
+    index.save()
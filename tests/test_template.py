@@ -0,0 +1,102 @@
+import json
+import re
+
+import pytest
+
+from pytest_api.template import Template
+
+VARIABLES = {
+    "name": "alice",
+    "num": 5,
+    "flag": True,
+    "none": None,
+    "obj": {"a": [1, 2]},
+    "items": [1, "b"],
+    "path": "a/b",
+}
+
+
+def legacy_re_step(step, variables):
+    '''
+    原来plugin.py中YamlItem._re_step的实现，作为对比的基准
+    '''
+    step_json = json.dumps(step)
+    for k, v in variables.items():
+        re_str = r"\"\$\{" + k + r"\}\""
+        re_str_2 = r"\\\"\$\{" + k + r"\}\\\""
+        param_str = json.dumps(v)
+        if isinstance(v, str):
+            re_str = r"\$\{" + k + r"\}"
+            param_str = v
+        step_json = re.sub(re_str_2, param_str, step_json)
+        step_json = re.sub(re_str, param_str, step_json)
+    return json.loads(step_json, strict=False)
+
+
+CASES = [
+    # 整个值就是变量时保持变量的类型
+    ("${name}", "alice"),
+    ("${num}", 5),
+    ("${flag}", True),
+    ("${none}", None),
+    ("${obj}", {"a": [1, 2]}),
+    ("${items}", [1, "b"]),
+    # 字符串中的变量
+    ("/users/${name}/items", "/users/alice/items"),
+    ("${name}-${path}", "alice-a/b"),
+    ("${name}${name}", "alicealice"),
+    # 不带引号时非字符串变量不替换
+    ("page=${num}", "page=${num}"),
+    # 带引号时非字符串变量使用json格式
+    ('{"n": "${num}", "f": "${flag}", "z": "${none}"}', '{"n": 5, "f": true, "z": null}'),
+    ('"${name}"', "alice"),
+    # 未定义的变量保持原样
+    ("${missing}", "${missing}"),
+    ("a ${missing} b", "a ${missing} b"),
+    # 字典的key
+    ({"${name}": "${num}", "k": "${name}"}, {"alice": 5, "k": "alice"}),
+    ({"${missing}": 1}, {"${missing}": 1}),
+    ({1: "${name}"}, {"1": "alice"}),
+    # 数组元素
+    (["${name}", "${num}", "x${name}", 1, None], ["alice", 5, "xalice", 1, None]),
+    # 嵌套的字典和数组
+    ({"request": {"url": "/${name}", "json": {"list": [{"id": "${num}"}, ["${obj}"]], "keep": 1.5}}},
+     {"request": {"url": "/alice", "json": {"list": [{"id": 5}, [{"a": [1, 2]}]], "keep": 1.5}}}),
+    # 不是字符串的值原样保留
+    (3, 3),
+    (None, None),
+    ("no variables", "no variables"),
+]
+
+
+@pytest.mark.parametrize("obj, expected", CASES)
+def test_render(obj, expected):
+    assert Template(obj).render(VARIABLES) == expected
+
+
+@pytest.mark.parametrize("obj, expected", CASES)
+def test_render_matches_legacy_re_step(obj, expected):
+    assert Template(obj).render(VARIABLES) == legacy_re_step(obj, VARIABLES)
+
+
+def test_quoted_container_variable():
+    # 原来的实现替换后不是合法的json，会解析失败
+    assert Template('{"o": "${obj}"}').render(VARIABLES) == '{"o": {"a": [1, 2]}}'
+
+
+def test_names():
+    template = Template({"${a}": ["${b}", "x${c}y", {"d": '"${d}"'}], "e": 1})
+    assert template.names == {"a", "b", "c", "d"}
+
+
+def test_render_does_not_share_structures():
+    template = Template({"list": [1, {"a": "${name}"}]})
+    first = template.render(VARIABLES)
+    first["list"][1]["a"] = "changed"
+    assert template.render(VARIABLES) == {"list": [1, {"a": "alice"}]}
+
+
+def test_template_reused_with_other_variables():
+    template = Template({"url": "/${name}", "n": "${num}"})
+    assert template.render({"name": "bob", "num": "6"}) == {"url": "/bob", "n": "6"}
+    assert template.render({}) == {"url": "/${name}", "n": "${num}"}
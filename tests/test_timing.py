@@ -0,0 +1,123 @@
+import csv
+import json
+import textwrap
+import time
+from urllib.parse import urlparse
+
+import pytest
+
+from pytest_api.runner import ApiRunner
+from pytest_api.timing import PHASES, StepTimer, TimingReport
+
+
+def timer(status_code=200, **phases):
+    t = StepTimer()
+    t.phases.update(phases)
+    t.status_code = status_code
+    return t
+
+
+@pytest.fixture
+def report():
+    report = TimingReport()
+    report.add("a.yml::a", "fast", timer(network=0.01, check=0.001), True)
+    report.add("a.yml::a", "slow", timer(network=0.3, substitute=0.002), True)
+    report.add("b.yml::b", "failed", timer(500, network=0.05), False)
+    return report
+
+
+def test_step_timer_accumulates_phases():
+    t = StepTimer()
+    for _ in range(2):
+        with t.phase("network"):
+            time.sleep(0.05)
+    with pytest.raises(ValueError):
+        with t.phase("check"):
+            raise ValueError()
+    assert t.get("network") >= 0.1
+    assert "check" in t.phases
+    assert t.get("return") == 0
+    assert t.total == pytest.approx(t.get("network") + t.get("check"))
+
+
+def test_slowest(report):
+    assert [r.step for r in report.slowest(2)] == ["slow", "failed"]
+    assert len(report.slowest(10)) == 3
+
+
+def test_write_json(report, tmp_path):
+    path = tmp_path / "timing.json"
+    report.write(path)
+    rows = json.loads(path.read_text(encoding="utf-8"))
+    assert [row["step"] for row in rows] == ["slow", "failed", "fast"]
+    assert rows[0] == {"case": "a.yml::a", "step": "slow", "ok": True, "status_code": 200, "total_ms": 302.0,
+                       "substitute_ms": 2.0, "prepare_ms": 0, "network_ms": 300.0, "check_ms": 0, "return_ms": 0}
+    assert rows[1]["ok"] is False and rows[1]["status_code"] == 500
+
+
+def test_write_csv(report, tmp_path):
+    path = tmp_path / "timing.csv"
+    report.write(path)
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == ["case", "step", "ok", "status_code", "total_ms"] + [f"{p}_ms" for p in PHASES]
+    assert [(row["step"], row["ok"], row["total_ms"]) for row in rows] == \
+        [("slow", "True", "302.0"), ("failed", "False", "50.0"), ("fast", "True", "11.0")]
+
+
+def latency_step(delay, max_latency_ms):
+    return {"request": {"url": f"/slow?delay={delay}", "method": "GET"},
+            "response": {"status_code": 200, "max_latency_ms": max_latency_ms}}
+
+
+def test_max_latency_ms(server_config):
+    runner = ApiRunner.from_config_and_env(server_config())
+    runner.timer = StepTimer()
+    runner.run(latency_step(0, 2000))
+    runner.timer = StepTimer()
+    with pytest.raises(AssertionError, match=r"请求耗时超过阈值：期望值:100ms, 实际值: \d+\.\dms"):
+        runner.run(latency_step(300, 100))
+    assert runner.timer.get("network") >= 0.3
+
+
+def test_max_latency_ms_checked_after_response(server_config):
+    # 状态码不一致时报告原来的错误
+    runner = ApiRunner.from_config_and_env(server_config())
+    runner.timer = StepTimer()
+    step = latency_step(300, 100)
+    step["response"]["status_code"] = 201
+    with pytest.raises(AssertionError, match="状态码不一致"):
+        runner.run(step)
+
+
+def test_timing_report_and_summary(project, http_server):
+    url = urlparse(http_server)
+    project.makefile(".yml", env=f"proto: http\nhost: {url.hostname}\nport: {url.port}\n")
+    project.makefile(".yml", test_case=textwrap.dedent('''
+        name: case
+        steps:
+          - name: slow
+            api:
+              request: {url: "/slow?delay=300", method: GET}
+              response: {status_code: 200}
+          - name: fast
+            api:
+              request: {url: /fast, method: GET}
+          - name: limited
+            api:
+              request: {url: "/limited?delay=200", method: GET}
+              response: {max_latency_ms: 50}
+    '''))
+    result = project.runpytest_subprocess("-p", "no:cacheprovider", "--api-timing-top", "2",
+                                          "--api-timing-report", "timing.csv")
+    result.assert_outcomes(failed=1)
+    result.stdout.fnmatch_lines(["*请求耗时超过阈值：期望值:50ms*"])
+    lines = result.stdout.lines
+    start = next(i for i, line in enumerate(lines) if "最慢的2个步骤" in line)
+    assert "test_case.yml::case::slow" in lines[start + 2]
+    assert "test_case.yml::case::limited" in lines[start + 3]
+    assert "::fast" not in lines[start + 4]
+    with open(project.path / "timing.csv", encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [(row["step"], row["ok"]) for row in rows] == [("slow", "True"), ("limited", "False"), ("fast", "True")]
+    assert float(rows[0]["network_ms"]) >= 300
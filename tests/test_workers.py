@@ -0,0 +1,50 @@
+import re
+import sys
+import textwrap
+
+
+def case(name, value, wait):
+    return textwrap.dedent(f'''
+        name: {name}
+        steps:
+          - name: set
+            exec:
+              request: {{args: [{sys.executable!r}, -c, "print('={value}=')"]}}
+              return: value
+          - name: wait
+            sleep: {wait}
+          - name: check
+            exec:
+              request: {{args: [{sys.executable!r}, -c, "import sys; print(sys.argv[1])", "${{value}}"]}}
+              response: {{text: "={value}="}}
+    ''')
+
+
+def durations(result):
+    '''
+    从--durations的输出中读取每个案例call阶段的耗时
+    '''
+    found = {}
+    for line in result.outlines:
+        match = re.match(r"([\d.]+)s call\s+.*::(\w+)$", line)
+        if match:
+            found[match.group(2)] = float(match.group(1))
+    return found
+
+
+def test_variables_are_isolated(project):
+    for i in range(6):
+        project.makefile(".yml", **{f"test_c{i}": case(f"c{i}", f"c{i}", 0.3)})
+    result = project.runpytest_subprocess("--api-workers", "6", "-p", "no:cacheprovider")
+    result.assert_outcomes(passed=6)
+
+
+def test_duration_is_measured_in_worker(project):
+    project.makefile(".yml", test_a=case("slow", "a", 0.8), test_b=case("fast", "b", 0.4))
+    result = project.runpytest_subprocess("--api-workers", "2", "-p", "no:cacheprovider",
+                                          "--durations", "0", "--durations-min", "0")
+    result.assert_outcomes(passed=2)
+    found = durations(result)
+    assert found["slow"] >= 0.8
+    # fast在slow结束前已经执行完，耗时不是等待结果的时间
+    assert 0.4 <= found["fast"] < 0.8
@@ -0,0 +1,107 @@
+'''
+步骤耗时统计
+每个步骤分为以下阶段计时：
+    substitute  变量替换
+    prepare     组装请求
+    network     发送请求到收到响应，exec动作为命令执行时间
+    check       响应校验
+    return      返回值提取
+'''
+import csv
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+PHASES = ("substitute", "prepare", "network", "check", "return")
+
+
+class StepTimer:
+    """
+    单个步骤的各阶段耗时，单位为秒
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.status_code = None
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - start
+
+    def get(self, name):
+        return self.phases.get(name, 0)
+
+    @property
+    def total(self):
+        return sum(self.phases.values())
+
+
+class _NullTimer(StepTimer):
+    """
+    不需要统计时使用，不记录任何数据
+    """
+
+    @contextmanager
+    def phase(self, name):
+        yield
+
+
+NULL_TIMER = _NullTimer()
+
+
+class StepTiming:
+
+    def __init__(self, case, step, timer, ok):
+        self.case = case
+        self.step = step
+        self.timer = timer
+        self.ok = ok
+
+    def as_dict(self):
+        res = {
+            "case": self.case,
+            "step": self.step,
+            "ok": self.ok,
+            "status_code": self.timer.status_code,
+            "total_ms": round(self.timer.total * 1000, 3),
+        }
+        for phase in PHASES:
+            res[f"{phase}_ms"] = round(self.timer.get(phase) * 1000, 3)
+        return res
+
+
+class TimingReport:
+    """
+    整个会话所有步骤的耗时记录
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records = []
+
+    def add(self, case, step, timer, ok):
+        with self._lock:
+            self.records.append(StepTiming(case, step, timer, ok))
+
+    def slowest(self, count):
+        return sorted(self.records, key=lambda r: r.timer.total, reverse=True)[:count]
+
+    def write(self, path):
+        """
+        根据文件后缀输出json或者csv格式的耗时报告
+        """
+        rows = [r.as_dict() for r in self.slowest(len(self.records))]
+        if str(path).endswith(".csv"):
+            fields = ["case", "step", "ok", "status_code", "total_ms"] + [f"{p}_ms" for p in PHASES]
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(rows, f, ensure_ascii=False, indent=2)